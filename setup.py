@@ -19,6 +19,12 @@ setuptools.setup(
         'pyqt5',
         'pyqtgraph'
     ],
+    extras_require = {
+        'hdf5': ['h5py'],
+        'zarr': ['zarr'],
+        'arrow': ['pyarrow'],
+        'zstd': ['zstandard']
+    },
     classifiers=[
         "Topic :: Scientific/Engineering :: Visualization",
         "Environment :: Console",
@@ -0,0 +1,36 @@
+"""
+wavebin
+https://github.com/sam210723/wavebin
+
+Waveform capture viewer for oscilloscopes.
+"""
+
+import gzip
+import numpy as np
+from wavebin import compressed
+from wavebin.compressed import CompressedFile
+from wavebin.memory import memory
+
+
+def test_gzip_reread_from_checkpoint(tmp_path, monkeypatch):
+    monkeypatch.setattr(compressed, "BLOCK", 2**12)
+    monkeypatch.setattr(compressed, "CHECKPOINT", 4)
+    monkeypatch.setattr(compressed, "READ", 2**10)
+    data = np.random.default_rng(0).integers(0, 4, 2**16, dtype=np.uint8).tobytes()
+    path = tmp_path / "capture.bin.gz"
+    path.write_bytes(gzip.compress(data))
+
+    f = CompressedFile(path, "gzip")
+    assert f.read_at(0, len(data)) == data
+    assert sorted(f.checkpoints) == [4, 8, 12]
+
+    # Evicted blocks before cursor are decompressed again from nearest checkpoint
+    memory.release(f.name)
+    assert f.read_at(4096 * 9 + 10, 100) == data[4096 * 9 + 10:4096 * 9 + 110]
+    assert f.cursor[0] == 10
+    for offset in [50000, 17000, 100]:
+        assert f.read_at(offset, 3000) == data[offset:offset + 3000]
+
+    f.close()
+    assert f.handle is None
+    assert f.read_at(60000, 5536) == data[60000:]
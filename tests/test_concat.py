@@ -0,0 +1,43 @@
+"""
+wavebin
+https://github.com/sam210723/wavebin
+
+Waveform capture viewer for oscilloscopes.
+"""
+
+import numpy as np
+from wavebin.concat import sample_time, segment_times, time_sample
+from wavebin.wave import WaveformHeader
+
+
+def header(time, time_tags=0.0, origin=-5e-4):
+    return WaveformHeader(
+        0, 1, 1, 1000, 1, 1e-3, origin, 1e-6, origin,
+        0, 0, b"2024-05-01", time, 0, b"", time_tags, 0
+    )
+
+
+def test_records_keep_gaps_between_triggers():
+    headers = [header(b"12:00:00"), header(b"12:00:10"), header(b"12:00:10"), header(b"")]
+    times = segment_times(headers, [1000] * 4)
+
+    # Second record 10 s after first, third overlaps second so follows on,
+    # fourth has no timestamp so follows on
+    np.testing.assert_allclose(times, [-5e-4, 10 - 5e-4, 10 + 5e-4, 10 + 15e-4])
+
+
+def test_time_tags_order_records_within_second():
+    headers = [header(b"12:00:00", 0.0), header(b"12:00:00", 0.25)]
+    np.testing.assert_allclose(segment_times(headers, [1000] * 2), [-5e-4, 0.25 - 5e-4])
+
+
+def test_sample_time_keeps_gaps():
+    headers = [header(b"12:00:00"), header(b"12:00:10")]
+    waveform = {
+        "header":        headers[0],
+        "segments":      np.array([0, 1000]),
+        "segment_times": segment_times(headers, [1000] * 2)
+    }
+
+    np.testing.assert_allclose(sample_time(waveform, [0, 999, 1000, 1500]), [-5e-4, 4.99e-4, 10 - 5e-4, 10])
+    np.testing.assert_allclose(time_sample(waveform, [-5e-4, 10 - 5e-4, 10]), [0, 1000, 1500])
@@ -0,0 +1,49 @@
+"""
+wavebin
+https://github.com/sam210723/wavebin
+
+Waveform capture viewer for oscilloscopes.
+"""
+
+import wave
+import zipfile
+import numpy as np
+from wavebin.export import PulseView, WaveFile
+from wavebin.logic import bit_planes
+from wavebin.wave import WaveformHeader
+
+
+def header(points, increment=1e-6):
+    return WaveformHeader(
+        0, 6, 1, points, 1, points * increment, 0, increment, 0,
+        0, 0, b"", b"", 0, b"", 0, 0
+    )
+
+
+def test_wav_logic_line_low_is_negative(tmp_path):
+    packed = np.array([0, 1, 1, 0, 1, 0, 0, 1], dtype=np.uint8)
+    line = bit_planes(packed)[0]
+    waveforms = [{ 'header': header(len(packed)), 'data': line }]
+
+    WaveFile(False, tmp_path / "logic.wav", waveforms, chunk=3)
+
+    with wave.open(str(tmp_path / "logic_0.wav"), mode='rb') as f:
+        y = np.frombuffer(f.readframes(f.getnframes()), dtype=np.float16)
+
+    np.testing.assert_array_equal(y, [-1, 1, 1, -1, 1, -1, -1, 1])
+
+
+def test_pulseview_sixteen_logic_lines(tmp_path):
+    packed = np.array([0x0001, 0x8000, 0x00ff, 0xff00, 0xa5a5], dtype=np.uint16)
+    lines = bit_planes(packed)
+    waveforms = [{ 'header': header(len(packed)), 'data': line } for line in lines]
+
+    PulseView(False, tmp_path / "logic.sr", waveforms, True, chunk=2)
+
+    with zipfile.ZipFile(tmp_path / "logic.sr") as z:
+        meta = z.read("metadata").decode()
+        data = np.frombuffer(z.read("logic-1"), dtype="<u2")
+
+    assert "unitsize=2" in meta
+    assert "total probes=16" in meta
+    np.testing.assert_array_equal(data, packed)
@@ -0,0 +1,35 @@
+"""
+wavebin
+https://github.com/sam210723/wavebin
+
+Waveform capture viewer for oscilloscopes.
+"""
+
+import numpy as np
+from wavebin.jitter import JitterAnalysis
+
+
+def test_low_amplitude_clock_edges():
+    # 200 mV differential clock, 20 samples per unit interval
+    t = np.arange(2000)
+    data = np.where((t // 20) % 2, 0.1, -0.1).astype(np.float32)
+
+    result = JitterAnalysis({}).run(data, 1e-9)
+
+    assert len(result['edges']) == 99
+    assert np.isclose(result['ui'], 20e-9)
+    assert result['stats']['tie']['pk-pk'] < 1e-12
+
+
+def test_records_measured_separately():
+    # Two records of a sequence, second with clock phase shifted by a gap
+    t = np.arange(1000)
+    first = np.where((t // 20) % 2, 0.1, -0.1)
+    second = np.where(((t + 7) // 20) % 2, 0.1, -0.1)
+    data = np.concatenate((first, second)).astype(np.float32)
+
+    result = JitterAnalysis({}).run(data, 1e-9, segments=np.array([0, 1000]))
+
+    assert np.isclose(result['ui'], 20e-9)
+    assert result['stats']['tie']['pk-pk'] < 1e-12
+    assert not np.any((result['edges'] >= 999) & (result['edges'] < 1000))
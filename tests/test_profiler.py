@@ -0,0 +1,39 @@
+"""
+wavebin
+https://github.com/sam210723/wavebin
+
+Waveform capture viewer for oscilloscopes.
+"""
+
+import threading
+import tracemalloc
+from wavebin.profiler import Profiler
+
+
+def test_overlapping_stages_are_shared():
+    profiler = Profiler()
+    profiler.enable()
+    started, done = threading.Event(), threading.Event()
+
+    def worker():
+        with profiler.stage("worker"):
+            started.set()
+            done.wait()
+
+    thread = threading.Thread(target=worker)
+    thread.start()
+    started.wait()
+    with profiler.stage("main"):
+        with profiler.stage("inner"):
+            data = bytearray(2**20)
+    done.set()
+    thread.join()
+
+    records = { r['stage']: r for r in profiler.records }
+    assert records['main']['shared'] and records['worker']['shared']
+    assert records['main']['peak'] >= len(data)
+    assert records['worker']['peak'] >= len(data)
+
+    with profiler.stage("alone"): pass
+    assert not profiler.records[-1]['shared']
+    tracemalloc.stop()
@@ -5,15 +5,39 @@ https://github.com/sam210723/wavebin
 Waveform capture viewer for oscilloscopes.
 """
 
-from argparse import ArgumentParser
+from argparse import ArgumentParser, SUPPRESS
+import json
+import numpy as np
+from pathlib import Path
 import sys
+import time
 
-from wavebin.interface import QtApp
-from wavebin.plot import QtPlot
+from wavebin.catalog import Catalog, parse_rate
+from wavebin.compare import compare_pairs
+from wavebin.concat import sample_time
+from wavebin.correlate import PatternSearch, parse_time, template
+from wavebin.ensemble import Ensemble
+from wavebin.export import BinFile
+from wavebin.jitter import JitterAnalysis
+from wavebin.memory import BUDGET, memory, parse_size
+from wavebin.preview import preview_path, render_previews, stale
+from wavebin.profiler import profiler
+from wavebin.server import TileServer
+from wavebin.share import publish
+from wavebin.simulator import ScopeSimulator
+from wavebin.stats import sparkline
 from wavebin.wave import WaveParser
 
 __version__ = "2.3.1"
 
+# Channel colours (Tektronix scheme)
+COLOURS = [
+    (253, 255, 0),
+    (0, 151, 224),
+    (255, 0, 215),
+    (0, 255, 64)
+]
+
 
 def init():
     print( "                              __    _        ")
@@ -29,15 +53,51 @@ def init():
     # Print startup info
     print_info(args)
 
+    # Run headless command
+    if args.command:
+        commands = {
+            "index":   cmd_index,
+            "search":  cmd_search,
+            "compare": cmd_compare,
+            "preview": cmd_preview,
+            "share":   cmd_share,
+            "average": cmd_average,
+            "find":    cmd_find,
+            "jitter":  cmd_jitter,
+            "serve":   cmd_serve
+        }
+        code = commands[args.command](args)
+        safe_exit(code=code or 0)
+
+    # Check watch directory exists
+    if args.watch and not Path(args.watch).is_dir():
+        print(f"Directory \"{args.watch}\" not found")
+        safe_exit(code=1)
+
+    # Run oscilloscope simulator
+    if args.simulate:
+        ScopeSimulator({
+            "host":      "127.0.0.1",
+            "port":      5025,
+            "vendor":    args.simulate,
+            "channels":  2,
+            "increment": 1e-7
+        }).serve()
+        safe_exit()
+
+    # Enable stage profiling
+    if args.profile is not None: profiler.enable()
+
+    # Evict cached data above memory budget
+    memory.configure(args.memory_budget, args.v)
+
+    # Qt is only required for GUI
+    from wavebin.interface import QtApp
+    from wavebin.plot import QtPlot
+
     # Setup waveform capture parser
     wave = WaveParser({ "verbose":     args.v })
 
-    # Get subsampling limit
-    if args.no_limit:
-        limit = int(10e6)
-    else:
-        limit = int(50e3)
-
     # Create Qt application
     app = QtApp({
         "verbose": args.v,
@@ -45,23 +105,22 @@ def init():
         "width":   1100,
         "height":  350,
         "opengl":  not args.no_opengl,
-        "limit":   limit,
+        "glitch":  args.glitch,
+        "catalog": args.db,
     })
 
     # Create Qt waveform plot
     plot = QtPlot({
         "verbose":     args.v,
         "opengl":      not args.no_opengl,
-        "subsampling": limit,
+        "subsampling": int(50e3),
+        "adaptive":    not args.no_limit,
+        "fps":         args.fps,
         "filter_type": 0,
         "clipping":    False,
-        "colours": [
-            (253, 255, 0),
-            (0, 151, 224),
-            (255, 0, 215),
-            (0, 255, 64)
-        ],
-        "channel_gain": [1, 1, 1, 1]
+        "colours":     COLOURS,
+        "channel_gain": [1, 1, 1, 1],
+        "math":         args.math or []
     })
 
     # Set class instances
@@ -74,9 +133,27 @@ def init():
     # Parse file if path specified in argument
     if args.file and not wave.parse(args.file): safe_exit(code=1)
 
+    # Watch directory for new captures
+    if args.watch: app.watch(args.watch)
+
+    # Stream waveforms from oscilloscope
+    if args.live:
+        host, _, port = args.live.partition(":")
+        app.live({
+            "verbose": args.v,
+            "host":    host,
+            "port":    int(port or 5025),
+            "fps":     args.fps,
+            "points":  10000,
+            "depth":   100000
+        })
+
     # Run application
     app.run()
 
+    # Print or save profiling report
+    profiler.report(args.profile)
+
     # Gracefully exit application
     safe_exit()
 
@@ -85,15 +162,363 @@ def parse_args():
     argp = ArgumentParser(description="Waveform capture viewer for Keysight oscilloscopes.")
     argp.prog = "wavebin"
 
-    argp.add_argument("-i", action="store", help="path to Keysight waveform capturefile (.bin)", default=None, dest="file")
+    argp.add_argument("-i", action="store", nargs="+", help="path to Keysight waveform capturefile (.bin), multiple files are opened as one sequence", default=None, dest="file")
+    argp.add_argument("--watch", action="store", help="watch directory and open new capture files as they are saved", default=None, metavar="DIR")
+    argp.add_argument("--live", action="store", help="stream waveforms from oscilloscope over SCPI (default port 5025)", default=None, metavar="HOST[:PORT]")
+    argp.add_argument("--fps", action="store", type=float, help="target frame rate for rendering and live mode (default 30)", default=30)
+    argp.add_argument("--simulate", action="store", nargs="?", const="keysight", choices=["keysight", "rigol"], help="run simulated oscilloscope on localhost:5025 for live mode testing", default=None)
+    argp.add_argument("--math", action="append", help="add math channel, e.g. \"CH1-CH2\" or \"diff(CH1)\" (may be repeated)", default=None, metavar="EXPR")
+    argp.add_argument("--glitch", action="store", type=float, help="maximum pulse width in ns for glitch events (default 10)", default=10, metavar="NS")
     argp.add_argument("-v", action="store_true", help="enable verbose logging mode")
     argp.add_argument("--no-opengl", action="store_true", help="disable hardware accelerated rendering with OpenGL")
-    argp.add_argument("--no-limit", action="store_true", help="disable subsampling limit (may cause slow frame rates with large captures)")
-    return argp.parse_args()
+    argp.add_argument("--profile", action="store", nargs="?", const="", help="print stage timings on exit, or write them to a JSON file", default=None, metavar="FILE")
+    argp.add_argument("--memory-budget", action="store", type=parse_size, help=f"memory for cached and mapped waveform data, e.g. 8G (default {BUDGET // 2**30}G)", default=BUDGET, metavar="SIZE")
+    argp.add_argument("--no-limit", action="store_true", help="render all points without adapting to frame rate (may cause slow frame rates with large captures)")
+    argp.add_argument("--db", action="store", help=f"path to capture catalog database (default {default_catalog()})", default=default_catalog(), metavar="FILE")
+
+    # Headless commands
+    subp = argp.add_subparsers(dest="command", metavar="command")
+
+    p = subp.add_parser("index", help="add capture files in a directory to the catalog")
+    p.add_argument("dir", help="directory containing capture files (searched recursively)")
+    p.add_argument("--db", action="store", help="path to capture catalog database", default=SUPPRESS, metavar="FILE")
+
+    p = subp.add_parser("search", help="search capture catalog")
+    p.add_argument("--serial", action="store", help="device serial number (partial match)", default=None)
+    p.add_argument("--model", action="store", help="device model (partial match)", default=None)
+    p.add_argument("--date", action="store", help="capture date prefix (YYYY-MM-DD, YYYY-MM or YYYY)", default=None)
+    p.add_argument("--label", action="store", help="waveform label", default=None)
+    p.add_argument("--min-rate", action="store", type=parse_rate, help="minimum sample rate, e.g. 1G", default=None, metavar="RATE")
+    p.add_argument("--db", action="store", help="path to capture catalog database", default=SUPPRESS, metavar="FILE")
+
+    p = subp.add_parser("compare", help="compare captures against a golden capture")
+    p.add_argument("golden", help="golden capture file, or directory of golden captures matched by file name")
+    p.add_argument("test", nargs="+", help="capture files or directories to compare")
+    p.add_argument("--abs", action="store", type=float, help="absolute tolerance in waveform units (default 0)", default=0.0, metavar="V")
+    p.add_argument("--rel", action="store", type=float, help="tolerance relative to golden value, e.g. 0.05 (default 0)", default=0.0, metavar="R")
+    p.add_argument("--channel", action="append", type=int, help="compare channel number only (may be repeated)", default=None, metavar="N")
+    p.add_argument("--workers", action="store", type=int, help="number of parallel processes (default CPU count)", default=None, metavar="N")
+    p.add_argument("--json", action="store", help="write results to JSON file", default=None, metavar="FILE")
+
+    p = subp.add_parser("preview", help="render PNG previews of capture files")
+    p.add_argument("dir", help="directory containing capture files (searched recursively)")
+    p.add_argument("--out", action="store", help="output directory (default next to each capture)", default=None, metavar="DIR")
+    p.add_argument("--width", action="store", type=int, help="preview width in pixels (default 800)", default=800)
+    p.add_argument("--height", action="store", type=int, help="preview height in pixels (default 480)", default=480)
+    p.add_argument("--workers", action="store", type=int, help="number of parallel processes (default CPU count)", default=None, metavar="N")
+    p.add_argument("--force", action="store_true", help="render previews even if they are up to date")
+
+    p = subp.add_parser("share", help="publish capture in shared memory for other processes")
+    p.add_argument("file", nargs="+", help="capture file, multiple files are opened as one sequence")
+    p.add_argument("--name", action="store", help="shared memory block name (default random)", default=None)
+
+    p = subp.add_parser("average", help="average repeated captures and find min/max envelope")
+    p.add_argument("file", nargs="+", help="capture files with matching channels and sample rates")
+    p.add_argument("-o", action="store", help="output capture file for mean waveforms, with _std, _min and _max files alongside", required=True, metavar="FILE", dest="out")
+    p.add_argument("--workers", action="store", type=int, help="number of parallel reader threads (default CPU count, max 8)", default=None, metavar="N")
+
+    p = subp.add_parser("find", help="find occurrences of a template waveform in a capture")
+    p.add_argument("file", nargs="+", help="capture file to search, multiple files are opened as one sequence")
+    p.add_argument("--start", action="store", type=parse_time, help="template start time, e.g. 1.5m", required=True, metavar="TIME")
+    p.add_argument("--stop", action="store", type=parse_time, help="template stop time, e.g. 1.6m", required=True, metavar="TIME")
+    p.add_argument("--template", action="store", help="capture file containing template (default searched capture)", default=None, metavar="FILE")
+    p.add_argument("--channel", action="store", type=int, help="channel number to search (default 1)", default=1, metavar="N")
+    p.add_argument("--threshold", action="store", type=float, help="minimum normalised correlation of a match (default 0.8)", default=0.8, metavar="R")
+    p.add_argument("--max", action="store", type=int, help="maximum number of matches (default 1000)", default=1000, metavar="N", dest="max_matches")
+    p.add_argument("--json", action="store", help="write matches to JSON file", default=None, metavar="FILE")
+
+    p = subp.add_parser("jitter", help="measure time interval error and period jitter of edges")
+    p.add_argument("file", nargs="+", help="capture file, multiple files are opened as one sequence")
+    p.add_argument("--channel", action="store", type=int, help="channel number to analyse (default 1)", default=1, metavar="N")
+    p.add_argument("--edges", action="store", choices=["both", "rising", "falling"], help="edges to measure, use rising for clock signals (default both)", default="both")
+    p.add_argument("--clock", action="store", choices=["constant", "pll"], help="ideal clock recovery (default constant)", default="constant")
+    p.add_argument("--bandwidth", action="store", type=float, help="PLL bandwidth as fraction of bit rate (default 1/1667)", default=1 / 1667, metavar="F")
+    p.add_argument("--threshold", action="store", type=float, help="edge threshold in volts (default mid-level)", default=None, metavar="V")
+    p.add_argument("--json", action="store", help="write statistics, TIE histogram and TIE of each edge to JSON file", default=None, metavar="FILE")
+
+    p = subp.add_parser("serve", help="serve captures in a directory for viewing in a web browser")
+    p.add_argument("dir", help="directory containing capture files (searched recursively)")
+    p.add_argument("--host", action="store", help="address to listen on, use 0.0.0.0 for other computers (default 127.0.0.1)", default="127.0.0.1")
+    p.add_argument("--port", action="store", type=int, help="port to listen on (default 8080)", default=8080)
+    p.add_argument("--workers", action="store", type=int, help="number of tile worker threads (default CPU count, max 8)", default=None, metavar="N")
+
+    args = argp.parse_args()
+
+    # Frame rate sets frame time budget and live mode timer interval
+    if args.fps <= 0: argp.error("--fps must be greater than 0")
+
+    return args
+
+
+def default_catalog():
+    return Path.home() / ".wavebin" / "catalog.db"
+
+
+def cmd_index(args):
+    if not Path(args.dir).is_dir():
+        print(f"Directory \"{args.dir}\" not found")
+        return 1
+
+    catalog = Catalog({ "verbose": args.v, "db": args.db })
+    catalog.index(args.dir)
+    catalog.close()
+
+
+def cmd_search(args):
+    catalog = Catalog({ "verbose": args.v, "db": args.db })
+
+    start = time.perf_counter()
+    results = catalog.search(
+        serial=args.serial,
+        model=args.model,
+        date=args.date,
+        label=args.label,
+        min_rate=args.min_rate
+    )
+    elapsed = time.perf_counter() - start
+    catalog.close()
+
+    for r in results:
+        rate = WaveParser({ "verbose": False }).human_format(r['sample_rate'], sep=" ")
+        print(f"{r['date']:<10} {r['time']:<8}  {r['model']:<12} {r['serial']:<16} {rate:>7}sps  {r['path']}")
+    print(f"\n{len(results)} captures found in {elapsed * 1e3:.1f} ms")
+
+
+def cmd_compare(args):
+    golden = Path(args.golden)
+    if not golden.exists():
+        print(f"Golden capture \"{golden}\" not found")
+        return 1
+
+    # Pair each test capture with its golden capture
+    pairs = []
+    for t in args.test:
+        t = Path(t)
+        for f in sorted(t.rglob("*.bin")) if t.is_dir() else [t]:
+            g = golden / f.name if golden.is_dir() else golden
+            if not g.exists():
+                print(f"No golden capture for \"{f}\"")
+                return 1
+            pairs.append((str(g), str(f)))
+    if not pairs:
+        print("No captures to compare")
+        return 1
+
+    start = time.perf_counter()
+    results = compare_pairs(pairs, {
+        "verbose":  args.v,
+        "abs":      args.abs,
+        "rel":      args.rel,
+        "channels": args.channel
+    }, workers=args.workers)
+    elapsed = time.perf_counter() - start
+
+    # Print result of each pair
+    print()
+    for r in results:
+        if r['error']:
+            print(f"FAIL  {r['test']}: {r['error']}")
+            continue
+
+        for c in r['channels']:
+            status = "PASS" if c['passed'] else "FAIL"
+            detail = c.get('error') or f"{c['violations']} violations, max error {c['max_error']:.4g}"
+            print(f"{status}  {r['test']} CH{c['channel']}: {detail}")
+            if c['times']:
+                times = ", ".join(f"{t:.6g}" for t in c['times'][:5])
+                print(f"      first violations at {times} s")
+
+    failed = sum(not r['passed'] for r in results)
+    print(f"\n{len(results) - failed}/{len(results)} captures passed in {elapsed:.2f} s")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+    return 1 if failed else 0
+
+
+def cmd_preview(args):
+    root = Path(args.dir)
+    if not root.is_dir():
+        print(f"Directory \"{args.dir}\" not found")
+        return 1
+
+    # Only render previews that are missing or older than their capture
+    captures = sorted(root.rglob("*.bin"))
+    jobs = [(f, preview_path(f, root, args.out)) for f in captures]
+    if not args.force: jobs = [j for j in jobs if stale(*j)]
+    print(f"Rendering {len(jobs)} previews ({len(captures) - len(jobs)} up to date)")
+
+    start = time.perf_counter()
+    errors = render_previews(jobs, {
+        "verbose": args.v,
+        "width":   args.width,
+        "height":  args.height,
+        "colours": COLOURS
+    }, workers=args.workers) if jobs else []
+    elapsed = time.perf_counter() - start
+
+    for e in errors: print(f"Unable to render {e}")
+    print(f"Rendered {len(jobs) - len(errors)} previews in {elapsed:.2f} s")
+
+    return 1 if errors else 0
+
+
+def cmd_share(args):
+    wave = WaveParser({ "verbose": args.v })
+    if not wave.load(args.file): return 1
+
+    capture = publish(wave.waveforms, name=args.name)
+    try:
+        size = wave.human_format(capture.shm.size, binary=True)
+        print(f"Published {len(capture.waveforms)} waveforms ({size}B) as \"{capture.name}\"")
+        print(f"Attach with wavebin.share.attach(\"{capture.name}\"), press Ctrl+C to stop sharing")
+
+        while True: time.sleep(1)
+    finally:
+        capture.close()
+
+
+def cmd_average(args):
+    config = { "verbose": args.v }
+    if args.workers: config['workers'] = args.workers
+
+    start = time.perf_counter()
+    try:
+        result = Ensemble(config).run(args.file)
+    except ValueError as e:
+        print(e)
+        return 1
+    elapsed = time.perf_counter() - start
+
+    # Save mean as capture, other statistics alongside with suffix
+    out = Path(args.out)
+    for k in ["mean", "std", "min", "max"]:
+        path = out if k == "mean" else out.with_name(f"{out.stem}_{k}{out.suffix}")
+        BinFile(args.v, path, result[k])
+        print(f"Saved {k} to \"{path}\"")
+    print(f"Averaged {result['count']} captures in {elapsed:.2f} s")
+
+
+def cmd_find(args):
+    wave = WaveParser({ "verbose": args.v })
+    if not wave.load(args.file): return 1
+    ch = args.channel - 1
+    if not 0 <= ch < len(wave.waveforms):
+        print(f"Channel CH{args.channel} not in capture")
+        return 1
+    waveform = wave.waveforms[ch]
+
+    # Template from the same channel of another capture, or of the searched capture
+    source = waveform
+    if args.template:
+        other = WaveParser({ "verbose": args.v })
+        if not other.load(args.template) or ch >= len(other.waveforms): return 1
+        source = other.waveforms[ch]
+        if not np.isclose(source['header'].x_increment, waveform['header'].x_increment, rtol=1e-9):
+            print("Template has different sample rate")
+            return 1
+
+    start = time.perf_counter()
+    try:
+        search = PatternSearch({
+            "verbose":     args.v,
+            "threshold":   args.threshold,
+            "max_matches": args.max_matches
+        })
+        positions, scores = search.search(waveform['data'], template(source, args.start, args.stop))
+    except ValueError as e:
+        print(e)
+        return 1
+    elapsed = time.perf_counter() - start
+
+    # Print ranked matches
+    # Sequences keep gaps between records
+    times = sample_time(waveform, positions)
+    print()
+    for i, (t, r) in enumerate(zip(times, scores)):
+        print(f"{i + 1:>5}  {t:>14.9f} s  {r:.4f}")
+    print(f"\n{len(positions)} matches found in {elapsed:.2f} s")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump([
+                { "sample": int(p), "time": float(t), "score": float(r) }
+                for p, t, r in zip(positions, times, scores)
+            ], f, indent=2)
+
+
+def cmd_jitter(args):
+    wave = WaveParser({ "verbose": args.v })
+    if not wave.load(args.file): return 1
+    ch = args.channel - 1
+    if not 0 <= ch < len(wave.waveforms):
+        print(f"Channel CH{args.channel} not in capture")
+        return 1
+    waveform = wave.waveforms[ch]
+
+    start = time.perf_counter()
+    try:
+        result = JitterAnalysis({
+            "verbose":   args.v,
+            "edges":     args.edges,
+            "clock":     args.clock,
+            "bandwidth": args.bandwidth,
+            "threshold": args.threshold
+        }).run(waveform['data'], waveform['header'].x_increment, waveform.get('segments'))
+    except ValueError as e:
+        print(e)
+        return 1
+    elapsed = time.perf_counter() - start
+
+    # Print statistics in picoseconds
+    print()
+    print(f"Unit interval  {result['ui'] * 1e12:.3f} ps ({len(result['edges'])} edges)")
+    print(f"{'':16}{'mean':>12}{'rms':>12}{'pk-pk':>12}{'min':>12}{'max':>12}")
+    for name, key in [("TIE", "tie"), ("Period", "period"), ("Cycle-to-cycle", "c2c")]:
+        stats = result['stats'][key]
+        print(f"{name:16}" + "".join(f"{stats[k] * 1e12:>12.3f}" for k in ["mean", "rms", "pk-pk", "min", "max"]))
+    counts, edges = result['histogram']
+    used = np.flatnonzero(counts)
+    print(f"\nTIE histogram  {edges[used[0]] * 1e12:.3f} ps {sparkline(counts, width=48)} {edges[used[-1] + 1] * 1e12:.3f} ps")
+    print(f"\nAnalysed in {elapsed:.2f} s")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({
+                "ui":    result['ui'],
+                "stats": result['stats'],
+                "edges": sample_time(waveform, result['edges']).tolist(),
+                "tie":   result['tie'].tolist(),
+                "histogram": {
+                    "counts": result['histogram'][0].tolist(),
+                    "edges":  result['histogram'][1].tolist()
+                }
+            }, f)
+
+
+def cmd_serve(args):
+    if not Path(args.dir).is_dir():
+        print(f"Directory \"{args.dir}\" not found")
+        return 1
+
+    # Summaries of served captures are cached within memory budget
+    memory.configure(args.memory_budget, args.v)
+
+    config = {
+        "verbose": args.v,
+        "dir":     args.dir,
+        "host":    args.host,
+        "port":    args.port
+    }
+    if args.workers: config['workers'] = args.workers
+    TileServer(config).serve()
 
 
 def print_info(args):
     if args.no_opengl and args.v: print("OpenGL disabled")
+    if args.watch: print(f"Watching \"{args.watch}\" for new captures")
 
 
 def safe_exit(msg=True, code=0):
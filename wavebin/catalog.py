@@ -0,0 +1,216 @@
+"""
+wavebin
+https://github.com/sam210723/wavebin
+
+Waveform capture viewer for oscilloscopes.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import os
+from pathlib import Path
+import sqlite3
+import struct
+import time
+from wavebin.wave import WaveParser
+
+
+class Catalog():
+    """
+    SQLite catalog of capture file headers
+    """
+
+    schema = """
+        CREATE TABLE IF NOT EXISTS captures (
+            id          INTEGER PRIMARY KEY,
+            path        TEXT UNIQUE NOT NULL,
+            size        INTEGER NOT NULL,
+            mtime       REAL NOT NULL,
+            waveforms   INTEGER NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS waveforms (
+            capture     INTEGER NOT NULL REFERENCES captures(id) ON DELETE CASCADE,
+            number      INTEGER NOT NULL,
+            label       TEXT,
+            model       TEXT,
+            serial      TEXT,
+            date        TEXT,
+            time        TEXT,
+            x_increment REAL,
+            sample_rate REAL,
+            points      INTEGER,
+            wave_type   INTEGER
+        );
+        CREATE INDEX IF NOT EXISTS waveforms_capture ON waveforms(capture);
+        CREATE INDEX IF NOT EXISTS waveforms_serial ON waveforms(serial, date);
+        CREATE INDEX IF NOT EXISTS waveforms_date ON waveforms(date);
+        CREATE INDEX IF NOT EXISTS waveforms_rate ON waveforms(sample_rate);
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.config['db'] = Path(self.config['db'])
+        self.config['db'].parent.mkdir(parents=True, exist_ok=True)
+
+        self.db = sqlite3.connect(str(self.config['db']))
+        self.db.execute("PRAGMA foreign_keys = ON")
+        self.db.executescript(self.schema)
+
+
+    def index(self, path):
+        """
+        Add new and modified captures in a directory to the catalog
+        """
+
+        start = time.perf_counter()
+        path = Path(path).resolve()
+        self.log(f"Indexing \"{path}\"")
+
+        # Get current size and modification time of each capture
+        files = {}
+        for f in path.rglob("*.bin"):
+            try:
+                stat = f.stat()
+            except OSError:
+                continue
+            files[str(f)] = (stat.st_size, stat.st_mtime)
+
+        # Compare with catalog entries under this directory
+        prefix = os.path.join(str(path), "")
+        known = {
+            row[0]: (row[1], row[2])
+            for row in self.db.execute(
+                "SELECT path, size, mtime FROM captures WHERE path >= ? AND path < ?",
+                (prefix, prefix + "\uffff")
+            )
+        }
+        changed = [f for f, stat in files.items() if known.get(f) != stat]
+        removed = [f for f in known if f not in files]
+
+        # Read headers in parallel, network shares are latency bound
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            results = list(pool.map(self.read, changed))
+
+        # Update catalog in single transaction
+        added = 0
+        with self.db:
+            self.db.executemany("DELETE FROM captures WHERE path = ?", [(f,) for f in removed + changed])
+
+            for f, headers in zip(changed, results):
+                if headers is None: continue
+                size, mtime = files[f]
+
+                cur = self.db.execute(
+                    "INSERT INTO captures (path, size, mtime, waveforms) VALUES (?, ?, ?, ?)",
+                    (f, size, mtime, len(headers))
+                )
+                self.db.executemany(
+                    "INSERT INTO waveforms VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    [(cur.lastrowid, i, *fields(h)) for i, h in enumerate(headers)]
+                )
+                added += 1
+
+        elapsed = time.perf_counter() - start
+        print(
+            f"Indexed {len(files)} captures in {elapsed:.2f} s "\
+            f"({added} updated, {len(changed) - added} unreadable, {len(removed)} removed)"
+        )
+
+        return added
+
+
+    def read(self, path):
+        # Header-only parse, separate parser per thread
+        try:
+            return WaveParser({ "verbose": False }).read_headers(path)
+        except (OSError, ValueError, struct.error) as e:
+            self.log(f"Unable to read \"{path}\": {e}")
+            return None
+
+
+    def search(self, serial=None, model=None, date=None, label=None, min_rate=None, limit=1000):
+        """
+        Find captures with at least one waveform matching all given fields
+        """
+
+        where = []
+        params = []
+        if serial:
+            where.append("w.serial LIKE ?")
+            params.append(f"%{serial}%")
+        if model:
+            where.append("w.model LIKE ?")
+            params.append(f"%{model}%")
+        if date:
+            where.append("w.date LIKE ?")
+            params.append(f"{date}%")
+        if label:
+            where.append("w.label = ?")
+            params.append(label)
+        if min_rate:
+            where.append("w.sample_rate >= ?")
+            params.append(float(min_rate))
+
+        query = (
+            "SELECT c.path, w.model, w.serial, w.date, w.time, MAX(w.sample_rate), w.points, c.waveforms "\
+            "FROM waveforms w JOIN captures c ON c.id = w.capture "\
+            f"{'WHERE ' + ' AND '.join(where) if where else ''} "\
+            "GROUP BY c.id ORDER BY w.date DESC, w.time DESC LIMIT ?"
+        )
+        params.append(limit)
+
+        columns = ["path", "model", "serial", "date", "time", "sample_rate", "points", "waveforms"]
+        return [dict(zip(columns, row)) for row in self.db.execute(query, params)]
+
+
+    def close(self):
+        self.db.close()
+
+
+    def log(self, msg):
+        if self.config['verbose']: print(msg)
+
+
+def fields(header):
+    """
+    Catalog columns from waveform header
+    """
+
+    text = lambda b: b.decode(errors="replace").rstrip("\0").strip()
+    frame = text(header.frame).split(":")
+
+    return (
+        text(header.label),
+        frame[0],
+        frame[1] if len(frame) > 1 else "",
+        normalise_date(text(header.date)),
+        text(header.time),
+        header.x_increment,
+        1 / header.x_increment if header.x_increment else 0,
+        header.points,
+        header.wave_type
+    )
+
+
+def normalise_date(date):
+    # Keysight and Rigol date formats to ISO 8601
+    for fmt in ["%Y-%m-%d", "%d %b %Y", "%d-%b-%Y", "%Y/%m/%d"]:
+        try:
+            return datetime.strptime(date, fmt).date().isoformat()
+        except ValueError:
+            continue
+
+    return date
+
+
+def parse_rate(value):
+    """
+    Parse sample rate with optional SI suffix, e.g. "1G" or "250M"
+    """
+
+    suffixes = { "k": 1e3, "K": 1e3, "M": 1e6, "G": 1e9 }
+    value = value.rstrip("sSpa/")
+    if value and value[-1] in suffixes:
+        return float(value[:-1]) * suffixes[value[-1]]
+
+    return float(value)
@@ -0,0 +1,147 @@
+"""
+wavebin
+https://github.com/sam210723/wavebin
+
+Waveform capture viewer for oscilloscopes.
+"""
+
+import numpy as np
+import re
+from wavebin.memory import memory
+from wavebin.profiler import profiler
+from wavebin.resample import align
+
+
+class MathChannel():
+    """
+    Virtual channel defined by an expression of capture channels, evaluated
+    lazily in tiles covering only the requested sample range
+    """
+
+    # Samples per cached tile and per cumulative sum block
+    tile = 4096
+    block = 2**16
+
+    def __init__(self, expression, waveforms):
+        self.expression = expression.strip()
+        self.waveforms = waveforms
+        self.parse()
+
+        # Math channel shares length and time base of its first source, other sources are resampled to it
+        self.inputs = align([waveforms[s] for s in self.sources])
+        self.length = len(self.inputs[0]['data'])
+        self.header = self.inputs[0]['header']
+
+        # Cumulative sums at block boundaries for integrals
+        self.prefix = np.zeros(1, dtype=np.float64)
+
+
+    def parse(self):
+        # Unary functions, e.g. "diff(CH1)" or "integ(CH2)"
+        m = re.fullmatch(r"(diff|integ)\s*\(\s*CH(\d)\s*\)", self.expression, re.IGNORECASE)
+        if m:
+            self.op = m.group(1).lower()
+            self.sources = [int(m.group(2)) - 1]
+        else:
+            # Binary operators, e.g. "CH1 - CH2"
+            m = re.fullmatch(r"CH(\d)\s*([-+*])\s*CH(\d)", self.expression, re.IGNORECASE)
+            if not m: raise ValueError(f"Invalid math expression \"{self.expression}\"")
+            self.op = m.group(2)
+            self.sources = [int(m.group(1)) - 1, int(m.group(3)) - 1]
+
+        for s in self.sources:
+            if not 0 <= s < len(self.waveforms):
+                raise ValueError(f"Channel CH{s + 1} not in capture")
+
+
+    def window(self, start, stop, points):
+        """
+        Evaluate at most ~points samples covering [start, stop), returning
+        (first sample index, sample step, values)
+        """
+
+        start = max(int(start), 0)
+        stop = min(int(stop), self.length)
+        if stop <= start: return start, 1, np.empty(0, dtype=np.float32)
+
+        # Power of two steps so tiles are shared between nearby zoom levels
+        step = 1
+        while (stop - start) / step > points: step *= 2
+
+        # Collect cached tiles covering window
+        span = self.tile * step
+        first, last = start // span, (stop - 1) // span
+        y = np.concatenate([self.get_tile(t, step) for t in range(first, last + 1)])
+
+        return first * span, step, y
+
+
+    def get_tile(self, t, step):
+        # Evaluated tiles are shared with other caches under the memory budget
+        start = t * self.tile * step
+        stop = min(start + self.tile * step, self.length)
+
+        return memory.cached((self, t, step), lambda: self.evaluate(start, stop, step))
+
+
+    def evaluate(self, start, stop, step=1):
+        """
+        Evaluate samples start, start + step, ... up to stop in chunks
+        """
+
+        out = []
+        chunk = max(2**22 // step, 1) * step
+        with profiler.stage("math", (stop - start) * 4 * len(self.sources)):
+            total = None
+            for s0 in range(start, stop, chunk):
+                s1 = min(s0 + chunk, stop)
+                if self.op == "integ":
+                    y, total = self.integrate(s0, s1, step, total)
+                else:
+                    y = self.compute(s0, s1, step)
+                out.append(y.astype(np.float32, copy=False))
+
+        return np.concatenate(out) if out else np.empty(0, dtype=np.float32)
+
+
+    def compute(self, start, stop, step):
+        data = [w['data'] for w in self.inputs]
+
+        if self.op == "diff":
+            # Central difference, one-sided at ends of capture
+            idx = np.arange(start, stop, step)
+            left = np.maximum(idx - 1, 0)
+            right = np.minimum(idx + 1, self.length - 1)
+            dy = data[0][right].astype(np.float64) - data[0][left]
+            return dy / ((right - left) * self.header.x_increment)
+
+        a = np.asarray(data[0][start:stop:step], dtype=np.float32)
+        b = np.asarray(data[1][start:stop:step], dtype=np.float32)
+        if self.op == "+": return a + b
+        if self.op == "-": return a - b
+        return a * b
+
+
+    def integrate(self, start, stop, step, total=None):
+        data = self.inputs[0]['data']
+
+        # Sum of all samples before start of range
+        if total is None: total = self.cumulative(start)
+
+        c = np.cumsum(data[start:stop], dtype=np.float64) + total
+        return c[::step] * self.header.x_increment, c[-1]
+
+
+    def cumulative(self, index):
+        data = self.inputs[0]['data']
+        block = index // self.block
+
+        # Extend cached block sums up to block containing index
+        if len(self.prefix) <= block:
+            sums = [
+                np.sum(data[b * self.block:(b + 1) * self.block], dtype=np.float64)
+                for b in range(len(self.prefix) - 1, block)
+            ]
+            self.prefix = np.concatenate((self.prefix, self.prefix[-1] + np.cumsum(sums)))
+
+        return self.prefix[block] + np.sum(data[block * self.block:index], dtype=np.float64)
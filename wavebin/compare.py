@@ -0,0 +1,160 @@
+"""
+wavebin
+https://github.com/sam210723/wavebin
+
+Waveform capture viewer for oscilloscopes.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from pathlib import Path
+import struct
+from wavebin.wave import WaveParser
+
+
+class Comparison():
+    """
+    Compare test captures against a golden capture within a tolerance envelope
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.config.setdefault('abs', 0.0)
+        self.config.setdefault('rel', 0.0)
+        self.config.setdefault('channels', None)
+        self.config.setdefault('max_violations', 100)
+        self.config.setdefault('chunk', 2**22)
+
+
+    def compare(self, golden, test):
+        """
+        Compare all channels of two capture files, returns result dict
+        """
+
+        result = {
+            "golden":   str(golden),
+            "test":     str(test),
+            "passed":   False,
+            "error":    None,
+            "channels": []
+        }
+
+        try:
+            g = self.load(golden)
+            t = self.load(test)
+        except (OSError, ValueError, struct.error) as e:
+            result['error'] = str(e)
+            return result
+
+        if len(g) != len(t):
+            result['error'] = f"Channel count differs ({len(g)} golden, {len(t)} test)"
+            return result
+
+        channels = self.config['channels'] or range(1, len(g) + 1)
+        for n in channels:
+            if not 1 <= n <= len(g):
+                result['error'] = f"Channel CH{n} not in capture"
+                return result
+
+            self.log(f"Comparing CH{n} of \"{Path(test).name}\"")
+            result['channels'].append(self.compare_waveform(n, g[n - 1], t[n - 1]))
+
+        result['passed'] = all(c['passed'] for c in result['channels'])
+        return result
+
+
+    def compare_waveform(self, n, golden, test):
+        """
+        Compare test waveform against golden waveform on the golden time base
+        """
+
+        gh, th = golden['header'], test['header']
+        gd, td = golden['data'], test['data']
+
+        # Position of each golden sample in test samples is offset + i * ratio
+        ratio = gh.x_increment / th.x_increment
+        offset = (gh.x_d_origin - th.x_d_origin) / th.x_increment
+
+        # Golden samples inside test capture
+        first = max(int(np.ceil(-offset / ratio - 1e-9)), 0)
+        last = min(int(np.floor((len(td) - 1 - offset) / ratio + 1e-9)), len(gd) - 1)
+
+        result = {
+            "channel":    n,
+            "passed":     False,
+            "points":     max(last - first + 1, 0),
+            "resampled":  False,
+            "violations": 0,
+            "max_error":  0.0,
+            "indices":    [],
+            "times":      []
+        }
+        if last < first:
+            result['error'] = "Captures do not overlap"
+            return result
+
+        # Samples line up without interpolation if time bases differ by a whole number of samples
+        aligned = abs(ratio - 1) < 1e-9 and abs(offset - round(offset)) < 1e-6
+        shift = int(round(offset))
+        result['resampled'] = not aligned
+
+        indices = []
+        for start in range(first, last + 1, self.config['chunk']):
+            stop = min(start + self.config['chunk'], last + 1)
+            g = np.asarray(gd[start:stop], dtype=np.float64)
+
+            if aligned:
+                t = np.asarray(td[start + shift:stop + shift], dtype=np.float64)
+            else:
+                t = self.resample(td, offset + np.arange(start, stop) * ratio)
+
+            # Tolerance envelope around golden waveform
+            error = np.abs(t - g)
+            limit = self.config['abs'] + self.config['rel'] * np.abs(g)
+            bad = np.flatnonzero(error > limit)
+
+            result['violations'] += len(bad)
+            if len(error): result['max_error'] = max(result['max_error'], float(np.amax(error)))
+            if len(indices) < self.config['max_violations']:
+                indices.extend((bad[:self.config['max_violations'] - len(indices)] + start).tolist())
+
+        result['indices'] = indices
+        result['times'] = [gh.x_d_origin + i * gh.x_increment for i in indices]
+        result['passed'] = result['violations'] == 0
+
+        return result
+
+
+    def resample(self, data, positions):
+        # Linear interpolation of data at fractional sample positions
+        lo = max(int(np.floor(positions[0])), 0)
+        hi = min(int(np.ceil(positions[-1])) + 1, len(data))
+        y = np.asarray(data[lo:hi], dtype=np.float64)
+
+        return np.interp(positions, np.arange(lo, hi), y)
+
+
+    def load(self, path):
+        parser = WaveParser({ "verbose": False })
+        if not parser.load(path): raise ValueError(f"Unable to read \"{path}\"")
+
+        return parser.waveforms
+
+
+    def log(self, msg):
+        if self.config['verbose']: print(msg)
+
+
+def compare_pairs(pairs, config, workers=None):
+    """
+    Compare (golden, test) capture pairs in parallel processes, results in pair order
+    """
+
+    if len(pairs) == 1: return [Comparison(config).compare(*pairs[0])]
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(compare_pair, pairs, [config] * len(pairs)))
+
+
+def compare_pair(pair, config):
+    return Comparison(dict(config)).compare(*pair)
@@ -0,0 +1,455 @@
+"""
+wavebin
+https://github.com/sam210723/wavebin
+
+Waveform capture viewer for oscilloscopes.
+"""
+
+import base64
+import json
+import numpy as np
+import os
+from pathlib import Path
+import struct
+import threading
+import zipfile
+import zlib
+from wavebin.memory import memory
+
+# Decompressed data is cached and indexed in blocks of this size
+BLOCK = 2**22
+
+# Header reads up to this size are stored in seek index
+SPAN = 4096
+
+# Compressed bytes read at a time, small enough to limit output of highly compressible data
+READ = 2**16
+
+# Decompressor state is kept every this many blocks, so blocks before the cursor
+# are re-read without decompressing from the start of the stream
+CHECKPOINT = 16
+
+
+def compression(path):
+    """
+    Compression of capture file, or None for uncompressed files
+    """
+
+    path = Path(path)
+    if zip_member(path): return "zip"
+
+    return {
+        ".gz":  "gzip",
+        ".zst": "zstd"
+    }.get(path.suffix.lower())
+
+
+def zip_member(path):
+    """
+    (archive, member name) of a path inside a zip archive, e.g. "set.zip/capture.bin", or None
+    """
+
+    path = Path(path)
+    for parent in path.parents:
+        if parent.suffix.lower() == ".zip" and parent.is_file():
+            return parent, path.relative_to(parent).as_posix()
+
+    return None
+
+
+def zip_captures(path):
+    """
+    Paths of capture files in a zip archive
+    """
+
+    with zipfile.ZipFile(path) as z:
+        names = [i.filename for i in z.infolist() if not i.is_dir() and i.filename.lower().endswith(".bin")]
+
+    return [Path(path) / n for n in sorted(names)]
+
+
+def open_capture(path):
+    """
+    Capture file opened for reading, compressed files are decompressed as they are read
+    """
+
+    kind = compression(path)
+    if kind is None: return open(path, mode="rb")
+
+    return CompressedFile(path, kind)
+
+
+def capture_array(path, offset, count, dtype):
+    """
+    Waveform samples in capture file, memory-mapped or decompressed on access
+    """
+
+    if compression(path) is None:
+        return np.memmap(path, dtype=dtype, mode="r", offset=offset, shape=(count,)).view(np.ndarray)
+
+    return CompressedFile(path, compression(path)).array(offset, count, dtype)
+
+
+class CompressedFile():
+    """
+    Read-only file object over a compressed capture file. Decompression starts
+    from the nearest restart point in a sidecar seek index, so headers and
+    waveform data can be read without decompressing the whole file.
+    """
+
+    def __init__(self, path, kind):
+        self.path = Path(path)
+        self.name = str(path)
+        self.kind = kind
+        self.pos = 0
+        self.handle = None
+        self.lock = threading.RLock()
+
+        # Decompressor left at end of last block read, continued by sequential reads
+        self.cursor = None
+
+        # Copies of decompressor state by block, kept for this session only
+        self.checkpoints = {}
+
+        # Compressed stream location, zip members are a range of the archive
+        if kind == "zip":
+            self.source, member = zip_member(path)
+            self.start, self.end, self.method = zip_range(self.source, member)
+            self.stream = member
+        else:
+            self.source = self.path
+            self.start, self.end = 0, os.path.getsize(path)
+            self.stream = ""
+
+        self.sidecar = self.source.with_name(self.source.name + ".idx")
+        self.index = self.load_index()
+        self.dirty = False
+
+
+    def read(self, size=-1):
+        with self.lock:
+            if size is None or size < 0: size = self.length() - self.pos
+
+            # Short header reads are answered from seek index
+            key = str(self.pos)
+            if key in self.index['spans'] and len(self.index['spans'][key]) >= size:
+                out = self.index['spans'][key][:size]
+            else:
+                out = self.read_at(self.pos, size)
+                if size <= SPAN and len(out) == size:
+                    self.index['spans'][key] = out
+                    self.dirty = True
+            self.pos += len(out)
+
+        return out
+
+
+    def seek(self, offset, whence=0):
+        if whence == 1: offset += self.pos
+        elif whence == 2: offset += self.length()
+        self.pos = offset
+
+        return self.pos
+
+
+    def tell(self):
+        return self.pos
+
+
+    def fileno(self):
+        # Size reported by os.fstat is size of compressed file
+        return self.open().fileno()
+
+
+    def close(self):
+        # Waveform arrays keep reading after parser closes file, like a memory map,
+        # and reopen the compressed file on their next read
+        with self.lock:
+            self.save_index()
+            self.cursor = None
+            if self.handle is not None:
+                self.handle.close()
+                self.handle = None
+
+
+    def array(self, offset, count, dtype):
+        """
+        Samples at decompressed offset, memory-mapped from stored zip members
+        """
+
+        if self.kind == "zip" and self.method == zipfile.ZIP_STORED:
+            return np.memmap(self.source, dtype=dtype, mode="r", offset=self.start + offset, shape=(count,)).view(np.ndarray)
+
+        return CompressedArray(self, offset, count, dtype)
+
+
+    def read_at(self, offset, size):
+        if size <= 0: return b""
+
+        out = []
+        end = offset + size
+        for b in range(offset // BLOCK, (end - 1) // BLOCK + 1):
+            block = self.block(b)
+            if block is None: break
+            out.append(block[max(offset - b * BLOCK, 0):end - b * BLOCK].tobytes())
+        return b"".join(out)
+
+
+    def block(self, b):
+        """
+        Decompressed block as uint8 array, or None past end of file
+        """
+
+        data = memory.get((self.name, b))
+        if data is not None: return data
+
+        with self.lock:
+            # Continue from end of last read, unless a restart point or checkpoint is closer
+            point = [p for p in self.index['points'] if p[0] <= b * BLOCK][-1]
+            first = -(-point[0] // BLOCK)
+            checkpoint = max([n for n in self.checkpoints if first < n <= b], default=None)
+            if checkpoint is not None:
+                first, point = checkpoint, self.checkpoints[checkpoint]
+            if self.cursor is None or not first <= self.cursor[0] <= b:
+                self.cursor = (first, self.decompress(*point))
+
+            n, blocks = self.cursor
+            for data in blocks:
+                memory.put((self.name, n), data)
+                n += 1
+                self.cursor = (n, blocks)
+                if n > b: return data
+
+            self.cursor = None
+
+        return None
+
+
+    def decompress(self, offset, position, state=None):
+        """
+        Decompressed blocks from the first block boundary after decompressed offset,
+        decompressing from compressed position or from a checkpoint state
+        """
+
+        f = self.open()
+        f.seek(self.start + position)
+        if state is None:
+            d, raw, buf = self.decompressor(), b"", bytearray()
+        else:
+            d, raw, buf = state[0].copy(), state[1], bytearray(state[2])
+
+        # Data before first block boundary is part of a block that cannot be completed
+        discard = -offset % BLOCK
+        total = offset + len(buf)
+
+        while True:
+            if not raw:
+                raw = f.read(min(READ, self.end - self.start - position))
+                if not raw: break
+                position += len(raw)
+
+            # Gzip members and zstd frames are independent, so each one is a restart point
+            if d.eof:
+                if self.kind == "zip": break
+                self.add_point(total, position - len(raw))
+                d = self.decompressor()
+
+            out = d.decompress(raw)
+            raw = d.unused_data if d.eof else b""
+            total += len(out)
+            buf += out
+
+            if discard:
+                n = min(discard, len(buf))
+                del buf[:n]
+                discard -= n
+
+            while len(buf) >= BLOCK:
+                yield np.frombuffer(bytes(buf[:BLOCK]), dtype=np.uint8)
+                del buf[:BLOCK]
+
+                # Only zlib streams can be copied, gzip members and zstd frames are
+                # already restart points
+                n = (total - len(buf)) // BLOCK
+                if n % CHECKPOINT == 0 and n not in self.checkpoints and hasattr(d, "copy") and not d.eof:
+                    self.checkpoints[n] = (n * BLOCK, position, (d.copy(), raw, bytes(buf)))
+
+        # Final partial block and total length
+        if self.index.get('length') != total:
+            self.index['length'] = total
+            self.dirty = True
+            self.save_index()
+        if buf and not discard: yield np.frombuffer(bytes(buf), dtype=np.uint8)
+
+
+    def decompressor(self):
+        if self.kind == "gzip": return zlib.decompressobj(wbits=31)
+        if self.kind == "zip" and self.method == zipfile.ZIP_STORED: return Stored()
+        if self.kind == "zip": return zlib.decompressobj(wbits=-15)
+
+        try:
+            import zstandard
+        except ImportError:
+            raise ImportError("zstandard is required to read .zst files (pip install zstandard)")
+        return zstandard.ZstdDecompressor().decompressobj()
+
+
+    def length(self):
+        # Decompressed length, found by decompressing to end if not indexed
+        if self.index.get('length') is None:
+            b = max(p[0] for p in self.index['points']) // BLOCK
+            while self.block(b) is not None: b += 1
+
+        return self.index['length']
+
+
+    def add_point(self, offset, position):
+        points = self.index['points']
+        if offset - points[-1][0] >= BLOCK and [offset, position] not in points:
+            points.append([offset, position])
+            points.sort()
+            self.dirty = True
+
+
+    def open(self):
+        if self.handle is None: self.handle = open(self.source, mode="rb")
+        return self.handle
+
+
+    def load_index(self):
+        empty = { "length": None, "points": [[0, 0]], "spans": {} }
+        if self.kind == "zip":
+            if self.method not in [zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED]:
+                raise ValueError(f"Unsupported compression in \"{self.path.name}\"")
+            if self.method == zipfile.ZIP_STORED: empty['length'] = self.end - self.start
+
+        # Index is ignored if compressed file has changed since it was written
+        try:
+            with open(self.sidecar) as f:
+                index = json.load(f)
+            stat = os.stat(self.source)
+            if index['size'] != stat.st_size or index['mtime'] != stat.st_mtime_ns: return empty
+            stream = index['streams'][self.stream]
+        except (OSError, ValueError, KeyError):
+            return empty
+
+        stream['spans'] = { k: base64.b64decode(v) for k, v in stream['spans'].items() }
+        return stream
+
+
+    def save_index(self):
+        if not self.dirty: return
+        self.dirty = False
+
+        # Other streams in the same zip archive share the sidecar
+        stat = os.stat(self.source)
+        try:
+            with open(self.sidecar) as f:
+                index = json.load(f)
+            if index['size'] != stat.st_size or index['mtime'] != stat.st_mtime_ns: raise ValueError
+        except (OSError, ValueError, KeyError):
+            index = { "size": stat.st_size, "mtime": stat.st_mtime_ns, "streams": {} }
+
+        index['streams'][self.stream] = dict(
+            self.index,
+            spans={ k: base64.b64encode(v).decode() for k, v in self.index['spans'].items() }
+        )
+
+        # Seek index is optional, e.g. archive may be on a read-only share
+        try:
+            with open(self.sidecar, "w") as f:
+                json.dump(index, f)
+        except OSError:
+            pass
+
+
+class CompressedArray():
+    """
+    Read-only array of samples in a compressed capture file, decompressed
+    one block at a time as samples are accessed
+    """
+
+    def __init__(self, file, offset, count, dtype):
+        self.file = file
+        self.offset = offset
+        self.dtype = np.dtype(dtype)
+        self.itemsize = self.dtype.itemsize
+        self.length = count
+        self.shape = (count,)
+        self.nbytes = count * self.itemsize
+
+
+    def __len__(self):
+        return self.length
+
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start, stop, step = key.indices(self.length)
+            if step < 0: return self[np.arange(start, stop, step)]
+            return self.slice(start, stop, step)
+
+        if np.isscalar(key):
+            if key < 0: key += self.length
+            if not 0 <= key < self.length: raise IndexError("index out of range")
+            return self.slice(key, key + 1, 1)[0]
+
+        # Integer index arrays are gathered from each block of samples they fall in
+        idx = np.asarray(key, dtype=np.int64) % max(self.length, 1)
+        per = max(BLOCK // self.itemsize, 1)
+        out = np.empty(len(idx), dtype=self.dtype)
+        for k in np.unique(idx // per):
+            mask = idx // per == k
+            lo, hi = int(idx[mask].min()), int(idx[mask].max()) + 1
+            out[mask] = self.slice(lo, hi, 1)[idx[mask] - lo]
+
+        return out
+
+
+    def __array__(self, dtype=None, copy=None):
+        y = self[:]
+        return y if dtype is None else y.astype(dtype)
+
+
+    def slice(self, start, stop, step):
+        if stop <= start: return np.empty(0, dtype=self.dtype)
+
+        # Samples per chunk, chosen so chunks start on the step grid
+        per = max(BLOCK // self.itemsize // step, 1) * step
+        parts = []
+        for s in range(start, stop, per):
+            e = min(s + per, stop)
+            raw = self.file.read_at(self.offset + s * self.itemsize, (e - s) * self.itemsize)
+            parts.append(np.frombuffer(raw, dtype=self.dtype)[::step])
+
+        return parts[0] if len(parts) == 1 else np.concatenate(parts)
+
+
+class Stored():
+    """
+    Decompressor interface for uncompressed zip members
+    """
+
+    eof = False
+    unused_data = b""
+
+    def decompress(self, data):
+        return data
+
+
+def zip_range(archive, member):
+    """
+    Start and end offset of member data in zip archive, and compression method
+    """
+
+    with zipfile.ZipFile(archive) as z:
+        info = z.getinfo(member)
+
+    # Data follows local file header, which may have different extra field to central directory
+    with open(archive, "rb") as f:
+        f.seek(info.header_offset)
+        local = f.read(30)
+    name, extra = struct.unpack("<HH", local[26:30])
+    start = info.header_offset + 30 + name + extra
+
+    return start, start + info.compress_size, info.compress_type
@@ -0,0 +1,198 @@
+"""
+wavebin
+https://github.com/sam210723/wavebin
+
+Waveform capture viewer for oscilloscopes.
+"""
+
+from collections import OrderedDict
+from datetime import datetime
+import numpy as np
+import re
+from wavebin.compressed import capture_array
+
+
+class ConcatArray():
+    """
+    Read-only array of consecutive waveform records in separate capture files,
+    each file is memory-mapped (or decompressed) only when its samples are accessed
+    """
+
+    def __init__(self, segments, dtype, open_files=32):
+        """
+        segments is a list of (path, byte offset, sample count) tuples
+        """
+
+        self.segments = segments
+        self.dtype = np.dtype(dtype)
+        self.itemsize = self.dtype.itemsize
+
+        # First sample index of each segment, plus total length
+        counts = [s[2] for s in segments]
+        self.starts = np.concatenate(([0], np.cumsum(counts))).astype(np.int64)
+        self.length = int(self.starts[-1])
+        self.shape = (self.length,)
+        self.nbytes = self.length * self.itemsize
+
+        # Recently used memory maps
+        self.maps = OrderedDict()
+        self.open_files = open_files
+
+
+    def __len__(self):
+        return self.length
+
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start, stop, step = key.indices(self.length)
+            if step < 0: return self[np.arange(start, stop, step)]
+            return self.slice(start, stop, step)
+
+        if np.isscalar(key):
+            if key < 0: key += self.length
+            if not 0 <= key < self.length: raise IndexError("index out of range")
+            k = int(np.searchsorted(self.starts, key, side="right")) - 1
+            return self.segment(k)[key - self.starts[k]]
+
+        # Integer index arrays are gathered from each segment they fall in
+        idx = np.asarray(key, dtype=np.int64) % max(self.length, 1)
+        seg = np.searchsorted(self.starts, idx, side="right") - 1
+        out = np.empty(len(idx), dtype=self.dtype)
+        for k in np.unique(seg):
+            mask = seg == k
+            out[mask] = self.segment(k)[idx[mask] - self.starts[k]]
+
+        return out
+
+
+    def __array__(self, dtype=None, copy=None):
+        y = self[:]
+        return y if dtype is None else y.astype(dtype)
+
+
+    def slice(self, start, stop, step):
+        parts = []
+        first = int(np.searchsorted(self.starts, start, side="right")) - 1
+        for k in range(max(first, 0), len(self.segments)):
+            s0, s1 = self.starts[k], self.starts[k + 1]
+            if s0 >= stop: break
+
+            # First index in segment on the step grid of the slice
+            i = max(start, s0)
+            i += (start - i) % step
+            j = min(stop, s1)
+            if i < j: parts.append(self.segment(k)[i - s0:j - s0:step])
+
+        if not parts: return np.empty(0, dtype=self.dtype)
+        return parts[0] if len(parts) == 1 else np.concatenate(parts)
+
+
+    def segment(self, k):
+        if k in self.maps:
+            self.maps.move_to_end(k)
+            return self.maps[k]
+
+        path, offset, count = self.segments[k]
+        data = capture_array(path, offset, count, self.dtype)
+
+        self.maps[k] = data
+        if len(self.maps) > self.open_files: self.maps.popitem(last=False)
+
+        return data
+
+
+def capture_time(header):
+    """
+    Trigger time of waveform record in seconds since the epoch, or None
+    """
+
+    text = lambda b: b.decode(errors="replace").rstrip("\0").strip()
+    stamp = f"{text(header.date)} {text(header.time)}"
+
+    # Keysight and Rigol date formats
+    for fmt in ["%Y-%m-%d %H:%M:%S", "%d %b %Y %H:%M:%S", "%d-%b-%Y %H:%M:%S", "%Y/%m/%d %H:%M:%S"]:
+        try:
+            return datetime.strptime(stamp, fmt).timestamp()
+        except ValueError:
+            continue
+
+    return None
+
+
+def segment_times(headers, counts):
+    """
+    Time of first sample of each record on the time base of the first record.
+    Records without a usable timestamp, or that would overlap the previous
+    record, follow on directly from the previous record.
+    """
+
+    first = headers[0]
+    t0 = capture_time(first)
+    times = [first.x_d_origin]
+    end = first.x_d_origin + counts[0] * first.x_increment
+
+    for h, n in zip(headers[1:], counts[1:]):
+        # Time tags are sub-second, trigger times have one second resolution
+        t = capture_time(h)
+        if h.time_tags != first.time_tags: trigger = h.time_tags - first.time_tags
+        elif t is not None and t0 is not None: trigger = t - t0
+        else: trigger = None
+
+        start = end if trigger is None else max(first.x_d_origin + trigger + h.x_origin - first.x_origin, end)
+        times.append(start)
+        end = start + n * h.x_increment
+
+    return np.array(times)
+
+
+def segment_offsets(waveform):
+    """
+    Time added to samples of each record of a sequence by gaps between records,
+    or None if records follow on directly
+    """
+
+    if "segment_times" not in waveform: return None
+
+    header = waveform['header']
+    offsets = waveform['segment_times'] - (header.x_d_origin + waveform['segments'] * header.x_increment)
+    return offsets if np.any(offsets) else None
+
+
+def sample_time(waveform, sample):
+    """
+    Time of (fractional) sample index, including gaps between records of a sequence
+    """
+
+    header = waveform['header']
+    t = header.x_d_origin + np.asarray(sample) * header.x_increment
+    offsets = segment_offsets(waveform)
+    if offsets is None: return t
+
+    k = np.maximum(np.searchsorted(waveform['segments'], sample, side="right") - 1, 0)
+    return t + offsets[k]
+
+
+def time_sample(waveform, t):
+    """
+    Fractional sample index at time, times in a gap map past the end of the record before it
+    """
+
+    header = waveform['header']
+    offsets = segment_offsets(waveform)
+    if offsets is None: return (np.asarray(t) - header.x_d_origin) / header.x_increment
+
+    k = np.maximum(np.searchsorted(waveform['segment_times'], t, side="right") - 1, 0)
+    return (np.asarray(t) - offsets[k] - header.x_d_origin) / header.x_increment
+
+
+def sequence_key(path, header):
+    """
+    Sort key placing capture files in recording order
+    """
+
+    # Trigger time has one second resolution, time tags and origin order records within a second
+    t = capture_time(header)
+    natural = [int(s) if s.isdigit() else s for s in re.split(r"(\d+)", str(path))]
+
+    return (t is None, t or 0, header.time_tags, header.x_origin, natural)
@@ -0,0 +1,169 @@
+"""
+wavebin
+https://github.com/sam210723/wavebin
+
+Waveform capture viewer for oscilloscopes.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import os
+from wavebin.concat import time_sample
+from wavebin.memory import memory
+from wavebin.profiler import profiler
+
+
+class PatternSearch():
+    """
+    Normalised cross-correlation of a template over a whole waveform, using
+    overlap-save FFT blocks so only one chunk of samples is in memory per worker
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.config.setdefault('verbose', False)
+        self.config.setdefault('threshold', 0.8)
+        self.config.setdefault('max_matches', 1000)
+        self.config.setdefault('chunk', 2**20)
+        self.config.setdefault('workers', min(os.cpu_count() or 1, 8))
+
+
+    def search(self, data, template):
+        """
+        Match positions (first sample of each match) and scores, best match first
+        """
+
+        self.prepare(template)
+        n, m = len(data), len(self.template)
+        if n < m: return np.empty(0, dtype=np.int64), np.empty(0)
+        self.log(f"Searching {n} samples for {m} sample template (FFT size {self.size})")
+
+        # Chunks of output positions, each read with template length of overlap
+        starts = range(0, n - m + 1, self.config['chunk'])
+        with profiler.stage("correlate", n * data.itemsize), ThreadPoolExecutor(max_workers=self.config['workers']) as pool:
+            runs = list(pool.map(lambda s: self.chunk(data, s, min(s + self.config['chunk'], n - m + 1)), starts))
+        memory.touch(data)
+
+        positions, scores = self.merge(runs)
+        self.log(f"  - Matches: {len(positions)}")
+
+        return positions, scores
+
+
+    def prepare(self, template):
+        t = np.asarray(template, dtype=np.float64)
+        if len(t) < 2: raise ValueError("Template must be at least 2 samples")
+
+        # Zero-mean template, so mean of waveform under template does not affect correlation
+        t = t - t.mean()
+        self.norm = np.sqrt(np.sum(t ** 2))
+        if self.norm == 0: raise ValueError("Template has no variation")
+        self.template = t
+
+        # FFT blocks several times template length, each yielding size - m + 1 valid outputs
+        self.size = 1 << max(int(np.ceil(np.log2(8 * len(t)))), 16)
+        self.valid = self.size - len(t) + 1
+        self.spectrum = np.conj(np.fft.rfft(t, self.size))
+
+
+    def chunk(self, data, start, stop):
+        """
+        Runs of positions in [start, stop) scoring above threshold, as (first, last, best position, best score)
+        """
+
+        m = len(self.template)
+        count = stop - start
+        x = np.asarray(data[start:stop + m - 1], dtype=np.float64)
+
+        # Remove offset so running sums of squares do not lose precision
+        x -= x.mean()
+
+        # Overlap-save: blocks of FFT size advancing by number of valid outputs
+        blocks = -(-count // self.valid)
+        padded = np.zeros(blocks * self.valid + m - 1)
+        padded[:len(x)] = x
+        frames = np.lib.stride_tricks.sliding_window_view(padded, self.size)[::self.valid]
+        corr = np.fft.irfft(np.fft.rfft(frames, axis=1) * self.spectrum, self.size, axis=1)
+        corr = corr[:, :self.valid].ravel()[:count]
+
+        # Energy of waveform under template at each position, from running sums
+        c1 = np.concatenate(([0], np.cumsum(x)))
+        c2 = np.concatenate(([0], np.cumsum(x ** 2)))
+        s1 = c1[m:m + count] - c1[:count]
+        energy = c2[m:m + count] - c2[:count] - s1 ** 2 / m
+
+        # Flat sections of waveform have no defined correlation
+        denom = np.sqrt(np.maximum(energy, 0)) * self.norm
+        score = np.divide(corr, denom, out=np.zeros(count), where=denom > self.norm * 1e-9 * np.sqrt(m))
+        np.clip(score, -1, 1, out=score)
+
+        # Contiguous runs above threshold, each reduced to its best position
+        above = np.flatnonzero(score >= self.config['threshold'])
+        if len(above) == 0: return []
+        breaks = np.flatnonzero(np.diff(above) > 1) + 1
+        runs = []
+        for r in np.split(above, breaks):
+            best = r[np.argmax(score[r])]
+            runs.append((start + r[0], start + r[-1], start + best, score[best]))
+
+        return runs
+
+
+    def merge(self, chunks):
+        # Join runs split across chunk boundaries
+        runs = []
+        for c in chunks:
+            for r in c:
+                if runs and r[0] == runs[-1][1] + 1:
+                    last = runs.pop()
+                    best = r if r[3] > last[3] else last
+                    r = (last[0], r[1], best[2], best[3])
+                runs.append(r)
+        if not runs: return np.empty(0, dtype=np.int64), np.empty(0)
+
+        positions = np.array([r[2] for r in runs], dtype=np.int64)
+        scores = np.array([r[3] for r in runs])
+
+        # Best matches first, dropping matches overlapping a better match
+        m = len(self.template)
+        order = np.argsort(-scores, kind="stable")
+        kept = []
+        taken = np.empty(0, dtype=np.int64)
+        for i in order:
+            p = positions[i]
+            j = np.searchsorted(taken, p)
+            if (j > 0 and p - taken[j - 1] < m) or (j < len(taken) and taken[j] - p < m): continue
+            taken = np.insert(taken, j, p)
+            kept.append(i)
+            if len(kept) >= self.config['max_matches']: break
+
+        return positions[kept], scores[kept]
+
+
+    def log(self, msg):
+        if self.config['verbose']: print(msg)
+
+
+def template(waveform, start, stop):
+    """
+    Samples of waveform between two times in seconds
+    """
+
+    first = max(int(round(time_sample(waveform, min(start, stop)))), 0)
+    last = min(int(round(time_sample(waveform, max(start, stop)))), len(waveform['data']))
+    if last - first < 2: raise ValueError("Template must be at least 2 samples")
+
+    return np.asarray(waveform['data'][first:last])
+
+
+def parse_time(value):
+    """
+    Parse time in seconds with optional SI suffix, e.g. "1.5m" or "200u"
+    """
+
+    suffixes = { "n": 1e-9, "u": 1e-6, "m": 1e-3, "k": 1e3 }
+    value = value.rstrip("s")
+    if value and value[-1] in suffixes:
+        return float(value[:-1]) * suffixes[value[-1]]
+
+    return float(value)
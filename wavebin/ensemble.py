@@ -0,0 +1,149 @@
+"""
+wavebin
+https://github.com/sam210723/wavebin
+
+Waveform capture viewer for oscilloscopes.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import os
+from pathlib import Path
+import struct
+from wavebin.profiler import profiler
+from wavebin.wave import WaveParser
+
+
+class Ensemble():
+    """
+    Mean, variance and min/max envelope of repeated captures, accumulated in a single pass
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.config.setdefault('workers', min(os.cpu_count() or 1, 8))
+        self.config.setdefault('chunk', 2**18)
+
+
+    def run(self, paths):
+        """
+        Accumulate statistics of each channel over all captures, returns result dict
+        """
+
+        # Map all captures, headers only until samples are read
+        with ThreadPoolExecutor(max_workers=self.config['workers']) as pool:
+            captures = list(pool.map(self.load, paths))
+        self.check(paths, captures)
+
+        # Split captures into one group per worker
+        groups = [captures[i::self.config['workers']] for i in range(self.config['workers'])]
+        groups = [g for g in groups if g]
+
+        result = { "count": len(captures), "mean": [], "std": [], "min": [], "max": [] }
+        for ch, first in enumerate(captures[0]):
+            n = len(first['data'])
+            out = { k: np.empty(n, dtype=np.float32) for k in ["mean", "std", "min", "max"] }
+            self.log(f"Averaging CH{ch + 1} over {len(captures)} captures")
+
+            with profiler.stage("ensemble", n * 4 * len(captures)), ThreadPoolExecutor(max_workers=len(groups)) as pool:
+                for start in range(0, n, self.config['chunk']):
+                    stop = min(start + self.config['chunk'], n)
+
+                    # Partial accumulators of each group, combined with parallel variance update
+                    parts = pool.map(lambda g: accumulate([c[ch]['data'][start:stop] for c in g]), groups)
+                    count, mean, m2, lo, hi = combine(list(parts))
+
+                    out['mean'][start:stop] = mean
+                    out['std'][start:stop] = np.sqrt(m2 / count)
+                    out['min'][start:stop] = lo
+                    out['max'][start:stop] = hi
+
+            # Average waveform type with number of captures as average count
+            header = first['header']._replace(wave_type=3, average=len(captures))
+            for k in out:
+                result[k].append({
+                    "header": header,
+                    "data":   out[k]
+                })
+
+        return result
+
+
+    def load(self, path):
+        parser = WaveParser({ "verbose": False })
+        try:
+            if not parser.load(path): return None
+        except (OSError, ValueError, struct.error):
+            return None
+
+        return parser.waveforms
+
+
+    def check(self, paths, captures):
+        # Captures must have the same channels, lengths and sample intervals
+        first = captures[0]
+        if first is None: raise ValueError(f"Unable to read \"{Path(paths[0]).name}\"")
+
+        for p, c in zip(paths, captures):
+            name = Path(p).name
+            if c is None: raise ValueError(f"Unable to read \"{name}\"")
+            if len(c) != len(first):
+                raise ValueError(f"\"{name}\" has {len(c)} waveforms, expected {len(first)}")
+
+            for a, b in zip(c, first):
+                if len(a['data']) != len(b['data']):
+                    raise ValueError(f"\"{name}\" has {len(a['data'])} points, expected {len(b['data'])}")
+                if not np.isclose(a['header'].x_increment, b['header'].x_increment, rtol=1e-9):
+                    raise ValueError(f"\"{name}\" has different sample rate")
+
+
+    def log(self, msg):
+        if self.config['verbose']: print(msg)
+
+
+def accumulate(blocks):
+    """
+    Running count, mean, sum of squared differences, min and max of equal length blocks
+    """
+
+    count = 0
+    mean = m2 = lo = hi = None
+    for block in blocks:
+        x = np.asarray(block, dtype=np.float64)
+        count += 1
+
+        if mean is None:
+            mean = x.copy()
+            m2 = np.zeros_like(x)
+            lo = x.copy()
+            hi = x.copy()
+            continue
+
+        # Welford update
+        delta = x - mean
+        mean += delta / count
+        m2 += delta * (x - mean)
+        np.minimum(lo, x, out=lo)
+        np.maximum(hi, x, out=hi)
+
+    return count, mean, m2, lo, hi
+
+
+def combine(parts):
+    """
+    Merge partial accumulators from independent groups of captures
+    """
+
+    count, mean, m2, lo, hi = parts[0]
+    mean, m2, lo, hi = mean.copy(), m2.copy(), lo.copy(), hi.copy()
+
+    for n, pmean, pm2, plo, phi in parts[1:]:
+        total = count + n
+        delta = pmean - mean
+        mean += delta * n / total
+        m2 += pm2 + delta ** 2 * count * n / total
+        count = total
+        np.minimum(lo, plo, out=lo)
+        np.maximum(hi, phi, out=hi)
+
+    return count, mean, m2, lo, hi
@@ -0,0 +1,124 @@
+"""
+wavebin
+https://github.com/sam210723/wavebin
+
+Waveform capture viewer for oscilloscopes.
+"""
+
+from enum import Enum
+import numpy as np
+
+
+class EventIndex():
+    """
+    Sorted index of edges, glitches and runt pulses in a waveform
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.positions = np.empty(0, dtype=np.int64)
+        self.types = np.empty(0, dtype=np.uint8)
+
+
+    def build(self, data):
+        # Default thresholds at 10% and 90% of waveform amplitude
+        if self.config.get('low') is None or self.config.get('high') is None:
+            self.thresholds(data)
+        low, high = self.config['low'], self.config['high']
+
+        # Find sample positions where waveform moves between low, middle and high bands
+        positions = []
+        codes = []
+        prev = None
+        chunk = self.config.get('chunk', 2**22)
+        for start in range(0, len(data), chunk):
+            y = data[start:start + chunk]
+            code = (y >= low).astype(np.int8) + (y > high)
+
+            changes = np.flatnonzero(code[1:] != code[:-1]) + 1
+            if prev is None or code[0] != prev:
+                changes = np.concatenate(([0], changes))
+
+            positions.append(changes + start)
+            codes.append(code[changes])
+            prev = code[-1]
+
+        if not positions: return self
+        p = np.concatenate(positions)
+        c = np.concatenate(codes)
+
+        events = []
+
+        # Edges are changes between low and high bands, ignoring time spent in between
+        valid = c != 1
+        ep, ec = p[valid], c[valid]
+        edge = np.flatnonzero(ec[1:] != ec[:-1]) + 1
+        rising = edge[ec[edge] == 2]
+        falling = edge[ec[edge] == 0]
+        events.append((ep[rising], EventType.RISING))
+        events.append((ep[falling], EventType.FALLING))
+
+        # Glitches are pulses narrower than the glitch width
+        edges = ep[edge]
+        narrow = np.flatnonzero(np.diff(edges) < self.config['glitch'])
+        events.append((edges[narrow], EventType.GLITCH))
+
+        # Runts enter the middle band then return without crossing the opposite threshold
+        if len(c) >= 3:
+            mid = np.flatnonzero((c[1:-1] == 1) & (c[:-2] == c[2:])) + 1
+            events.append((p[mid], EventType.RUNT))
+
+        # Merge into single sorted index
+        self.positions = np.concatenate([e[0] for e in events]).astype(np.int64)
+        self.types = np.concatenate([np.full(len(e[0]), e[1].value, dtype=np.uint8) for e in events])
+        order = np.argsort(self.positions, kind="stable")
+        self.positions = self.positions[order]
+        self.types = self.types[order]
+
+        return self
+
+
+    def thresholds(self, data):
+        # Estimate amplitude from at most ~1M evenly spaced samples
+        step = max(len(data) // 2**20, 1)
+        y = data[::step]
+        lo, hi = float(np.amin(y)), float(np.amax(y))
+        self.config['low'] = lo + (hi - lo) * 0.1
+        self.config['high'] = lo + (hi - lo) * 0.9
+
+
+    def next(self, position):
+        """
+        Index of first event after a sample position, or None
+        """
+
+        i = np.searchsorted(self.positions, position, side="right")
+        return i if i < len(self.positions) else None
+
+
+    def previous(self, position):
+        """
+        Index of last event before a sample position, or None
+        """
+
+        i = np.searchsorted(self.positions, position, side="left") - 1
+        return i if i >= 0 else None
+
+
+    def counts(self):
+        return {t: int(np.count_nonzero(self.types == t.value)) for t in EventType}
+
+
+    def __len__(self):
+        return len(self.positions)
+
+
+class EventType(Enum):
+    """
+    Waveform event types
+    """
+
+    RISING      = 1
+    FALLING     = 2
+    GLITCH      = 3
+    RUNT        = 4
@@ -5,36 +5,57 @@ https://github.com/sam210723/wavebin
 Waveform capture viewer for oscilloscopes.
 """
 
+from contextlib import contextmanager
+import json
 from pathlib import Path
 import numpy
-import wave
+import shutil
 import struct
+import wave
 import zipfile
+from wavebin.profiler import profiler
+from wavebin.resample import align
+from wavebin.share import header_to_dict
+from wavebin.stats import clip_threshold, waveform_stats
+
+
+class ExportCancelled(Exception):
+    """
+    Raised by an export progress callback to stop the export
+    """
+
 
 class PulseView():
-    def __init__(self, verbose, path, waveforms, clipped):
+    def __init__(self, verbose, path, waveforms, clipped, chunk=2**22, progress=None):
         self.verbose = verbose
         self.path = path
-        self.waveforms = waveforms
         self.clipped = clipped
+        self.chunk = chunk
+        self.progress = progress or (lambda done: None)
 
-        self.log(f"Exporting PulseView session to \"{self.path}\"")
+        # Session has a single sample rate, resample other channels to first channel
+        self.waveforms = align(waveforms)
 
-        # Create ZIP file
-        self.zipf = zipfile.ZipFile(self.path, 'w', zipfile.ZIP_DEFLATED)
+        # Logic samples hold one bit per probe, in the smallest integer type that fits all probes
+        if self.clipped:
+            if len(self.waveforms) > 64:
+                raise ValueError(f"{len(self.waveforms)} probes do not fit in a logic sample (max 64)")
+            self.unit = numpy.dtype(f"<u{next(n for n in [1, 2, 4, 8] if len(self.waveforms) <= n * 8)}")
 
-        # Create version file
-        self.zipf.writestr('version', '2'.encode('utf-8'))
+        self.log(f"Exporting PulseView session to \"{self.path}\"")
 
-        # Create metadata file
-        meta = self.metadata()
-        self.zipf.writestr('metadata', meta.encode('utf-8'))
+        with partial([self.path]), profiler.stage("export", sum(w['data'].nbytes for w in self.waveforms)):
+            # Create ZIP file
+            with zipfile.ZipFile(self.path, 'w', zipfile.ZIP_DEFLATED, allowZip64=True) as self.zipf:
+                # Create version file
+                self.zipf.writestr('version', '2'.encode('utf-8'))
 
-        # Write waveform data
-        self.write_data()
+                # Create metadata file
+                meta = self.metadata()
+                self.zipf.writestr('metadata', meta.encode('utf-8'))
 
-        # Close completed ZIP file
-        self.zipf.close()
+                # Write waveform data
+                self.write_data()
         self.log("Finished exporting")
 
 
@@ -46,7 +67,7 @@ class PulseView():
         meta +=  "[device 1]\r\n"
         if self.clipped:
             meta +=  "capturefile=logic-1\r\n"
-            meta +=  "unitsize=1\r\n"
+            meta += f"unitsize={self.unit.itemsize}\r\n"
             meta += f"total probes={len(self.waveforms)}\r\n"
         else:
             meta += f"total analog={len(self.waveforms)}\r\n"
@@ -65,34 +86,26 @@ class PulseView():
 
 
     def write_data(self):
-        num = len(self.waveforms[0]['data'])
-
         if self.clipped:
-            data = bytearray(b'')
-
-            # Loop through waveform samples
-            for i in range(num):
-                sample = 0x00
-
-                # Loop through waveforms
-                for j, w in enumerate(self.waveforms):
-                    # Get current sample
-                    point = w['data'][i]
-
-                    # Set bit for waveform
-                    if point == 1: sample |= 1 << j
-
-                # Add byte to data buffer
-                data.append(sample)
-
-            # Write data to ZIP file
-            self.zipf.writestr(f"logic-1", bytes(data))
+            # Set bit for each waveform in sample bytes, one chunk of samples at a time
+            length = len(self.waveforms[0]['data'])
+            with self.zipf.open("logic-1", "w", force_zip64=True) as f:
+                for start in range(0, length, self.chunk):
+                    data = numpy.zeros(min(self.chunk, length - start), dtype=self.unit)
+                    for j, w in enumerate(self.waveforms):
+                        data |= (numpy.asarray(w['data'][start:start + self.chunk]) > 0.5).astype(self.unit) << self.unit.type(j)
+                    f.write(data.tobytes())
+                    self.progress((start + len(data)) / length)
         else:
+            done, total = 0, sum(len(w['data']) for w in self.waveforms)
             for i, waveform in enumerate(self.waveforms):
-                data = bytearray(b'')
-                for point in waveform['data']:
-                    data.extend(struct.pack("f", point))
-                self.zipf.writestr(f"analog-1-{i + 1}-1", bytes(data))
+                with self.zipf.open(f"analog-1-{i + 1}-1", "w", force_zip64=True) as f:
+                    for start in range(0, len(waveform['data']), self.chunk):
+                        data = numpy.asarray(waveform['data'][start:start + self.chunk], dtype="<f4")
+                        f.write(data.tobytes())
+                        done += len(data)
+                        self.progress(done / total)
+
 
     def get_sample_rate(self):
         # Check if waveform is subsampled
@@ -113,33 +126,42 @@ class PulseView():
 
 
 class WaveFile():
-    def __init__(self, verbose, path, waveforms):
+    def __init__(self, verbose, path, waveforms, chunk=2**22, progress=None):
         self.verbose = verbose
         self.path = Path(path)
         self.waveforms = waveforms
+        self.chunk = chunk
+        self.progress = progress or (lambda done: None)
+        self.outputs = []
 
         self.log(f"Exporting WAV file to \"{self.path}\"")
 
         # Loop through waveforms
-        for i, w in enumerate(self.waveforms):
-            # Extend waveform below zero
-            w['data'][w['data'] == 0] = -1
-
-            # Append waveform number to file name
-            file_path = str(self.path).replace(self.path.suffix, f"_{i}{self.path.suffix}")
-
-            # Create WAV file
-            self.wavf = wave.open(file_path, mode='wb')
-            self.wavf.setnchannels(1)                       # Number of channels
-            self.wavf.setsampwidth(2)                       # Bytes per sample
-            self.wavf.setframerate(self.get_sample_rate(i)) # Sample rate
-            self.wavf.setnframes(len(w['data']))            # Number of samples
-
-            # Write samples to WAV file
-            self.wavf.writeframes(w['data'].astype(numpy.float16))
-
-            # Close WAV file
-            self.wavf.close()
+        done, total = 0, sum(len(w['data']) for w in self.waveforms)
+        with partial(self.outputs):
+            for i, w in enumerate(self.waveforms):
+                with profiler.stage("export", w['data'].nbytes):
+                    # Append waveform number to file name
+                    file_path = str(self.path).replace(self.path.suffix, f"_{i}{self.path.suffix}")
+                    self.outputs.append(file_path)
+
+                    # Create WAV file
+                    with wave.open(file_path, mode='wb') as self.wavf:
+                        self.wavf.setnchannels(1)                       # Number of channels
+                        self.wavf.setsampwidth(2)                       # Bytes per sample
+                        self.wavf.setframerate(self.get_sample_rate(i)) # Sample rate
+                        self.wavf.setnframes(len(w['data']))            # Number of samples
+
+                        # Write samples to WAV file
+                        for start in range(0, len(w['data']), self.chunk):
+                            # Extend waveform below zero, leaving exported waveform unchanged
+                            # (float copy so unsigned logic lines can go negative)
+                            y = numpy.asarray(w['data'][start:start + self.chunk], dtype=numpy.float32)
+                            y = numpy.where(y == 0, -1, y)
+
+                            self.wavf.writeframes(y.astype(numpy.float16).tobytes())
+                            done += len(y)
+                            self.progress(done / total)
 
         #TODO: Fix analog waveform exporting
         #TODO: Add max (ulong) data rate check
@@ -163,3 +185,397 @@ class WaveFile():
 
     def log(self, msg):
         if self.verbose: print(msg)
+
+
+class Archive():
+    def __init__(self, verbose, path, waveforms, compress=True, chunk=2**20, progress=None):
+        self.verbose = verbose
+        self.path = Path(path)
+        self.waveforms = waveforms
+        self.compress = compress
+        self.chunk = chunk
+        self.progress = progress or (lambda done: None)
+
+        self.log(f"Exporting archive to \"{self.path}\"")
+
+        # Select writer from file extension
+        writers = {
+            ".h5":    self.write_hdf5,
+            ".hdf5":  self.write_hdf5,
+            ".zarr":  self.write_zarr,
+            ".npz":   self.write_npz,
+            ".arrow": self.write_arrow
+        }
+        if self.path.suffix.lower() not in writers:
+            raise ValueError(f"Unsupported archive format \"{self.path.suffix}\"")
+
+        self.done, self.total = 0, sum(len(w['data']) for w in self.waveforms)
+        with partial([self.path]), profiler.stage("export", sum(w['data'].nbytes for w in self.waveforms)):
+            writers[self.path.suffix.lower()]()
+            self.progress(1)
+
+        self.log("Finished exporting")
+
+
+    def write_hdf5(self):
+        try:
+            import h5py
+        except ImportError:
+            raise ImportError("h5py is required to export HDF5 files (pip install h5py)")
+
+        with h5py.File(self.path, "w") as f:
+            for i, w in enumerate(self.waveforms):
+                ds = f.create_dataset(
+                    f"channel{i + 1}",
+                    shape=(len(w['data']),),
+                    dtype=w['data'].dtype,
+                    chunks=(self.chunk_size(w),),
+                    compression="gzip" if self.compress else None,
+                    shuffle=self.compress
+                )
+                ds.attrs.update(self.attributes(w))
+
+                # Copy samples one chunk at a time
+                for start, block in self.blocks(w):
+                    ds[start:start + len(block)] = block
+
+
+    def write_zarr(self):
+        try:
+            import zarr
+        except ImportError:
+            raise ImportError("zarr is required to export Zarr stores (pip install zarr)")
+
+        group = zarr.open_group(str(self.path), mode="w")
+        for i, w in enumerate(self.waveforms):
+            options = {
+                "shape":  (len(w['data']),),
+                "chunks": (self.chunk_size(w),),
+                "dtype":  w['data'].dtype
+            }
+
+            # Array creation differs between Zarr v2 and v3
+            if hasattr(group, "create_array"):
+                if not self.compress: options['compressors'] = None
+                arr = group.create_array(f"channel{i + 1}", **options)
+            else:
+                if not self.compress: options['compressor'] = None
+                arr = group.create_dataset(f"channel{i + 1}", **options)
+            arr.attrs.update(self.attributes(w))
+
+            # Copy samples one chunk at a time
+            for start, block in self.blocks(w):
+                arr[start:start + len(block)] = block
+
+
+    def write_npz(self):
+        mode = zipfile.ZIP_DEFLATED if self.compress else zipfile.ZIP_STORED
+        attrs = {}
+
+        with zipfile.ZipFile(self.path, "w", mode, allowZip64=True) as zipf:
+            for i, w in enumerate(self.waveforms):
+                name = f"channel{i + 1}"
+                attrs[name] = self.attributes(w)
+                attrs[name]['chunks'] = 0
+
+                # Each chunk is stored as a separate array so it can be loaded on its own
+                for start, block in self.blocks(w):
+                    member = f"{name}/{attrs[name]['chunks']:06d}.npy"
+                    with zipf.open(member, "w", force_zip64=True) as f:
+                        numpy.lib.format.write_array(f, numpy.ascontiguousarray(block))
+                    attrs[name]['chunks'] += 1
+
+            zipf.writestr("attrs.json", json.dumps(attrs, indent=2))
+
+
+    def write_arrow(self):
+        try:
+            import pyarrow as pa
+        except ImportError:
+            raise ImportError("pyarrow is required to export Arrow files (pip install pyarrow)")
+
+        if len(set(len(w['data']) for w in self.waveforms)) > 1:
+            raise ValueError("Arrow archives require channels with equal number of samples")
+
+        # Single uncompressed record batch so readers can memory-map each channel as one array
+        columns = {}
+        meta = {}
+        for i, w in enumerate(self.waveforms):
+            name = f"channel{i + 1}"
+            data = numpy.ascontiguousarray(w['data'])
+            columns[name] = pa.Array.from_buffers(
+                pa.from_numpy_dtype(data.dtype), len(data), [None, pa.py_buffer(data)]
+            )
+            meta[name] = { "header": header_to_dict(w['header']), "logic": "planes" in w }
+
+        batch = pa.RecordBatch.from_pydict(columns)
+        schema = batch.schema.with_metadata({ "wavebin": json.dumps(meta) })
+        with pa.OSFile(str(self.path), "wb") as f:
+            with pa.ipc.new_file(f, schema) as writer:
+                writer.write_batch(batch.replace_schema_metadata(schema.metadata))
+
+
+    def blocks(self, w):
+        size = self.chunk_size(w)
+        for start in range(0, len(w['data']), size):
+            block = w['data'][start:start + size]
+            yield start, block
+            self.done += len(block)
+            self.progress(self.done / self.total)
+
+
+    def chunk_size(self, w):
+        return max(min(self.chunk, len(w['data'])), 1)
+
+
+    def attributes(self, w):
+        # Store waveform header fields, decoding fixed-length strings
+        attrs = {}
+        for k, v in w['header']._asdict().items():
+            if isinstance(v, bytes): v = v.decode(errors="replace").rstrip("\0").strip()
+            attrs[k] = v
+        attrs['chunk_size'] = self.chunk_size(w)
+
+        return attrs
+
+
+    def log(self, msg):
+        if self.verbose: print(msg)
+
+
+class BinFile():
+    def __init__(self, verbose, path, waveforms, chunk=2**22, progress=None):
+        self.verbose = verbose
+        self.path = Path(path)
+        self.waveforms = waveforms
+        self.chunk = chunk
+        self.progress = progress or (lambda done: None)
+
+        self.log(f"Exporting capture file to \"{self.path}\"")
+
+        self.done, self.total = 0, sum(len(w['data']) for w in self.waveforms)
+        with partial([self.path]), profiler.stage("export", sum(w['data'].nbytes for w in self.waveforms)):
+            # Version 3 files have 64-bit sizes for captures over 4 GB
+            data_size = sum(len(w['data']) * 4 for w in self.waveforms)
+            self.version = 3 if data_size > 2**32 - 2**20 else 10
+
+            with open(self.path, "wb") as f:
+                self.write_file_header(f)
+                for w in self.waveforms:
+                    self.write_waveform(f, w)
+
+                # File size field includes all waveforms
+                size = f.tell()
+                f.seek(4)
+                f.write(size.to_bytes(8 if self.version == 3 else 4, byteorder="little"))
+
+        self.log("Finished exporting")
+
+
+    def write_file_header(self, f):
+        f.write(b"AG")
+        f.write(f"{self.version:02d}".encode())
+        f.write(bytes(8 if self.version == 3 else 4))
+        f.write(len(self.waveforms).to_bytes(4, byteorder="little"))
+
+
+    def write_waveform(self, f, w):
+        # Waveform header with point count of exported data
+        fmt = "5if3d2i16s16s24s16sdI"
+        header = w['header']._replace(size=struct.calcsize(fmt), buffers=1, points=len(w['data']))
+        f.write(struct.pack(fmt, *header))
+
+        # Waveform data header, samples stored as 32-bit floats
+        length = len(w['data']) * 4
+        if self.version == 3:
+            f.write(struct.pack("i2hQ", 16, 1, 4, length))
+        else:
+            f.write(struct.pack("i2hi", 12, 1, 4, length))
+
+        for start in range(0, len(w['data']), self.chunk):
+            data = numpy.asarray(w['data'][start:start + self.chunk], dtype="<f4")
+            f.write(data.tobytes())
+            self.done += len(data)
+            self.progress(self.done / self.total)
+
+
+    def log(self, msg):
+        if self.verbose: print(msg)
+
+
+class VCD():
+    def __init__(self, verbose, path, waveforms, chunk=2**22, progress=None):
+        self.verbose = verbose
+        self.path = Path(path)
+        self.waveforms = waveforms
+        self.chunk = chunk
+        self.progress = progress or (lambda done: None)
+
+        self.log(f"Exporting VCD file to \"{self.path}\"")
+
+        with partial([self.path]), profiler.stage("export", sum(w['data'].nbytes for w in self.waveforms)):
+            self.signals()
+            with open(self.path, "w") as self.file:
+                self.write_header()
+                self.write_changes()
+
+        self.log("Finished exporting")
+
+
+    def signals(self):
+        # One wire per logic pod line, or per channel thresholded at same level as clipped traces
+        self.wires = []
+        self.thresholds = []
+        for i, w in enumerate(self.waveforms):
+            if "planes" in w:
+                self.wires.append([f"CH{i + 1}_D{b}" for b in range(len(w['planes']))])
+                self.thresholds.append(None)
+            else:
+                stats = waveform_stats(w)
+                self.wires.append([f"CH{i + 1}"])
+                self.thresholds.append(clip_threshold(stats['min'], stats['max']))
+
+        # Identifier codes from printable characters
+        count = sum(len(w) for w in self.wires)
+        self.codes = [identifier(n) for n in range(count)]
+
+        # Common time unit and start of each waveform in time units
+        self.unit, self.unit_label = timescale([w['header'].x_increment for w in self.waveforms])
+        origin = min(w['header'].x_d_origin for w in self.waveforms)
+        self.ticks = [int(round(w['header'].x_increment / self.unit)) for w in self.waveforms]
+        self.offsets = [int(round((w['header'].x_d_origin - origin) / self.unit)) for w in self.waveforms]
+        self.origin = origin
+
+
+    def write_header(self):
+        header = self.waveforms[0]['header']
+        text = lambda b: b.decode(errors="replace").rstrip("\0").strip()
+
+        date = f"{text(header.date)} {text(header.time)}".strip()
+        if date: self.file.write(f"$date {date} $end\n")
+        self.file.write("$version wavebin $end\n")
+        self.file.write(f"$comment Time zero is {self.origin:.12g} s relative to trigger $end\n")
+        self.file.write(f"$timescale {self.unit_label} $end\n")
+        self.file.write(f"$scope module {text(header.frame).split(':')[0].replace(' ', '_') or 'scope'} $end\n")
+
+        n = 0
+        for wires in self.wires:
+            for name in wires:
+                self.file.write(f"$var wire 1 {self.codes[n]} {name} $end\n")
+                n += 1
+
+        self.file.write("$upscope $end\n")
+        self.file.write("$enddefinitions $end\n")
+
+
+    def write_changes(self):
+        # Initial value of every wire
+        self.previous = [self.levels(i, 0, 1)[0] for i in range(len(self.waveforms))]
+        self.file.write("#0\n$dumpvars\n")
+        n = 0
+        for i, wires in enumerate(self.wires):
+            for b in range(len(wires)):
+                self.file.write(f"{(int(self.previous[i]) >> b) & 1}{self.codes[n]}\n")
+                n += 1
+        self.file.write("$end\n")
+
+        # Process fixed time windows so channels with different sample rates stay in order
+        first = [sum(len(w) for w in self.wires[:i]) for i in range(len(self.wires))]
+        span = self.chunk * min(self.ticks)
+        end = max(o + len(w['data']) * t for w, o, t in zip(self.waveforms, self.offsets, self.ticks))
+        last = 0
+
+        for t0 in range(0, end, span):
+            self.progress(t0 / end)
+            times, wires, values = [], [], []
+            for i, w in enumerate(self.waveforms):
+                # Samples of waveform inside time window
+                s0 = max(-(-(t0 - self.offsets[i]) // self.ticks[i]), 1)
+                s1 = min(-(-(t0 + span - self.offsets[i]) // self.ticks[i]), len(w['data']))
+                if s1 <= s0: continue
+
+                # Compare each sample with the one before it
+                y = self.levels(i, s0, s1)
+                full = numpy.concatenate(([self.previous[i]], y))
+                changed = numpy.flatnonzero(full[1:] != full[:-1])
+                flipped = full[1:][changed] ^ full[:-1][changed]
+                self.previous[i] = y[-1]
+
+                # Changes of each line in packed samples
+                for b in range(len(self.wires[i])):
+                    sel = changed[(flipped >> b) & 1 == 1]
+                    times.append(self.offsets[i] + (s0 + sel) * self.ticks[i])
+                    wires.append(numpy.full(len(sel), first[i] + b))
+                    values.append((y[sel] >> b) & 1)
+
+            if not times: continue
+            times = numpy.concatenate(times)
+            wires = numpy.concatenate(wires)
+            values = numpy.concatenate(values)
+            order = numpy.lexsort((wires, times))
+
+            # Write changes grouped by time
+            out = []
+            for t, n, v in zip(times[order].tolist(), wires[order].tolist(), values[order].tolist()):
+                if t != last:
+                    out.append(f"#{t}\n")
+                    last = t
+                out.append(f"{v}{self.codes[n]}\n")
+            self.file.write("".join(out))
+
+
+    def levels(self, i, start, stop):
+        # Packed logic lines, or thresholded analog samples
+        y = numpy.asarray(self.waveforms[i]['data'][start:stop])
+        if self.thresholds[i] is None: return y
+
+        return (y > self.thresholds[i]).astype(numpy.uint8)
+
+
+    def log(self, msg):
+        if self.verbose: print(msg)
+
+
+@contextmanager
+def partial(paths):
+    """
+    Remove output files if export does not finish, e.g. when cancelled
+    """
+
+    try:
+        yield
+    except BaseException:
+        for path in paths:
+            # Archives such as Zarr stores are directories
+            path = Path(path)
+            if path.is_dir():
+                shutil.rmtree(path, ignore_errors=True)
+            elif path.exists():
+                path.unlink()
+        raise
+
+
+def timescale(increments):
+    """
+    Largest VCD time unit that divides all sample increments
+    """
+
+    units = [(m * 10.0 ** e, f"{m}{name}") for e, name in [
+        (0, "s"), (-3, "ms"), (-6, "us"), (-9, "ns"), (-12, "ps"), (-15, "fs")
+    ] for m in (100, 10, 1)]
+
+    for value, label in units:
+        ratios = [inc / value for inc in increments]
+        if all(r >= 1 and abs(r - round(r)) < 1e-6 * r for r in ratios):
+            return value, label
+
+    return 1e-15, "1fs"
+
+
+def identifier(n):
+    # VCD identifier codes use printable ASCII characters 33 to 126
+    code = ""
+    while True:
+        code += chr(33 + n % 94)
+        n = n // 94 - 1
+        if n < 0: return code
@@ -0,0 +1,94 @@
+"""
+wavebin
+https://github.com/sam210723/wavebin
+
+Waveform capture viewer for oscilloscopes.
+"""
+
+import numpy as np
+from wavebin.events import EventIndex
+from wavebin.profiler import profiler
+
+
+class EyeDiagram():
+    """
+    Persistence histogram of waveform segments overlaid at a fixed period
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.hist = np.zeros((self.config['y_bins'], self.config['x_bins']), dtype=np.uint32)
+        self.position = 0
+        self.segments = 0
+
+
+    def accumulate(self, data, samples=2**20):
+        """
+        Add next block of samples to histogram, returns False once all samples are added
+        """
+
+        if self.position >= len(data): return False
+        start = self.position
+        stop = min(start + samples, len(data))
+
+        with profiler.stage("eye", (stop - start) * data.itemsize):
+            y = np.asarray(data[start:stop], dtype=np.float32)
+
+            # Phase of each sample within displayed unit intervals
+            phase = (np.arange(start, stop, dtype=np.float64) - self.config['offset']) / self.config['period']
+            phase %= self.config['uis']
+            xb = (phase * (self.config['x_bins'] / self.config['uis'])).astype(np.intp)
+
+            # Vertical bin of each sample, discarding samples outside range
+            lo, hi = self.config['y_range']
+            yb = np.floor((y - lo) * (self.config['y_bins'] / (hi - lo))).astype(np.intp)
+            valid = (yb >= 0) & (yb < self.config['y_bins'])
+
+            # Accumulate 2D histogram through flat bin index
+            flat = yb[valid] * self.config['x_bins'] + np.minimum(xb[valid], self.config['x_bins'] - 1)
+            self.hist += np.bincount(flat, minlength=self.hist.size).reshape(self.hist.shape).astype(np.uint32)
+
+        self.position = stop
+        self.segments = int(self.position / (self.config['period'] * self.config['uis']))
+
+        return self.position < len(data)
+
+
+def recover_clock(data):
+    """
+    Estimate unit interval and edge phase in samples from waveform edges
+    """
+
+    # Thresholds close to mid-level, rail noise makes 10%/90% crossings jitter
+    lo, hi = amplitude_range(data, margin=0)
+    index = EventIndex({
+        "low":    lo + (hi - lo) * 0.4,
+        "high":   lo + (hi - lo) * 0.6,
+        "glitch": 0
+    }).build(data)
+    edges = index.positions[index.types <= 2].astype(np.float64)
+    if len(edges) < 3: return None
+
+    # Shortest common interval between edges, ignoring outliers
+    intervals = np.diff(edges)
+    intervals = intervals[intervals > 0]
+    base = np.percentile(intervals, 5)
+    ui = np.median(intervals[intervals < base * 1.5])
+
+    # Number of unit intervals from first edge to each edge
+    n = np.maximum(np.round(np.diff(edges) / ui), 1)
+    k = np.concatenate(([0], np.cumsum(n)))
+
+    # Least squares fit of edge positions gives unit interval and edge phase
+    ui, phase = np.polyfit(k, edges, 1)
+
+    return ui, phase % ui
+
+
+def amplitude_range(data, margin=0.1):
+    # Estimate amplitude from at most ~1M evenly spaced samples
+    y = data[::max(len(data) // 2**20, 1)]
+    lo, hi = float(np.amin(y)), float(np.amax(y))
+    pad = (hi - lo) * margin or 1.0
+
+    return lo - pad, hi + pad
@@ -9,8 +9,24 @@ from pathlib import Path
 from PyQt5 import QtWidgets as qt
 from PyQt5 import QtCore as qtc
 from PyQt5 import QtGui as qtg
+import pyqtgraph as pg
+import time
 import webbrowser
-from wavebin.export import PulseView, WaveFile
+from wavebin.export import Archive, PulseView, VCD, WaveFile
+from wavebin.catalog import Catalog, parse_rate
+from wavebin.channels import MathChannel
+from wavebin.concat import sample_time
+from wavebin.correlate import PatternSearch, template
+from wavebin.ensemble import Ensemble
+from wavebin.events import EventIndex, EventType
+from wavebin.eye import EyeDiagram, amplitude_range, recover_clock
+from wavebin.jitter import JitterAnalysis
+from wavebin.jobs import AnalysisJob, ExportJob
+from wavebin.live import LiveAcquisition
+from wavebin.memory import memory
+from wavebin.plot import QtJitterPlot
+from wavebin.stats import sparkline, waveform_stats
+from wavebin.watch import DirectoryWatcher
 
 
 class QtApp(qt.QApplication):
@@ -47,6 +63,18 @@ class QtApp(qt.QApplication):
         self.sidebar = QtSidebar()
         self.layout.addWidget(self.sidebar, 0, 0)
 
+        # Event indexes for each channel
+        self.events = {}
+
+        # Template selection for pattern search
+        self.region = None
+
+        # Background export, one at a time
+        self.job = None
+
+        # Background full-channel analysis, one at a time
+        self.analysis = None
+
         # Create file dialogs
         self.ofd = qt.QFileDialog()
         self.sfd = qt.QFileDialog()
@@ -58,29 +86,57 @@ class QtApp(qt.QApplication):
         self.exec_()
 
 
-    def update(self):
+    def update(self, keep_state=False):
         self.log("Updating UI")
-        self.window.setWindowTitle(f"\"{self.config['file'].name}\"")
+        title = f"\"{self.config['file'].name}\""
+        if "segments" in self.waveforms[0]: title += f" + {len(self.waveforms[0]['segments']) - 1} files"
+        self.window.setWindowTitle(title)
 
-        # Limit number of points for large captures
+        # Number of points for large captures is adapted to frame rate by plot
         points = len(self.config['wave'].waveforms[0]['data'])
-        if points > self.config['limit']:
-            subsampling = self.config['limit']
+        subsampling = self.config['plot'].governor.limit(points)
+
+        if keep_state:
+            # Keep sidebar widgets, only clamp subsampling to new capture length
+            spin = self.sidebar.config['parts'][2]['widget']
+            spin.blockSignals(True)
+            spin.setMaximum(max(points, 2))
+            spin.blockSignals(False)
+            self.config['plot'].config['subsampling'] = spin.value()
+
+            # Update channel selector if number of waveforms changed
+            if self.sidebar.config['parts'][3]['widget'].count() != len(self.config['wave'].waveforms):
+                self.sidebar.update(None, None, None, len(self.config['wave'].waveforms))
         else:
-            subsampling = points
-
-        # Reset sidebar widgets
-        self.sidebar.update(
-            None,
-            None,
-            subsampling,
-            len(self.config['wave'].waveforms)
-        )
+            # Remove ensemble overlay, event indexes and event marker from previous capture
+            self.config['plot'].envelope = None
+            memory.release("events")
+            if self.config['plot'].marker is not None:
+                self.config['plot'].removeItem(self.config['plot'].marker)
+                self.config['plot'].marker = None
+            self.jitter_stop()
+
+            # Reset sidebar widgets
+            self.sidebar.update(
+                None,
+                None,
+                subsampling,
+                len(self.config['wave'].waveforms)
+            )
+            self.sidebar.config['parts'][2]['widget'].setMaximum(max(points, 2))
 
         # Enable export options
         self.menu_actions['file_export_pv'].setEnabled(True)
         self.menu_actions['file_export_wav'].setEnabled(True)
+        self.menu_actions['file_export_archive'].setEnabled(True)
+        self.menu_actions['file_export_vcd'].setEnabled(True)
         self.menu_actions['view_wave_info'].setEnabled(True)
+        self.menu_actions['view_math'].setEnabled(True)
+        self.menu_actions['view_eye'].setEnabled(True)
+        self.menu_actions['view_ensemble'].setEnabled(True)
+        self.menu_actions['view_find'].setEnabled(True)
+        self.menu_actions['view_jitter'].setEnabled(True)
+        self.menu_actions['view_math_clear'].setEnabled(bool(self.config['plot'].config['math']))
 
 
     def setup_window(self):
@@ -107,12 +163,21 @@ class QtApp(qt.QApplication):
         # Menu actions
         self.menu_actions = {
             "file_open":       qt.QAction("&Open...", self.window),
+            "file_open_catalog": qt.QAction("Open from &Catalog...", self.window),
             "file_export_pv":  qt.QAction("Export to &PulseView...", self.window),
             "file_export_wav": qt.QAction("Export to &WAV file...", self.window),
+            "file_export_archive": qt.QAction("Export to &Archive...", self.window),
+            "file_export_vcd": qt.QAction("Export to &VCD file...", self.window),
             "file_----":       None,
             "file_exit":       qt.QAction("E&xit", self.window),
             "view_sidebar":    qt.QAction("&Sidebar", self.window),
             "view_wave_info":  qt.QAction("Waveform &Info", self.window),
+            "view_math":       qt.QAction("Add &Math Channel...", self.window),
+            "view_eye":        qt.QAction("&Eye Diagram...", self.window),
+            "view_ensemble":   qt.QAction("Ensemble &Average Overlay...", self.window),
+            "view_find":       qt.QAction("&Find Similar...", self.window),
+            "view_jitter":     qt.QAction("&Jitter Analysis...", self.window),
+            "view_math_clear": qt.QAction("&Clear Math Channels", self.window),
             "help_docs":       qt.QAction("&Documentation", self.window),
             "help_shortcuts":  qt.QAction("&Keyboard Shortcuts", self.window),
             "help_----":       None,
@@ -122,9 +187,19 @@ class QtApp(qt.QApplication):
         # Customise menu actions
         self.menu_actions['file_export_pv'].setEnabled(False)
         self.menu_actions['file_export_wav'].setEnabled(False)
+        self.menu_actions['file_export_archive'].setEnabled(False)
+        self.menu_actions['file_export_vcd'].setEnabled(False)
         self.menu_actions['view_sidebar'].setCheckable(True)
         self.menu_actions['view_sidebar'].setChecked(True)
         self.menu_actions['view_wave_info'].setEnabled(False)
+        self.menu_actions['view_math'].setEnabled(False)
+        self.menu_actions['view_eye'].setEnabled(False)
+        self.menu_actions['view_ensemble'].setEnabled(False)
+        self.menu_actions['view_find'].setEnabled(False)
+        self.menu_actions['view_jitter'].setEnabled(False)
+        self.menu_actions['view_eye'].setCheckable(True)
+        self.menu_actions['view_jitter'].setCheckable(True)
+        self.menu_actions['view_math_clear'].setEnabled(False)
 
         # Add actions to menu items
         for a in self.menu_actions:
@@ -137,6 +212,25 @@ class QtApp(qt.QApplication):
         # Attach keyboard event handler
         self.window.keyPressEvent = self.keyPressEvent
 
+        # Memory use of cached and mapped data in status bar
+        self.memory_label = qt.QLabel(memory.summary())
+        self.window.statusBar().addPermanentWidget(self.memory_label)
+        self.memory_timer = qtc.QTimer()
+        self.memory_timer.timeout.connect(lambda: self.memory_label.setText(memory.summary()))
+        self.memory_timer.start(1000)
+
+        # Progress of background export in status bar
+        self.export_progress = qt.QProgressBar()
+        self.export_progress.setMaximumWidth(150)
+        self.export_progress.setRange(0, 100)
+        self.export_cancel = qt.QPushButton("Cancel")
+        self.export_cancel.clicked.connect(lambda: self.job.cancel())
+        for widget in [self.export_progress, self.export_cancel]:
+            self.window.statusBar().addPermanentWidget(widget)
+            widget.hide()
+        self.aboutToQuit.connect(lambda: self.job is not None and self.job.stop())
+        self.aboutToQuit.connect(lambda: self.analysis is not None and self.analysis.wait())
+
 
     def instances(self, wave, plot):
         self.config['wave'] = wave
@@ -145,6 +239,108 @@ class QtApp(qt.QApplication):
         self.sidebar.config['plot'] = plot
 
 
+    def watch(self, path):
+        self.log("Starting directory watcher")
+
+        # Create background directory watcher
+        self.watcher = DirectoryWatcher({
+            "verbose":  self.config['verbose'],
+            "path":     path,
+            "interval": 250,
+            "settle":   0.5
+        })
+        self.watcher.captured.connect(self.watch_captured)
+        self.aboutToQuit.connect(self.watcher.stop)
+        self.watcher.start()
+
+
+    def watch_captured(self, path, waveforms):
+        print(f"New capture \"{path.name}\"")
+
+        # Swap new capture into plot, keeping zoom and sidebar state
+        self.config['wave'].config['file'] = path
+        self.config['wave'].waveforms = waveforms
+        self.config['wave'].display(keep_state=True)
+
+
+    def live(self, config):
+        self.log("Starting live acquisition")
+        self.live_state = {
+            "frames":  0,
+            "dropped": 0,
+            "renders": 0,
+            "points":  0,
+            "time":    time.monotonic(),
+            "fps":     0.0
+        }
+
+        # Create background acquisition thread
+        self.acquisition = LiveAcquisition(config)
+        self.acquisition.failed.connect(self.live_failed)
+        self.aboutToQuit.connect(self.acquisition.stop)
+        self.acquisition.start()
+
+        # Redraw plot at target frame rate
+        self.live_timer = qtc.QTimer()
+        self.live_timer.timeout.connect(self.live_update)
+        self.live_timer.start(int(1000 / config['fps']))
+
+
+    def live_update(self):
+        state = self.live_state
+        ring = self.acquisition.ring
+
+        # Skip redraw if no new blocks have been acquired
+        if ring is None or ring.frames == state['frames']: return
+        waveforms, frames = self.acquisition.snapshot()
+
+        # Blocks acquired since last redraw are not drawn individually
+        if state['frames']: state['dropped'] += frames - state['frames'] - 1
+        state['frames'] = frames
+
+        wave = self.config['wave']
+        wave.waveforms = waveforms
+        self.waveforms = waveforms
+        points = len(waveforms[0]['data'])
+
+        if not state['points']:
+            # First frame resets UI
+            wave.config['file'] = Path(f"live_{self.acquisition.config['host']}.bin")
+            wave.display()
+        else:
+            # Ring buffer still filling
+            if points != state['points']: self.update(keep_state=True)
+
+            # Update traces in place
+            self.config['plot'].stream(waveforms)
+        state['points'] = points
+
+        # Measure redraw rate
+        state['renders'] += 1
+        now = time.monotonic()
+        if now - state['time'] >= 1:
+            state['fps'] = state['renders'] / (now - state['time'])
+            state['renders'] = 0
+            state['time'] = now
+            self.log(f"Live: {state['fps']:.1f} fps, {state['dropped']} blocks skipped")
+
+        self.window.setWindowTitle(
+            f"Live {self.acquisition.config['host']}:{self.acquisition.config['port']} - "\
+            f"{state['fps']:.1f} fps, {state['dropped']} blocks skipped"
+        )
+
+
+    def live_failed(self, msg):
+        self.live_timer.stop()
+
+        msgbox = qt.QMessageBox()
+        msgbox.setWindowTitle("Error")
+        msgbox.setIcon(qt.QMessageBox.Critical)
+        msgbox.setStandardButtons(qt.QMessageBox.Ok)
+        msgbox.setText(f"Live acquisition stopped: {msg}")
+        msgbox.exec_()
+
+
     def keyPressEvent(self, event):
         key = event.key()
 
@@ -156,6 +352,61 @@ class QtApp(qt.QApplication):
         if char == 'B':
             self.menu_actions['view_sidebar'].toggle()
             self.sidebar.toggle()
+        elif char == 'N':
+            self.jump_event(1)
+        elif char == 'P':
+            self.jump_event(-1)
+
+
+    def jump_event(self, direction):
+        if not hasattr(self, "waveforms"): return
+        plot = self.config['plot']
+        ch = min(self.sidebar.selectedChannel, len(self.waveforms) - 1)
+        w = self.waveforms[ch]
+
+        # Build event index for selected channel on first use, or again if it was evicted
+        entry = memory.get(("events", ch))
+        if entry is None or entry[0] is not w['data']:
+            self.log(f"Building event index for CH{ch + 1}")
+            index = EventIndex({
+                "glitch": self.config['glitch'] * 1e-9 / w['header'].x_increment
+            }).build(w['data'])
+            for t, n in index.counts().items(): self.log(f"  - {t.name.capitalize()}: {n}")
+            memory.touch(w['data'])
+            entry = memory.put(("events", ch), (w['data'], index), nbytes=index.positions.nbytes + index.types.nbytes)
+        index = entry[1]
+
+        # Last event is kept separately from index so it survives eviction
+        data, last = self.events.get(ch, (None, None))
+        if data is not w['data']: last = None
+
+        # Find sample at centre of view, continuing from last event if view has not moved
+        x_range = plot.view.viewRange()[0]
+        position = plot.time_to_sample(ch, sum(x_range) / 2)
+        if last is not None and abs(position - index.positions[last]) <= 1:
+            position = index.positions[last]
+
+        # Look up next or previous event
+        if direction > 0:
+            i = index.next(position)
+        else:
+            i = index.previous(position)
+
+        if i is None:
+            self.window.statusBar().showMessage(f"No more events on CH{ch + 1}")
+            return
+        self.events[ch] = (w['data'], i)
+
+        # Centre view on event, keeping current zoom
+        t = plot.sample_to_time(ch, index.positions[i])
+        width = x_range[1] - x_range[0]
+        plot.view.setXRange(t - width / 2, t + width / 2, padding=0)
+        plot.mark(t)
+
+        name = EventType(index.types[i]).name.capitalize()
+        self.window.statusBar().showMessage(
+            f"CH{ch + 1} {name} ({i + 1}/{len(index)}) at {pg.siFormat(t, precision=6, suffix='s')}"
+        )
 
 
     def menu_file_open(self):
@@ -165,19 +416,33 @@ class QtApp(qt.QApplication):
         else:
             initial_path = "."
 
-        # Show open file dialog
-        file_path = self.ofd.getOpenFileName(
+        # Show open file dialog, multiple files are opened as one sequence
+        file_paths = self.ofd.getOpenFileNames(
             self.window,
             "Open waveform capture",
             initial_path,
-            "Waveform files (*.bin);;All files (*.*)"
+            "Waveform files (*.bin *.bin.gz *.bin.zst *.zip);;All files (*.*)"
         )[0]
 
         # Handle cancelled dialog
-        if file_path == "":
+        if not file_paths:
             self.log("Open file dialog cancelled")
             return
 
+        self.open_file(file_paths)
+
+
+    def menu_file_open_catalog(self):
+        # Show catalog search dialog
+        dialog = QtCatalogDialog(self.config['catalog'], self.window)
+        if dialog.exec_() != qt.QDialog.Accepted or not dialog.path:
+            self.log("Catalog dialog cancelled")
+            return
+
+        self.open_file(dialog.path)
+
+
+    def open_file(self, file_path):
         # Reset sidebar controls
         self.sidebar.update(0, False, -1, 0)
 
@@ -188,7 +453,7 @@ class QtApp(qt.QApplication):
             msgbox.setIcon(qt.QMessageBox.Critical)
             msgbox.setStandardButtons(qt.QMessageBox.Ok)
             msgbox.setText(
-                f"Error opening \"{Path(file_path).name}\": Unknown file format"
+                f"Error opening \"{self.config['wave'].config['file'].name}\": Unknown file format"
             )
             msgbox.exec_()
 
@@ -207,11 +472,11 @@ class QtApp(qt.QApplication):
             self.log("Save file dialog cancelled")
             return
 
-        # Create PulseView session file
-        PulseView(
-            self.config['verbose'],
+        # Create PulseView session file in background
+        self.export(
+            PulseView,
             file_path,
-            self.config['plot'].processed_waveforms,
+            self.config['plot'].export_waveforms(),
             self.sidebar.config['parts'][1]['widget'].isChecked()
         )
 
@@ -240,14 +505,124 @@ class QtApp(qt.QApplication):
             self.log("Save file dialog cancelled")
             return
 
-        # Create WAVE file
-        WaveFile(
-            self.config['verbose'],
+        # Create WAVE file in background
+        self.export(
+            WaveFile,
+            file_path,
+            self.config['plot'].export_waveforms()
+        )
+
+
+    def menu_file_export_archive(self):
+        # Show save file dialog
+        file_path = self.sfd.getSaveFileName(
+            self.window,
+            "Export to Archive",
+            f"./{self.config['file'].name.split('.')[0]}.h5",
+            "HDF5 file (*.h5);;Zarr store (*.zarr);;NumPy archive (*.npz);;Arrow IPC file (*.arrow)"
+        )[0]
+
+        # Handle cancelled dialog
+        if file_path == "":
+            self.log("Save file dialog cancelled")
+            return
+
+        # Write raw waveform data to chunked archive in background
+        self.export(
+            Archive,
+            file_path,
+            self.config['wave'].waveforms
+        )
+
+
+    def menu_file_export_vcd(self):
+        # Check waveform has been clipped or contains logic lines
+        waveforms = self.config['wave'].waveforms
+        if not self.sidebar.config['parts'][1]['widget'].isChecked() and not all("planes" in w for w in waveforms):
+            msgbox = qt.QMessageBox()
+            msgbox.setWindowTitle("Error")
+            msgbox.setIcon(qt.QMessageBox.Critical)
+            msgbox.setStandardButtons(qt.QMessageBox.Ok)
+            msgbox.setText("Enable waveform clipping before exporting to VCD file")
+            msgbox.exec_()
+            return
+
+        # Show save file dialog
+        file_path = self.sfd.getSaveFileName(
+            self.window,
+            "Export to VCD file",
+            f"./{self.config['file'].name.split('.')[0]}.vcd",
+            "Value Change Dump (*.vcd)"
+        )[0]
+
+        # Handle cancelled dialog
+        if file_path == "":
+            self.log("Save file dialog cancelled")
+            return
+
+        # Write transitions of full resolution waveforms in background
+        self.export(
+            VCD,
             file_path,
-            self.config['plot'].processed_waveforms
+            waveforms
         )
 
 
+    def export(self, exporter, file_path, waveforms, *args):
+        if self.job is not None and self.job.isRunning():
+            msgbox = qt.QMessageBox()
+            msgbox.setWindowTitle("Error")
+            msgbox.setIcon(qt.QMessageBox.Critical)
+            msgbox.setStandardButtons(qt.QMessageBox.Ok)
+            msgbox.setText("Wait for current export to finish or cancel it before exporting again")
+            msgbox.exec_()
+            return
+
+        # Exporter works on a read-only snapshot, so capture can be changed while it runs
+        self.job = ExportJob({
+            "verbose":   self.config['verbose'],
+            "exporter":  exporter,
+            "path":      file_path,
+            "waveforms": waveforms,
+            "args":      list(args)
+        })
+        self.job.progress.connect(self.export_progress.setValue)
+        self.job.completed.connect(self.export_completed)
+        self.job.failed.connect(self.export_failed)
+        self.job.cancelled.connect(self.export_cancelled)
+        self.job.finished.connect(self.export_done)
+
+        self.export_progress.setValue(0)
+        self.export_progress.setFormat(f"{Path(file_path).name} %p%")
+        self.export_progress.show()
+        self.export_cancel.show()
+        self.job.start()
+
+
+    def export_completed(self, file_path):
+        self.window.statusBar().showMessage(f"Exported \"{Path(file_path).name}\"", 5000)
+
+
+    def export_failed(self, file_path, error):
+        msgbox = qt.QMessageBox()
+        msgbox.setWindowTitle("Error")
+        msgbox.setIcon(qt.QMessageBox.Critical)
+        msgbox.setStandardButtons(qt.QMessageBox.Ok)
+        msgbox.setText(f"Error exporting \"{Path(file_path).name}\": {error}")
+        msgbox.exec_()
+
+
+    def export_cancelled(self):
+        self.window.statusBar().showMessage("Export cancelled", 5000)
+
+
+    def export_done(self):
+        # Finished signal of an earlier job may arrive after the next job has started
+        if self.sender() is not self.job: return
+        self.export_progress.hide()
+        self.export_cancel.hide()
+
+
     def menu_file_exit(self):
         self.exit()
 
@@ -278,6 +653,8 @@ class QtApp(qt.QApplication):
                 "Logic"
             ]
             info += f"  - Wave Type:\t\t{wave_types[header.wave_type]}\n"
+            if "planes" in w:
+                info += f"  - Logic Lines:\t\tD0-D{len(w['planes']) - 1}\n"
 
             units = [
                 "UNKNOWN",
@@ -313,6 +690,16 @@ class QtApp(qt.QApplication):
             info += f"  - Time Tags:\t\t{header.time_tags}\n"
             info += f"  - Segment Number:\t{header.segment}\n"
 
+            # Whole capture statistics, computed on first view
+            stats = waveform_stats(w)
+            if stats['count']:
+                p = stats['percentiles']
+                info += f"  - Mean:\t\t\t{stats['mean']:.4g}\n"
+                info += f"  - Std Deviation:\t\t{stats['std']:.4g}\n"
+                info += f"  - Min / Max:\t\t{stats['min']:.4g} / {stats['max']:.4g}\n"
+                info += f"  - P1 / P50 / P99:\t\t{p[1]:.4g} / {p[50]:.4g} / {p[99]:.4g}\n"
+                info += f"  - Histogram:\t\t{sparkline(stats['histogram'][0])}\n"
+
             info += "\n"
 
         # Show messagebox
@@ -325,6 +712,295 @@ class QtApp(qt.QApplication):
         msgbox.exec_()
 
 
+    def menu_view_math(self):
+        # Ask for math channel expression
+        expression, ok = qt.QInputDialog.getText(
+            self.window,
+            "Add Math Channel",
+            "Expression (CH1+CH2, CH1-CH2, CH1*CH2, diff(CH1), integ(CH1)):"
+        )
+        if not ok or not expression.strip():
+            self.log("Math channel dialog cancelled")
+            return
+
+        # Check expression before adding to plot
+        try:
+            MathChannel(expression, self.waveforms)
+        except ValueError as e:
+            msgbox = qt.QMessageBox()
+            msgbox.setWindowTitle("Error")
+            msgbox.setIcon(qt.QMessageBox.Critical)
+            msgbox.setStandardButtons(qt.QMessageBox.Ok)
+            msgbox.setText(str(e))
+            msgbox.exec_()
+            return
+
+        self.config['plot'].config['math'].append(expression.strip())
+        self.menu_actions['view_math_clear'].setEnabled(True)
+        self.config['plot'].update()
+
+
+    def menu_view_eye(self):
+        # Return to normal traces
+        if not self.menu_actions['view_eye'].isChecked():
+            self.eye_stop()
+            self.config['plot'].update()
+            return
+        self.menu_actions['view_eye'].setChecked(False)
+
+        ch = min(self.sidebar.selectedChannel, len(self.waveforms) - 1)
+        w = self.waveforms[ch]
+
+        # Recover unit interval from waveform edges in background
+        self.analyse(
+            f"recovering CH{ch + 1} clock",
+            lambda: (recover_clock(w['data']), amplitude_range(w['data'])),
+            lambda result: self.eye_start(ch, w, *result)
+        )
+
+
+    def eye_start(self, ch, w, clock, y_range):
+        # Capture may have been replaced while recovering clock
+        if not any(v is w for v in self.waveforms): return
+        self.window.statusBar().clearMessage()
+
+        increment = w['header'].x_increment
+        ui, phase = clock if clock else (len(w['data']) / 10, 0)
+
+        period, ok = qt.QInputDialog.getDouble(
+            self.window,
+            "Eye Diagram",
+            f"CH{ch + 1} unit interval (ns):",
+            ui * increment * 1e9,
+            increment * 1e9 * 2,
+            len(w['data']) * increment * 1e9,
+            3
+        )
+        if not ok:
+            self.log("Eye diagram dialog cancelled")
+            return
+
+        # Keep recovered edge phase if period was not changed
+        period = period * 1e-9 / increment
+        if abs(period - ui) > ui * 1e-6: phase = 0
+
+        self.eye = EyeDiagram({
+            "period":  period,
+            "offset":  phase - period / 2,
+            "uis":     2,
+            "x_bins":  512,
+            "y_bins":  256,
+            "y_range": y_range
+        })
+        self.eye_data = w['data']
+        self.log(f"Eye diagram CH{ch + 1}, UI {period:.3f} samples")
+        self.config['plot'].show_eye(self.eye, increment)
+        self.menu_actions['view_eye'].setChecked(True)
+
+        # Accumulate segments in background of event loop
+        self.eye_timer = qtc.QTimer()
+        self.eye_timer.timeout.connect(self.eye_step)
+        self.eye_timer.start(0)
+
+
+    def eye_step(self):
+        # Stop if plot has returned to normal traces
+        if self.config['plot'].eye_image.scene() is None:
+            self.eye_stop()
+            return
+
+        more = self.eye.accumulate(self.eye_data)
+        self.config['plot'].update_eye(self.eye)
+        self.window.statusBar().showMessage(
+            f"Eye diagram: {self.eye.segments} segments "\
+            f"({100 * self.eye.position / len(self.eye_data):.0f}%)"
+        )
+        if not more: self.eye_timer.stop()
+
+
+    def eye_stop(self):
+        if hasattr(self, "eye_timer"): self.eye_timer.stop()
+        self.menu_actions['view_eye'].setChecked(False)
+
+
+    def menu_view_ensemble(self):
+        # Select repeated captures
+        file_paths = self.ofd.getOpenFileNames(
+            self.window,
+            "Select repeated captures",
+            str(self.config['file'].parents[0]),
+            "Waveform files (*.bin *.bin.gz *.bin.zst *.zip);;All files (*.*)"
+        )[0]
+
+        if not file_paths:
+            self.log("Ensemble dialog cancelled")
+            return
+
+        # Accumulate mean and envelope in background, then overlay on current capture
+        ensemble = Ensemble({ "verbose": self.config['verbose'] })
+        waveforms = self.waveforms
+        self.analyse(
+            f"averaging {len(file_paths)} captures",
+            lambda: ensemble.run(file_paths),
+            lambda result: self.ensemble_done(waveforms, result)
+        )
+
+
+    def ensemble_done(self, waveforms, result):
+        # Capture may have been replaced while averaging
+        if self.waveforms is not waveforms: return
+
+        self.window.statusBar().showMessage(f"Ensemble average of {result['count']} captures")
+        self.config['plot'].envelope = result
+        self.config['plot'].update()
+
+
+    def menu_view_find(self):
+        plot = self.config['plot']
+
+        # First select template with a region over the middle of the view
+        if self.region is None or self.region.scene() is None:
+            x0, x1 = plot.view.viewRange()[0]
+            width = (x1 - x0) / 20
+            self.region = pg.LinearRegionItem(((x0 + x1) / 2 - width, (x0 + x1) / 2 + width))
+            plot.addItem(self.region)
+            self.window.statusBar().showMessage("Drag region over template, then click Find Similar again")
+            return
+
+        ch = min(self.sidebar.selectedChannel, len(self.waveforms) - 1)
+        w = self.waveforms[ch]
+        start, stop = self.region.getRegion()
+        plot.removeItem(self.region)
+        self.region = None
+
+        # Correlate template with whole channel in background
+        search = PatternSearch({ "verbose": self.config['verbose'] })
+        self.analyse(
+            f"searching CH{ch + 1}",
+            lambda: search.search(w['data'], template(w, start, stop)),
+            lambda result: self.find_done(ch, w, stop - start, *result)
+        )
+
+
+    def find_done(self, ch, w, width, positions, scores):
+        # Capture may have been replaced while searching
+        if not any(v is w for v in self.waveforms): return
+        plot = self.config['plot']
+
+        # List matches, double-clicking a match centres view on it
+        times = plot.sample_to_time(ch, positions)
+        self.window.statusBar().showMessage(f"{len(positions)} matches on CH{ch + 1}")
+        self.matches = QtMatchesDialog(ch, times, scores, width, self.window)
+        self.matches.selected.connect(self.show_match)
+        self.matches.show()
+
+
+    def analyse(self, action, function, completed):
+        if self.analysis is not None and self.analysis.isRunning():
+            msgbox = qt.QMessageBox()
+            msgbox.setWindowTitle("Error")
+            msgbox.setIcon(qt.QMessageBox.Critical)
+            msgbox.setStandardButtons(qt.QMessageBox.Ok)
+            msgbox.setText("Wait for current analysis to finish before starting another")
+            msgbox.exec_()
+            return
+
+        # Window stays responsive while whole channel is processed
+        self.analysis = AnalysisJob({
+            "verbose":  self.config['verbose'],
+            "name":     action,
+            "function": function
+        })
+        self.analysis.completed.connect(completed)
+        self.analysis.failed.connect(lambda e: self.analysis_failed(action, e))
+        self.window.statusBar().showMessage(f"{action[:1].upper()}{action[1:]}...")
+        self.analysis.start()
+
+
+    def analysis_failed(self, action, error):
+        self.window.statusBar().clearMessage()
+        msgbox = qt.QMessageBox()
+        msgbox.setWindowTitle("Error")
+        msgbox.setIcon(qt.QMessageBox.Critical)
+        msgbox.setStandardButtons(qt.QMessageBox.Ok)
+        msgbox.setText(f"Error {action}: {error}")
+        msgbox.exec_()
+
+
+    def show_match(self, t, width):
+        # Centre view on match, keeping zoom unless match would not fit
+        plot = self.config['plot']
+        x0, x1 = plot.view.viewRange()[0]
+        span = max(x1 - x0, width * 2)
+        plot.view.setXRange(t + width / 2 - span / 2, t + width / 2 + span / 2, padding=0)
+        plot.mark(t)
+
+
+    def menu_view_jitter(self):
+        # Hide TIE plot
+        if not self.menu_actions['view_jitter'].isChecked():
+            self.jitter_stop()
+            return
+        self.menu_actions['view_jitter'].setChecked(False)
+
+        ch = min(self.sidebar.selectedChannel, len(self.waveforms) - 1)
+        w = self.waveforms[ch]
+
+        # Ideal clock is a constant clock fitted to all edges, or a PLL tracking low frequency jitter
+        clocks = {
+            "Constant clock":               "constant",
+            "PLL (bandwidth bit rate/1667)": "pll"
+        }
+        clock, ok = qt.QInputDialog.getItem(
+            self.window,
+            "Jitter Analysis",
+            f"CH{ch + 1} clock recovery:",
+            list(clocks),
+            0,
+            False
+        )
+        if not ok:
+            self.log("Jitter analysis dialog cancelled")
+            return
+
+        # Edges of whole channel are found in background
+        analysis = JitterAnalysis({
+            "verbose": self.config['verbose'],
+            "clock":   clocks[clock]
+        })
+        self.analyse(
+            f"analysing CH{ch + 1} jitter",
+            lambda: analysis.run(w['data'], w['header'].x_increment, w.get('segments')),
+            lambda result: self.jitter_done(ch, w, result)
+        )
+
+
+    def jitter_done(self, ch, w, result):
+        # Capture may have been replaced while analysing
+        if not any(v is w for v in self.waveforms): return
+        self.window.statusBar().clearMessage()
+
+        # TIE plot below waveforms, panned and zoomed with them
+        if not hasattr(self, "jitter_plot"):
+            self.jitter_plot = QtJitterPlot({ "verbose": self.config['verbose'] })
+            self.jitter_plot.setXLink(self.config['plot'])
+            self.layout.addWidget(self.jitter_plot, 1, 1)
+        colours = self.config['plot'].config['colours']
+        self.jitter_plot.show_jitter(result, sample_time(w, result['edges']), colours[ch % len(colours)])
+        self.menu_actions['view_jitter'].setChecked(True)
+
+
+    def jitter_stop(self):
+        if hasattr(self, "jitter_plot"): self.jitter_plot.hide()
+        self.menu_actions['view_jitter'].setChecked(False)
+
+
+    def menu_view_math_clear(self):
+        self.config['plot'].config['math'].clear()
+        self.menu_actions['view_math_clear'].setEnabled(False)
+        self.config['plot'].update()
+
+
     def menu_help_docs(self):
         self.log("Opening docs in default browser")
         webbrowser.open("https://vksdr.com/wavebin", new=2)
@@ -337,6 +1013,8 @@ class QtApp(qt.QApplication):
         msgbox.setStandardButtons(qt.QMessageBox.Ok)
         msgbox.setText(
             "B - Toggle sidebar visibility\n"\
+            "N - Jump to next event (edge, glitch or runt)\n"\
+            "P - Jump to previous event\n"\
             ""
         )
         self.log("Keyboard shortcut dialog launched")
@@ -360,11 +1038,128 @@ class QtApp(qt.QApplication):
         self.log("Adding plot widget to layout")
         self.layout.addWidget(plot, 0, 1)
 
+        # Show points chosen by frame governor in sidebar, which re-renders plot
+        plot.sigPointsChanged.connect(self.sidebar.config['parts'][2]['widget'].setValue)
+
 
     def log(self, msg):
         if self.config['verbose']: print(msg)
 
 
+class QtCatalogDialog(qt.QDialog):
+    def __init__(self, db, parent):
+        super(QtCatalogDialog, self).__init__(parent)
+        self.setWindowTitle("Open from Catalog")
+        self.resize(900, 500)
+        self.path = None
+        self.catalog = Catalog({ "verbose": False, "db": db })
+
+        # Search fields
+        self.fields = {
+            "serial":   qt.QLineEdit(),
+            "model":    qt.QLineEdit(),
+            "date":     qt.QLineEdit(),
+            "min_rate": qt.QLineEdit()
+        }
+        self.fields['date'].setPlaceholderText("YYYY-MM-DD")
+        self.fields['min_rate'].setPlaceholderText("e.g. 1G")
+
+        form = qt.QHBoxLayout()
+        for name, label in [("serial", "Serial"), ("model", "Model"), ("date", "Date"), ("min_rate", "Min. Rate")]:
+            form.addWidget(qt.QLabel(label))
+            form.addWidget(self.fields[name])
+            self.fields[name].returnPressed.connect(self.search)
+        button = qt.QPushButton("Search")
+        button.clicked.connect(self.search)
+        form.addWidget(button)
+
+        # Results table
+        self.table = qt.QTableWidget(0, 5)
+        self.table.setHorizontalHeaderLabels(["Date", "Time", "Device", "Sample Rate", "Path"])
+        self.table.horizontalHeader().setStretchLastSection(True)
+        self.table.setEditTriggers(qt.QAbstractItemView.NoEditTriggers)
+        self.table.setSelectionBehavior(qt.QAbstractItemView.SelectRows)
+        self.table.setSelectionMode(qt.QAbstractItemView.SingleSelection)
+        self.table.cellDoubleClicked.connect(self.open)
+
+        self.status = qt.QLabel()
+
+        layout = qt.QVBoxLayout()
+        layout.addLayout(form)
+        layout.addWidget(self.table)
+        layout.addWidget(self.status)
+        self.setLayout(layout)
+
+        self.search()
+
+
+    def search(self):
+        try:
+            min_rate = parse_rate(self.fields['min_rate'].text()) if self.fields['min_rate'].text() else None
+        except ValueError:
+            self.status.setText("Invalid sample rate")
+            return
+
+        start = time.perf_counter()
+        self.results = self.catalog.search(
+            serial=self.fields['serial'].text(),
+            model=self.fields['model'].text(),
+            date=self.fields['date'].text(),
+            min_rate=min_rate
+        )
+        elapsed = time.perf_counter() - start
+
+        # Fill results table
+        self.table.setRowCount(len(self.results))
+        for i, r in enumerate(self.results):
+            rate = pg.siFormat(r['sample_rate'], suffix="Sa/s")
+            for j, v in enumerate([r['date'], r['time'], f"{r['model']} {r['serial']}", rate, r['path']]):
+                self.table.setItem(i, j, qt.QTableWidgetItem(v))
+        self.table.resizeColumnsToContents()
+
+        self.status.setText(f"{len(self.results)} captures found in {elapsed * 1e3:.1f} ms")
+
+
+    def open(self, row, column):
+        self.path = self.results[row]['path']
+        self.accept()
+
+
+    def done(self, result):
+        self.catalog.close()
+        super().done(result)
+
+
+class QtMatchesDialog(qt.QDialog):
+    # Emitted with match time and template width when a match is double-clicked
+    selected = qtc.pyqtSignal(float, float)
+
+    def __init__(self, ch, times, scores, width, parent):
+        super(QtMatchesDialog, self).__init__(parent)
+        self.setWindowTitle(f"Similar Waveforms on CH{ch + 1}")
+        self.resize(400, 500)
+        self.times = times
+        self.width = width
+
+        # Matches ranked by correlation
+        self.table = qt.QTableWidget(len(times), 3)
+        self.table.setHorizontalHeaderLabels(["Rank", "Time", "Correlation"])
+        self.table.horizontalHeader().setStretchLastSection(True)
+        self.table.setEditTriggers(qt.QAbstractItemView.NoEditTriggers)
+        self.table.setSelectionBehavior(qt.QAbstractItemView.SelectRows)
+        self.table.setSelectionMode(qt.QAbstractItemView.SingleSelection)
+        self.table.cellDoubleClicked.connect(lambda row, column: self.selected.emit(self.times[row], self.width))
+        for i, (t, r) in enumerate(zip(times, scores)):
+            for j, v in enumerate([str(i + 1), pg.siFormat(t, precision=9, suffix="s"), f"{r:.4f}"]):
+                self.table.setItem(i, j, qt.QTableWidgetItem(v))
+        self.table.resizeColumnsToContents()
+
+        layout = qt.QVBoxLayout()
+        layout.addWidget(self.table)
+        layout.addWidget(qt.QLabel(f"{len(times)} matches, double-click to show"))
+        self.setLayout(layout)
+
+
 class QtSidebar(qt.QTableWidget):
     def __init__(self):
         super(QtSidebar, self).__init__()
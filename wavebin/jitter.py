@@ -0,0 +1,207 @@
+"""
+wavebin
+https://github.com/sam210723/wavebin
+
+Waveform capture viewer for oscilloscopes.
+"""
+
+import numpy as np
+from wavebin.memory import memory
+from wavebin.profiler import profiler
+
+
+class JitterAnalysis():
+    """
+    Time interval error (TIE), period and cycle-to-cycle jitter of waveform
+    edges against a recovered ideal clock
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.config.setdefault('verbose', False)
+        self.config.setdefault('edges', "both")
+        self.config.setdefault('clock', "constant")
+        self.config.setdefault('bandwidth', 1 / 1667)
+        self.config.setdefault('damping', 0.707)
+        self.config.setdefault('threshold', None)
+        self.config.setdefault('hysteresis', 0.1)
+        self.config.setdefault('chunk', 2**22)
+        self.config.setdefault('bins', 100)
+
+        if self.config['edges'] not in ["both", "rising", "falling"]:
+            raise ValueError(f"Unknown edge type \"{self.config['edges']}\"")
+        if self.config['clock'] not in ["constant", "pll"]:
+            raise ValueError(f"Unknown clock recovery \"{self.config['clock']}\"")
+
+
+    def run(self, data, increment, segments=None):
+        """
+        Jitter of waveform edges, with times in seconds and edges as fractional
+        sample indices. Records of a capture sequence starting at segments are
+        measured separately, as there are gaps between them.
+        """
+
+        edges, rising = self.find_edges(data)
+        if self.config['edges'] != "both":
+            edges = edges[rising == (self.config['edges'] == "rising")]
+
+        # Crossings between last sample of one record and first sample of the next are not edges
+        bounds = np.asarray(segments[1:] if segments is not None else [], dtype=np.float64)
+        if len(bounds): edges = edges[~np.isin(np.floor(edges), bounds - 1)]
+        records = [r for r in np.split(edges, np.searchsorted(edges, bounds)) if len(r) >= 3]
+        if not records: raise ValueError(f"Found {len(edges)} edges, at least 3 are needed in a record")
+        edges = np.concatenate(records)
+        self.log(f"  - Edges:    {len(edges)} in {len(records)} records")
+
+        with profiler.stage("jitter", edges.nbytes):
+            parts = [self.measure(r) for r in records]
+
+            # Unit interval averaged over records by number of edges
+            ui = np.average([p[0] for p in parts], weights=[len(r) for r in records])
+            tie = np.concatenate([p[1] for p in parts]) * increment
+            period = np.concatenate([p[2] for p in parts]) * increment
+            c2c = np.concatenate([p[3] for p in parts]) * increment
+
+        self.log(f"  - UI:       {ui * increment:.6g} s")
+
+        return {
+            "edges":     edges,
+            "ui":        ui * increment,
+            "tie":       tie,
+            "period":    period,
+            "c2c":       c2c,
+            "stats":     {
+                "tie":    statistics(tie),
+                "period": statistics(period),
+                "c2c":    statistics(c2c)
+            },
+            "histogram": np.histogram(tie, bins=self.config['bins'])
+        }
+
+
+    def measure(self, edges):
+        """
+        Unit interval, TIE, period and cycle-to-cycle change of edges of one record, in samples
+        """
+
+        # Unit interval index of each edge, data edges may be several unit intervals apart
+        ui = self.unit_interval(edges)
+        k = np.concatenate(([0], np.cumsum(np.maximum(np.round(np.diff(edges) / ui), 1))))
+
+        # Ideal clock edge times, and error of each edge against them
+        ideal = self.pll(edges, k, ui) if self.config['clock'] == "pll" else np.polyval(np.polyfit(k, edges, 1), k)
+        tie = edges - ideal
+
+        # Interval between edges per unit interval, and change between adjacent intervals
+        period = np.diff(edges) / np.diff(k)
+        c2c = np.diff(period)
+
+        return ui, tie, period, c2c
+
+
+    def find_edges(self, data):
+        """
+        Sub-sample edge positions by linear interpolation at threshold, and
+        whether each edge is rising. Edges must cross both hysteresis levels.
+        """
+
+        # Signal swing from at most ~1M evenly spaced samples, without padding so
+        # hysteresis band scales with low amplitude signals
+        y = data[::max(len(data) // 2**20, 1)]
+        lo, hi = float(np.amin(y)), float(np.amax(y))
+        threshold = self.config['threshold']
+        if threshold is None: threshold = (lo + hi) / 2
+        low = threshold - (hi - lo) * self.config['hysteresis']
+        high = threshold + (hi - lo) * self.config['hysteresis']
+        self.log(f"Finding edges at {threshold:.4g} ({low:.4g} to {high:.4g})")
+
+        # State before first chunk, and last threshold crossing of previous chunks
+        state = 0
+        last = None
+
+        positions, rising = [], []
+        chunk = self.config['chunk']
+        for start in range(0, len(data), chunk):
+            # Chunks overlap by one sample so crossings between chunks are found
+            first = max(start - 1, 0)
+            stop = min(start + chunk, len(data))
+            with profiler.stage("edges", (stop - first) * data.itemsize):
+                y = np.asarray(data[first:stop], dtype=np.float64)
+
+                # Threshold crossings between adjacent samples, interpolated to sub-sample position
+                below = y < threshold
+                j = np.flatnonzero(below[:-1] != below[1:])
+                crossings = first + j + (threshold - y[j]) / (y[j + 1] - y[j])
+
+                # Samples where signal settles on the other side of hysteresis band
+                level = np.where(y > high, 1, 0) - np.where(y < low, 1, 0)
+                settled = np.flatnonzero(level[start - first:]) + (start - first)
+                levels = level[settled]
+                changed = np.flatnonzero(levels != np.concatenate(([state], levels[:-1])))
+                if state == 0: changed = changed[1:]
+                if len(levels): state = levels[-1]
+
+                # Each edge is at the last crossing before the signal settled
+                h = settled[changed]
+                n = np.searchsorted(j, h) - 1
+                edge = crossings[np.maximum(n, 0)]
+                if last is not None: edge = np.where(n < 0, last, edge)
+                else: h, edge, n = h[n >= 0], edge[n >= 0], n[n >= 0]
+                if len(crossings): last = crossings[-1]
+
+                positions.append(edge)
+                rising.append(level[h] > 0)
+            memory.touch(data)
+
+        return np.concatenate(positions), np.concatenate(rising)
+
+
+    def unit_interval(self, edges):
+        # Shortest common interval between edges, ignoring outliers, refined by least squares
+        intervals = np.diff(edges)
+        base = np.percentile(intervals, 5)
+        ui = np.median(intervals[intervals < base * 1.5])
+
+        k = np.concatenate(([0], np.cumsum(np.maximum(np.round(intervals / ui), 1))))
+        return np.polyfit(k, edges, 1)[0]
+
+
+    def pll(self, edges, k, ui):
+        """
+        Ideal clock edges from a second order PLL, which tracks jitter below its bandwidth
+        """
+
+        # Natural frequency per unit interval from -3 dB bandwidth as fraction of bit rate
+        z = self.config['damping']
+        wn = 2 * np.pi * self.config['bandwidth'] / np.sqrt(1 + 2 * z**2 + np.sqrt((1 + 2 * z**2)**2 + 1))
+        kp, ki = 2 * z * wn, wn**2
+
+        # Phase and period updated from error at each edge
+        ideal = np.empty(len(edges))
+        phase, period = edges[0], ui
+        previous = k[0]
+        for n, (t, i) in enumerate(zip(edges.tolist(), k.tolist())):
+            phase += (i - previous) * period
+            previous = i
+            ideal[n] = phase
+            error = t - phase
+            phase += kp * error
+            period += ki * error
+
+        return ideal
+
+
+    def log(self, msg):
+        if self.config['verbose']: print(msg)
+
+
+def statistics(values):
+    if len(values) == 0: return { "mean": 0.0, "rms": 0.0, "pk-pk": 0.0, "min": 0.0, "max": 0.0 }
+
+    return {
+        "mean":  float(np.mean(values)),
+        "rms":   float(np.std(values)),
+        "pk-pk": float(np.ptp(values)),
+        "min":   float(np.min(values)),
+        "max":   float(np.max(values))
+    }
@@ -0,0 +1,121 @@
+"""
+wavebin
+https://github.com/sam210723/wavebin
+
+Waveform capture viewer for oscilloscopes.
+"""
+
+import numpy as np
+from PyQt5 import QtCore as qtc
+from wavebin.export import ExportCancelled
+
+
+class ExportJob(qtc.QThread):
+    """
+    Runs an exporter in the background on a read-only snapshot of waveforms,
+    so the capture can still be viewed and processed while it is written
+    """
+
+    progress = qtc.pyqtSignal(int)
+    completed = qtc.pyqtSignal(str)
+    failed = qtc.pyqtSignal(str, str)
+    cancelled = qtc.pyqtSignal()
+
+    def __init__(self, config):
+        super(ExportJob, self).__init__()
+        self.config = config
+        self.config.setdefault('args', [])
+        self.waveforms = snapshot(self.config['waveforms'])
+        self.percent = -1
+
+
+    def run(self):
+        self.log(f"Starting background export to \"{self.config['path']}\"")
+
+        try:
+            self.config['exporter'](
+                self.config['verbose'],
+                self.config['path'],
+                self.waveforms,
+                *self.config['args'],
+                progress=self.report
+            )
+        except ExportCancelled:
+            self.log("Export cancelled, removed partial files")
+            self.cancelled.emit()
+        except Exception as e:
+            self.log(f"Export failed: {e}")
+            self.failed.emit(str(self.config['path']), str(e))
+        else:
+            self.completed.emit(str(self.config['path']))
+
+
+    def report(self, done):
+        # Called by exporter between chunks, so cancelling stops at the next chunk
+        if self.isInterruptionRequested(): raise ExportCancelled()
+
+        percent = int(done * 100)
+        if percent != self.percent:
+            self.percent = percent
+            self.progress.emit(percent)
+
+
+    def cancel(self):
+        self.requestInterruption()
+
+
+    def stop(self):
+        self.requestInterruption()
+        self.wait()
+
+
+    def log(self, msg):
+        if self.config['verbose']: print(msg)
+
+
+class AnalysisJob(qtc.QThread):
+    """
+    Runs a full-channel analysis in the background, so the window stays
+    responsive while long captures are processed
+    """
+
+    completed = qtc.pyqtSignal(object)
+    failed = qtc.pyqtSignal(str)
+
+    def __init__(self, config):
+        super(AnalysisJob, self).__init__()
+        self.config = config
+
+
+    def run(self):
+        self.log(f"Starting background {self.config['name']}")
+
+        try:
+            result = self.config['function']()
+        except Exception as e:
+            self.log(f"{self.config['name'].capitalize()} failed: {e}")
+            self.failed.emit(str(e))
+        else:
+            self.completed.emit(result)
+
+
+    def log(self, msg):
+        if self.config['verbose']: print(msg)
+
+
+def snapshot(waveforms):
+    """
+    Copy of waveform list with read-only views of sample arrays. Later changes to
+    the plot replace its arrays instead of writing to them, and exporters cannot
+    write to the arrays shown in the plot.
+    """
+
+    def freeze(value):
+        if isinstance(value, np.ndarray):
+            value = value.view()
+            value.flags.writeable = False
+        elif isinstance(value, list):
+            value = tuple(freeze(v) for v in value)
+        return value
+
+    return [{ k: freeze(v) for k, v in w.items() } for w in waveforms]
@@ -0,0 +1,205 @@
+"""
+wavebin
+https://github.com/sam210723/wavebin
+
+Waveform capture viewer for oscilloscopes.
+"""
+
+from datetime import datetime
+import numpy as np
+from PyQt5 import QtCore as qtc
+import socket
+import threading
+from wavebin.wave import WaveformHeader
+
+
+class RingBuffer():
+    """
+    Fixed-size sample buffer holding the most recent samples of each channel
+    """
+
+    def __init__(self, channels, depth):
+        self.depth = depth
+        self.data = np.zeros((channels, depth), dtype=np.float32)
+        self.head = 0
+        self.count = 0
+        self.frames = 0
+        self.lock = threading.Lock()
+
+
+    def write(self, blocks):
+        # Only the newest samples of oversized blocks fit in the buffer
+        n = min(len(blocks[0]), self.depth)
+
+        with self.lock:
+            for ch, block in enumerate(blocks):
+                block = block[-n:]
+                end = self.head + n
+
+                # Split write at end of buffer
+                if end <= self.depth:
+                    self.data[ch, self.head:end] = block
+                else:
+                    split = self.depth - self.head
+                    self.data[ch, self.head:] = block[:split]
+                    self.data[ch, :end - self.depth] = block[split:]
+
+            self.head = (self.head + n) % self.depth
+            self.count = min(self.count + n, self.depth)
+            self.frames += 1
+
+
+    def read(self):
+        # Copy buffer contents in time order, oldest sample first
+        with self.lock:
+            start = (self.head - self.count) % self.depth
+            if start + self.count <= self.depth:
+                data = self.data[:, start:start + self.count].copy()
+            else:
+                data = np.concatenate((self.data[:, start:], self.data[:, :self.head]), axis=1)
+
+            return data, self.frames
+
+
+class ScopeClient():
+    """
+    SCPI-over-TCP connection to an oscilloscope
+    """
+
+    def __init__(self, host, port, timeout=5):
+        self.sock = socket.create_connection((host, port), timeout=timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.rfile = self.sock.makefile("rb")
+
+
+    def write(self, cmd):
+        self.sock.sendall(f"{cmd}\n".encode())
+
+
+    def query(self, cmd):
+        self.write(cmd)
+        return self.rfile.readline().decode().strip()
+
+
+    def query_block(self, cmd):
+        self.write(cmd)
+
+        # Parse IEEE 488.2 definite length block header
+        if self.rfile.read(1) != b"#":
+            raise IOError("Invalid block header")
+        digits = int(self.rfile.read(1))
+        length = int(self.rfile.read(digits))
+        data = self.rfile.read(length)
+        self.rfile.readline()
+
+        return data
+
+
+    def close(self):
+        self.rfile.close()
+        self.sock.close()
+
+
+class LiveAcquisition(qtc.QThread):
+    """
+    Pulls waveform blocks from an oscilloscope into a ring buffer
+    """
+
+    failed = qtc.pyqtSignal(str)
+
+    def __init__(self, config):
+        super(LiveAcquisition, self).__init__()
+        self.config = config
+        self.ring = None
+        self.headers = []
+
+
+    def run(self):
+        try:
+            self.connect()
+            while not self.isInterruptionRequested():
+                self.acquire()
+        except (OSError, ValueError) as e:
+            self.log(f"Live acquisition stopped: {e}")
+            self.failed.emit(str(e))
+        finally:
+            if hasattr(self, "scope"): self.scope.close()
+
+
+    def stop(self):
+        self.requestInterruption()
+        self.wait()
+
+
+    def connect(self):
+        self.log(f"Connecting to {self.config['host']}:{self.config['port']}")
+        self.scope = ScopeClient(self.config['host'], self.config['port'])
+
+        # Identify oscilloscope
+        idn = self.scope.query("*IDN?").split(",")
+        self.vendor = "rigol" if idn[0].upper().startswith("RIGOL") else "keysight"
+        self.frame = f"{idn[1].strip()}:{idn[2].strip()}" if len(idn) > 2 else idn[0]
+        self.log(f"  - Device:   {idn[0]} {self.frame}")
+
+        # Find enabled channels
+        self.channels = [n for n in range(1, 5) if self.scope.query(f":CHAN{n}:DISP?") == "1"]
+        if not self.channels: raise ValueError("No channels enabled")
+        self.log(f"  - Channels: {', '.join(f'CH{n}' for n in self.channels)}")
+
+        # Configure waveform transfer
+        self.scope.write(":WAV:FORM BYTE")
+        self.scope.write(f":WAV:POIN {self.config['points']}")
+
+        self.ring = RingBuffer(len(self.channels), self.config['depth'])
+
+
+    def acquire(self):
+        blocks = []
+        for n in self.channels:
+            self.scope.write(f":WAV:SOUR CHAN{n}")
+            pre = [float(v) for v in self.scope.query(":WAV:PRE?").split(",")]
+            codes = np.frombuffer(self.scope.query_block(":WAV:DATA?"), dtype=np.uint8)
+
+            # Convert 8-bit codes to volts
+            _, _, _, _, x_inc, _, _, y_inc, y_orig, y_ref = pre
+            if self.vendor == "rigol":
+                y = (codes - y_orig - y_ref) * y_inc
+            else:
+                y = (codes - y_ref) * y_inc + y_orig
+            blocks.append(y.astype(np.float32))
+            self.x_increment = x_inc
+
+        # Blocks must be the same length to share a ring buffer write
+        n = min(len(b) for b in blocks)
+        self.ring.write([b[-n:] for b in blocks])
+
+
+    def snapshot(self):
+        # Build waveform list from current ring buffer contents
+        data, frames = self.ring.read()
+        points = data.shape[1]
+        duration = points * self.x_increment
+        now = datetime.now()
+
+        waveforms = []
+        for i, n in enumerate(self.channels):
+            header = WaveformHeader(
+                140, 1, 1, points, 1,
+                duration, -duration, self.x_increment, -duration,
+                2, 1,
+                now.strftime("%Y-%m-%d").encode(),
+                now.strftime("%H:%M:%S").encode(),
+                self.frame.encode(),
+                str(n).encode(),
+                0.0, 0
+            )
+            waveforms.append({
+                "header": header,
+                "data":   data[i]
+            })
+
+        return waveforms, frames
+
+
+    def log(self, msg):
+        if self.config['verbose']: print(msg)
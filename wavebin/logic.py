@@ -0,0 +1,54 @@
+"""
+wavebin
+https://github.com/sam210723/wavebin
+
+Waveform capture viewer for oscilloscopes.
+"""
+
+import numpy as np
+
+
+class BitPlane():
+    """
+    Read-only view of one digital line in packed logic pod data,
+    unpacked only for the samples that are accessed
+    """
+
+    def __init__(self, packed, bit):
+        self.packed = packed
+        self.bit = bit
+        self.dtype = np.dtype(np.uint8)
+        self.shape = (len(packed),)
+        self.itemsize = 1
+
+        # Nothing is stored per line, memory cost is the shared packed array
+        self.nbytes = 0
+
+
+    def __len__(self):
+        return len(self.packed)
+
+
+    def __getitem__(self, key):
+        return ((self.packed[key] >> self.bit) & 1).astype(np.uint8)
+
+
+    def __array__(self, dtype=None, copy=None):
+        y = self[:]
+        return y if dtype is None else y.astype(dtype)
+
+
+def bit_planes(packed):
+    """
+    Lazy view of each line in packed logic pod data, one bit per line
+    """
+
+    return [BitPlane(packed, b) for b in range(packed.dtype.itemsize * 8)]
+
+
+def lane_offsets(count, spacing=1.25):
+    """
+    Vertical offset of each digital line, so lines are stacked above each other
+    """
+
+    return [k * spacing for k in range(count)]
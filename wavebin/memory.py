@@ -0,0 +1,217 @@
+"""
+wavebin
+https://github.com/sam210723/wavebin
+
+Waveform capture viewer for oscilloscopes.
+"""
+
+from collections import OrderedDict
+import mmap
+import threading
+import weakref
+from wavebin.profiler import human_bytes
+
+# Default memory budget in bytes
+BUDGET = 4 * 2**30
+
+
+class MemoryManager():
+    """
+    Tracks bytes held by cached arrays and evicts least recently used entries
+    to keep memory use within a budget
+    """
+
+    def __init__(self):
+        self.budget = BUDGET
+        self.verbose = False
+
+        # Cached values keyed by tuple of (owner, ...), most recently used last
+        self.entries = OrderedDict()
+
+        # Estimated resident bytes of memory-mapped capture data
+        self.raw = OrderedDict()
+        self.lock = threading.RLock()
+
+
+    def configure(self, budget=BUDGET, verbose=False):
+        self.budget = budget
+        self.verbose = verbose
+
+
+    def get(self, key):
+        """
+        Cached value or None, marking it as recently used
+        """
+
+        with self.lock:
+            if key not in self.entries: return None
+            self.entries.move_to_end(key)
+            return self.entries[key]['value']
+
+
+    def put(self, key, value, nbytes=None, pinned=False):
+        """
+        Cache value, evicting older entries if over budget. Pinned values
+        (e.g. data on screen) are counted but never evicted.
+        """
+
+        if nbytes is None: nbytes = size_of(value)
+        with self.lock:
+            self.entries[key] = { "value": value, "bytes": nbytes, "pinned": pinned }
+            self.entries.move_to_end(key)
+            self.trim()
+
+        return value
+
+
+    def cached(self, key, compute, nbytes=None):
+        """
+        Cached value, or value of compute() if it was never cached or has been evicted
+        """
+
+        value = self.get(key)
+        if value is None: value = self.put(key, compute(), nbytes)
+
+        return value
+
+
+    def release(self, owner):
+        """
+        Remove all entries with keys starting with owner
+        """
+
+        with self.lock:
+            for key in [k for k in self.entries if k[0] is owner or k[0] == owner]:
+                del self.entries[key]
+
+
+    def touch(self, array, step=1):
+        """
+        Record pages of memory-mapped capture data read with sample step
+        """
+
+        if find_mmap(array) is None and not hasattr(array, "maps"): return
+
+        # Every page is read unless samples are further apart than a page
+        resident = min(array.nbytes, len(array) // max(step, 1) * mmap.PAGESIZE)
+        with self.lock:
+            key = id(array)
+            if key in self.raw and self.raw[key]['ref']() is array:
+                resident = max(resident, self.raw[key]['bytes'])
+            self.raw[key] = { "ref": weakref.ref(array), "bytes": resident }
+            self.raw.move_to_end(key)
+            self.trim()
+
+
+    def trim(self):
+        if self.budget is None: return
+
+        with self.lock:
+            total = self.total()
+
+            # Release resident pages of capture data first, they are read again from the page cache
+            # or file when accessed, which is cheaper than recomputing derived data from them
+            for key in list(self.raw):
+                if total <= self.budget: return
+                r = self.raw.pop(key)
+                total -= r['bytes']
+                array = r['ref']()
+                if array is not None and drop(array):
+                    self.log(f"Released {human_bytes(r['bytes'])} of mapped capture data")
+
+            # Then evict least recently used derived data
+            for key in [k for k, e in self.entries.items() if not e['pinned']]:
+                if total <= self.budget: return
+                e = self.entries.pop(key)
+                total -= e['bytes']
+                self.log(f"Evicted {key_name(key)} ({human_bytes(e['bytes'])})")
+
+
+    def usage(self):
+        with self.lock:
+            # Forget capture data that has been closed
+            for key in [k for k, r in self.raw.items() if r['ref']() is None]:
+                del self.raw[key]
+
+            return {
+                "cached": sum(e['bytes'] for e in self.entries.values() if not e['pinned']),
+                "pinned": sum(e['bytes'] for e in self.entries.values() if e['pinned']),
+                "mapped": sum(r['bytes'] for r in self.raw.values())
+            }
+
+
+    def total(self):
+        return sum(self.usage().values())
+
+
+    def summary(self):
+        total = human_bytes(self.total())
+        if self.budget is None: return f"Memory: {total}"
+
+        return f"Memory: {total} / {human_bytes(self.budget)}"
+
+
+    def log(self, msg):
+        if self.verbose: print(msg)
+
+
+def size_of(value):
+    """
+    Bytes held by arrays in value, including arrays in lists, tuples and dicts
+    """
+
+    if isinstance(value, (list, tuple)): return sum(size_of(v) for v in value)
+    if isinstance(value, dict): return sum(size_of(v) for v in value.values())
+
+    return getattr(value, "nbytes", 0)
+
+
+def key_name(key):
+    return " ".join(type(k).__name__ if not isinstance(k, (str, int)) else str(k) for k in key)
+
+
+def find_mmap(array):
+    # Memory map at the base of an array view, or None
+    base = getattr(array, "base", None)
+    while base is not None and not isinstance(base, mmap.mmap):
+        base = getattr(base, "base", None)
+
+    return base
+
+
+def drop(array):
+    """
+    Release resident pages of memory-mapped array, returns False if not supported
+    """
+
+    # Capture sequences keep a memory map of each recently used file
+    if hasattr(array, "maps"):
+        array.maps.clear()
+        return True
+
+    m = find_mmap(array)
+    if m is None or not hasattr(m, "madvise") or not hasattr(mmap, "MADV_DONTNEED"): return False
+
+    try:
+        m.madvise(mmap.MADV_DONTNEED)
+    except (OSError, ValueError):
+        return False
+
+    return True
+
+
+def parse_size(value):
+    """
+    Parse size in bytes with optional binary suffix, e.g. "512M" or "8G"
+    """
+
+    suffixes = { "k": 2**10, "K": 2**10, "M": 2**20, "G": 2**30, "T": 2**40 }
+    value = value.rstrip("bB")
+    if value and value[-1] in suffixes:
+        return int(float(value[:-1]) * suffixes[value[-1]])
+
+    return int(float(value))
+
+
+# Shared memory manager instance, budget set with --memory-budget
+memory = MemoryManager()
@@ -6,81 +6,344 @@ Waveform capture viewer for oscilloscopes.
 """
 
 from enum import Enum
+from functools import lru_cache
 import numpy as np
+import time
 from pyqtgraph import PlotWidget
 import pyqtgraph as pg
+from pyqtgraph.Qt import QtCore, QtGui
+from wavebin.channels import MathChannel
+from wavebin.concat import segment_offsets
+from wavebin.logic import lane_offsets
+from wavebin.memory import memory
+from wavebin.profiler import profiler
+from wavebin.stats import clip_threshold
 
 
 class QtPlot(PlotWidget):
+    # Emitted when frame governor changes number of rendered points
+    sigPointsChanged = QtCore.Signal(int)
+
     def __init__(self, config):
         self.config = config
         self.log("Initialising plot widget")
         super().__init__()
 
         # Enable/Disable OpenGL
-        if self.config['opengl']:
-            pg.setConfigOptions(useOpenGL=True)
-            self.config['line_width'] = 1
-            #TODO: Fix slow render with OpenGL enabled and line width > 1
-        else:
-            pg.setConfigOptions(useOpenGL=False)
-            self.config['line_width'] = 1    # See https://github.com/pyqtgraph/pyqtgraph/issues/533
+        pg.setConfigOptions(useOpenGL=self.config['opengl'])
+
+        # Rendering quality adapted to paint times, wide lines are only used if they can be
+        # drawn within frame budget (see https://github.com/pyqtgraph/pyqtgraph/issues/533)
+        self.governor = FrameGovernor({
+            "verbose":  self.config['verbose'],
+            "adaptive": self.config.get('adaptive', True),
+            "fps":      self.config.get('fps', 30),
+            "points":   self.config['subsampling']
+        })
+        antialias, self.config['line_width'] = self.governor.quality()
 
         # Set plot properties
         self.view = self.getViewBox()
-        self.setAntialiasing(True)
+        self.setAntialiasing(antialias)
         self.setLabel('bottom', "Time", units='s')
         self.showGrid(x=True, y=True, alpha=1.0)
         self.setMouseEnabled(x=True, y=False)
 
+        # Event marker line
+        self.marker = None
+
+        # Ensemble average overlay
+        self.envelope = None
+
+        # Math channels, re-evaluated for visible range after pan/zoom
+        self.math = []
+        self.math_curves = []
+        self.math_timer = QtCore.QTimer()
+        self.math_timer.setSingleShot(True)
+        self.math_timer.setInterval(30)
+        self.math_timer.timeout.connect(self.update_math)
+        self.view.sigXRangeChanged.connect(lambda: self.math_timer.start())
+
+        # Lower quality while view is moving, refined once it has settled
+        self.interacting = False
+        self.settle_timer = QtCore.QTimer()
+        self.settle_timer.setSingleShot(True)
+        self.settle_timer.setInterval(250)
+        self.settle_timer.timeout.connect(self.settle)
+        if self.governor.config['adaptive']: self.view.sigXRangeChanged.connect(self.interact)
+
 
     def update(self):
         # Remove old traces
         self.clear()
         self.processed_waveforms = []
+        self.curves = []
+        self.traces = []
+        memory.release(self)
+        if self.marker is not None: self.addItem(self.marker)
 
         # Loop through waveforms and render traces
         for i, w in enumerate(self.waveforms):
             self.log(f"Rendering waveform {i + 1}")
+            timebase, y = self.process(i, w)
+
+            # Make processed waveforms available for exporting, one per logic line
+            if "planes" in w:
+                self.processed_waveforms.extend({ "header": w['header'], "data": p } for p in y)
+                memory.put((self, "processed", i), y, pinned=True)
+
+                # One curve per line drawn from unpacked bits, shared sample index and
+                # lane offset applied by item transform
+                x = timebase.x(len(y[0]))
+                with profiler.stage("render", sum(p.nbytes for p in y)):
+                    for p, offset in zip(y, lane_offsets(len(y))):
+                        curve = self.plot(
+                            x,
+                            p,
+                            connect="all",
+                            pen=pg.mkPen(
+                                self.config['colours'][i],
+                                width=self.config['line_width']
+                            )
+                        )
+                        curve.setTransform(timebase.transform(offset))
+                        self.curves.append(curve)
+                        self.traces.append((timebase, x, p))
+                continue
+
+            self.processed_waveforms.append({
+                "header": w['header'],
+                "data": y
+            })
+            memory.put((self, "processed", i), y, pinned=True)
+
+            # Render data on plot against sample index, mapped to time by item transform
+            with profiler.stage("render", y.nbytes):
+                x = timebase.x(len(y))
+                curve = self.plot(
+                    x,
+                    y,
+                    connect="all",
+                    pen=pg.mkPen(
+                        self.config['colours'][i],
+                        width=self.config['line_width']
+                    )
+                )
+                curve.setTransform(timebase.transform())
+                self.curves.append(curve)
+                self.traces.append((timebase, x, y))
+
+        # Ensemble mean and min/max envelope
+        if self.envelope is not None: self.draw_envelope()
+
+        # Boundaries between files of a capture sequence
+        segments = self.waveforms[0].get('segments', [])
+        if 1 < len(segments) <= 1000:
+            for t in self.timebase(0).time(np.asarray(segments[1:])):
+                self.addItem(pg.InfiniteLine(t, pen=pg.mkPen((128, 128, 128), style=QtCore.Qt.DotLine)))
+
+        # Math channels
+        self.build_math()
+        self.math_curves = []
+        for j, m in enumerate(self.math):
+            self.log(f"Rendering math channel \"{m.expression}\"")
+            self.math_curves.append(self.plot(
+                pen=pg.mkPen(
+                    MATH_COLOURS[j % len(MATH_COLOURS)],
+                    width=self.config['line_width']
+                )
+            ))
+        self.update_math(full=True)
+        self.log(memory.summary())
+
+        # Set left Y axis label
+        self.setLabel(
+            'left',
+            Units(self.waveforms[0]['header'].y_units).name,
+            units=UnitAbbr(self.waveforms[0]['header'].y_units).name
+        )
+
+        #TODO: Set right axis label based on units for waveforms 2/3/4
+
+
+    def stream(self, waveforms):
+        # Rebuild traces if number of waveforms changed, logic lines have a curve per line
+        if len(waveforms) != len(getattr(self, "curves", [])) or any("planes" in w for w in waveforms):
+            self.waveforms = waveforms
+            self.update()
+            return
+
+        # Update existing traces in place
+        self.waveforms = waveforms
+        processed = []
+        for i, w in enumerate(self.waveforms):
+            timebase, y = self.process(i, w, verbose=False)
+            processed.append({
+                "header": w['header'],
+                "data": y
+            })
+            memory.put((self, "processed", i), y, pinned=True)
+
+            with profiler.stage("render", y.nbytes):
+                x = timebase.x(len(y))
+                self.curves[i].setData(x, y)
+                self.curves[i].setTransform(timebase.transform())
+                self.traces[i] = (timebase, x, y)
+
+        self.processed_waveforms = processed
+
+
+    def build_math(self):
+        # Re-create math channels when expressions or capture change
+        expressions = self.config.get('math', [])
+        if [m.expression for m in self.math] == expressions and all(m.waveforms is self.waveforms for m in self.math):
+            return
+
+        for m in self.math: memory.release(m)
+        self.math = []
+        for e in expressions:
+            try:
+                self.math.append(MathChannel(e, self.waveforms))
+            except ValueError as ex:
+                # Expression may refer to a channel missing from a newly opened capture
+                self.log(f"Skipping math channel \"{e}\": {ex}")
+
+
+    def update_math(self, full=False):
+        if not self.math_curves: return
+
+        for m, curve in zip(self.math, self.math_curves):
+            timebase = TimeBase(m.header.x_d_origin, m.header.x_increment)
+
+            # Sample range of visible window, or whole capture before first auto-range
+            if full:
+                start, stop = 0, m.length
+            else:
+                x0, x1 = self.view.viewRange()[0]
+                start, stop = timebase.sample(x0) - 1, timebase.sample(x1) + 2
+
+            first, step, y = m.window(start, stop, self.config['subsampling'])
+            with profiler.stage("render", y.nbytes):
+                curve.setData(sample_indices(len(y)), y)
+                curve.setTransform(TimeBase(timebase.time(first), timebase.increment * step).transform())
+
+
+    def draw_envelope(self):
+        memory.put((self, "envelope"), self.envelope, pinned=True)
+        for ch, mean in enumerate(self.envelope['mean']):
+            lo, hi = self.envelope['min'][ch]['data'], self.envelope['max'][ch]['data']
+            step = max(int(len(lo) / self.config['subsampling']), 1)
+            header = mean['header']
+            x = TimeBase(header.x_d_origin, header.x_increment * step).time(sample_indices(len(lo[::step])))
+            r, g, b = self.config['colours'][ch % len(self.config['colours'])]
+
+            # Shaded band between min and max with mean line on top
+            lower = pg.PlotCurveItem(x, lo[::step])
+            upper = pg.PlotCurveItem(x, hi[::step])
+            self.addItem(pg.FillBetweenItem(lower, upper, brush=(r, g, b, 60)))
+            self.plot(x, mean['data'][::step], pen=pg.mkPen((r, g, b, 160), style=QtCore.Qt.DashLine))
+
+
+    def show_eye(self, eye, increment):
+        # Replace traces with eye diagram image
+        self.clear()
+        self.curves = []
+        self.traces = []
+        self.math_curves = []
+        self.eye_image = pg.ImageItem()
+        self.eye_image.setLookupTable(EYE_LUT)
+        self.addItem(self.eye_image)
+
+        # Scale image to time and amplitude
+        lo, hi = eye.config['y_range']
+        width = eye.config['period'] * eye.config['uis'] * increment
+        self.eye_rect = QtCore.QRectF(0, lo, width, hi - lo)
+        self.update_eye(eye)
+        self.view.setRange(xRange=(0, width), yRange=(lo, hi), padding=0)
+
 
-            # Subsampling
+    def update_eye(self, eye):
+        # Log scale so rarely visited bins stay visible
+        self.eye_image.setImage(np.log1p(eye.hist.T.astype(np.float32)), autoLevels=True)
+        self.eye_image.setRect(self.eye_rect)
+
+
+    def export_waveforms(self):
+        """
+        Processed waveforms plus math channels evaluated over whole capture,
+        filtered and clipped the same way as channels
+        """
+
+        waveforms = list(self.processed_waveforms)
+        for m in self.math:
+            step = max(int(m.length / self.config['subsampling']), 1)
+            waveforms.append({
+                "header": m.header,
+                "data":   self.condition(m.evaluate(0, m.length, step), verbose=False)
+            })
+
+        return waveforms
+
+
+    def process(self, i, w, verbose=True):
+        log = self.log if verbose else lambda msg: None
+
+        # Logic lines are unpacked from subsampled points only, without filtering or clipping
+        if "planes" in w:
+            step = max(int(len(w['data']) / self.config['subsampling']), 1)
+            with profiler.stage("unpack", len(w['data']) // step * w['data'].itemsize):
+                planes = [p[::step] for p in w['planes']]
+            return self.timebase(i).subsample(step), planes
+
+        # Subsampling
+        with profiler.stage("subsample", w['data'].nbytes):
             if self.config['subsampling'] >= len(w['data']):
-                y = w['data']
+                step = 1
+                y = np.asarray(w['data'])
             else:
-                self.log(f"  Subsampling ({len(w['data'])} -> {int(self.config['subsampling'])})")
-                y = w['data'][:: int( len(w['data']) / self.config['subsampling'] )]
+                log(f"  Subsampling ({len(w['data'])} -> {int(self.config['subsampling'])})")
+                step = int( len(w['data']) / self.config['subsampling'] )
+                y = w['data'][::step]
+            memory.touch(w['data'], step)
 
             # Scale waveform
             y = y * self.config['channel_gain'][i]
 
-            # Generate X points
-            start = w['header'].x_d_origin
-            stop = w['header'].x_d_origin + w['header'].x_d_range
-            x = np.linspace(start, stop, len(y))
+        # Time of each subsampled point
+        timebase = self.timebase(i).subsample(step)
+
+        return timebase, self.condition(y, verbose)
 
-            # Filtering
-            if self.config['filter_type'] == 1:
-                self.log(f"  Filtering (Savitzky-Golay)")
 
-                # Calculate window length
-                window = round(len(y) * 0.025)
-                if window % 2 == 0: window += 1
+    def condition(self, y, verbose=True):
+        # Filtering and clipping shared by channels and exported math channels
+        log = self.log if verbose else lambda msg: None
 
-                # Catch filter exceptions
-                try:
-                    # Apply filter
+        # Filtering
+        if self.config['filter_type'] == 1:
+            log(f"  Filtering (Savitzky-Golay)")
+
+            # Calculate window length
+            window = round(len(y) * 0.025)
+            if window % 2 == 0: window += 1
+
+            # Catch filter exceptions
+            try:
+                # Apply filter
+                with profiler.stage("filter", y.nbytes):
                     y = Filters().savitzky_golay(y, window, 3)
-                except TypeError as e:
-                    if str(e) == "window_size is too small for the polynomials order":
-                        self.log("  Not enough points to apply filter")
+            except TypeError as e:
+                if str(e) == "window_size is too small for the polynomials order":
+                    log("  Not enough points to apply filter")
 
 
-            # Clipping
-            if self.config['clipping']:
-                self.log(f"  Clipping")
+        # Clipping
+        if self.config['clipping']:
+            log(f"  Clipping")
 
+            with profiler.stage("clip", y.nbytes):
                 # Find waveform median
-                med = (np.amax(y) - abs(np.amin(y))) / 2   # Waveform median
+                med = clip_threshold(np.amin(y), np.amax(y))   # Waveform median
 
                 # Shift waveform to be centered around zero
                 y = (y - med) + 0
@@ -89,32 +352,340 @@ class QtPlot(PlotWidget):
                 y[y > 0] = 1
                 y[y < 0] = 0
 
+        return y
 
-            # Make processed waveforms available for exporting
-            self.processed_waveforms.append({
-                "header": w['header'],
-                "data": y
-            })
 
+    def timebase(self, i):
+        w = self.waveforms[i]
+        timebase = TimeBase(w['header'].x_d_origin, w['header'].x_increment)
 
-            # Render data on plot
-            self.plot(
-                x,
-                y,
-                pen=pg.mkPen(
-                    self.config['colours'][i],
-                    width=self.config['line_width']
-                )
-            )
+        # Records of a capture sequence with time between them
+        offsets = segment_offsets(w)
+        if offsets is not None: return TimeBase(timebase.origin, timebase.increment, w['segments'], offsets)
 
-        # Set left Y axis label
-        self.setLabel(
-            'left',
-            Units(self.waveforms[0]['header'].y_units).name,
-            units=UnitAbbr(self.waveforms[0]['header'].y_units).name
+        return timebase
+
+
+    def sample_to_time(self, i, sample):
+        return self.timebase(i).time(sample)
+
+
+    def time_to_sample(self, i, t):
+        return self.timebase(i).sample(t)
+
+
+    def mark(self, t):
+        # Vertical marker line at time
+        if self.marker is None:
+            self.marker = pg.InfiniteLine(angle=90, movable=False, pen=pg.mkPen((255, 255, 255), style=QtCore.Qt.DashLine))
+            self.marker.setZValue(10)
+        self.marker.setValue(t)
+        if self.marker.scene() is None: self.addItem(self.marker)
+
+
+    def interact(self):
+        if not self.interacting:
+            self.interacting = True
+            self.set_quality(False, 1)
+        self.decimate()
+        self.settle_timer.start()
+
+
+    def settle(self):
+        self.interacting = False
+        self.set_quality(*self.governor.quality())
+
+        # Restore full traces once view has settled
+        for curve, (timebase, x, y) in zip(getattr(self, "curves", []), getattr(self, "traces", [])):
+            curve.setData(x, y)
+
+
+    def decimate(self):
+        """
+        Visible part of each trace with peak decimation to view width, keeping glitches visible.
+        Traces are in sample index coordinates, so view range is mapped through their time base.
+        """
+
+        x0, x1 = self.view.viewRange()[0]
+        width = max(int(self.view.width()), 1)
+        for curve, (timebase, x, y) in zip(getattr(self, "curves", []), getattr(self, "traces", [])):
+            start = min(max(timebase.sample(x0) - 1, 0), len(y))
+            stop = min(max(timebase.sample(x1) + 2, start), len(y))
+            curve.setData(*peak_decimate(x[start:stop], y[start:stop], width))
+
+
+    def set_quality(self, antialias, width):
+        self.setAntialiasing(antialias)
+        self.config['line_width'] = width
+
+        for curve in getattr(self, "curves", []) + self.math_curves:
+            pen = QtGui.QPen(curve.opts['pen'])
+            pen.setWidth(width)
+            curve.setPen(pen)
+
+
+    def paintEvent(self, event):
+        start = time.perf_counter()
+        with profiler.stage("paint"):
+            super().paintEvent(event)
+
+        # Only time settled frames, as drawn at full quality
+        if self.interacting or not getattr(self, "curves", None): return
+        self.governor.record(time.perf_counter() - start)
+
+        # Adjust after painting has finished
+        QtCore.QTimer.singleShot(0, self.govern)
+
+
+    def govern(self):
+        points = self.config['subsampling']
+        length = max(len(w['data']) for w in self.waveforms)
+        quality = self.governor.quality()
+        if not self.governor.adapt(points, length): return
+
+        if self.governor.quality() != quality: self.settle()
+        if self.governor.points != points: self.sigPointsChanged.emit(self.governor.points)
+
+
+    def log(self, msg):
+        if self.config['verbose']: print(msg)
+
+
+class QtJitterPlot(PlotWidget):
+    """
+    Time interval error of each edge, shown below waveform plot with linked time axis
+    """
+
+    def __init__(self, config):
+        self.config = config
+        super().__init__()
+
+        self.setLabel('bottom', "Time", units='s')
+        self.setLabel('left', "TIE", units='s')
+        self.showGrid(x=True, y=True, alpha=1.0)
+        self.setMouseEnabled(x=True, y=False)
+        self.setAutoVisible(y=True)
+        self.setMinimumHeight(150)
+        self.setMaximumHeight(250)
+
+        # TIE histogram drawn sideways over right side of plot, sharing TIE axis
+        self.hist = pg.ViewBox(enableMouse=False)
+        self.hist.invertX(True)
+        self.hist.setYLink(self.getViewBox())
+        self.scene().addItem(self.hist)
+        self.getViewBox().sigResized.connect(self.resize_hist)
+        self.hide()
+
+
+    def resize_hist(self):
+        rect = self.getViewBox().sceneBoundingRect()
+        width = rect.width() * 0.2
+        self.hist.setGeometry(QtCore.QRectF(rect.right() - width, rect.top(), width, rect.height()))
+        self.hist.linkedViewChanged(self.getViewBox(), self.hist.YAxis)
+
+
+    def show_jitter(self, result, times, colour):
+        self.log(f"Rendering TIE of {len(result['tie'])} edges")
+        self.clear()
+
+        # Millions of edges are drawn with peak downsampling of visible range only,
+        # clipping is enabled once curve is in view box
+        curve = self.plot(times, result['tie'], pen=pg.mkPen(colour, width=1))
+        curve.setDownsampling(auto=True, method="peak")
+        curve.setClipToView(True)
+        self.addItem(pg.InfiniteLine(0, angle=0, pen=pg.mkPen((128, 128, 128), style=QtCore.Qt.DashLine)))
+
+        # Count of edges per TIE bin as horizontal bars growing from right edge
+        counts, bins = result['histogram']
+        self.hist.clear()
+        self.hist.addItem(pg.BarGraphItem(
+            x0=0,
+            y0=bins[:-1],
+            width=counts,
+            height=np.diff(bins),
+            pen=pg.mkPen(None),
+            brush=pg.mkBrush(*colour[:3], 128)
+        ))
+        self.hist.setXRange(0, max(counts.max(), 1), padding=0)
+
+        stats = result['stats']
+        si = lambda v: pg.siFormat(v, precision=3, suffix="s")
+        self.setTitle(
+            f"UI {si(result['ui'])}    "
+            f"TIE {si(stats['tie']['rms'])} rms, {si(stats['tie']['pk-pk'])} pk-pk    "
+            f"Period {si(stats['period']['rms'])} rms    "
+            f"Cycle-to-cycle {si(stats['c2c']['rms'])} rms"
         )
+        self.show()
 
-        #TODO: Set right axis label based on units for waveforms 2/3/4
+
+    def log(self, msg):
+        if self.config['verbose']: print(msg)
+
+
+# Math channel trace colours
+MATH_COLOURS = [
+    (255, 64, 64),
+    (255, 160, 0),
+    (160, 96, 255),
+    (255, 255, 255)
+]
+
+
+# Eye diagram colour map (black, blue, cyan, yellow, white)
+EYE_LUT = np.clip(np.stack([
+    np.interp(np.arange(256), [0, 1, 64, 128, 192, 255], [0, 0, 0, 64, 255, 255]),
+    np.interp(np.arange(256), [0, 1, 64, 128, 192, 255], [0, 0, 64, 255, 255, 255]),
+    np.interp(np.arange(256), [0, 1, 64, 128, 192, 255], [0, 96, 255, 255, 0, 255])
+], axis=1), 0, 255).astype(np.uint8)
+
+
+class TimeBase():
+    """
+    Affine mapping between sample index and time, optionally with time added
+    from the first sample of each record in a capture sequence
+    """
+
+    def __init__(self, origin, increment, starts=None, offsets=None):
+        self.origin = origin
+        self.increment = increment
+        self.starts = starts
+        self.offsets = offsets
+
+
+    def time(self, sample):
+        t = self.origin + sample * self.increment
+        if self.starts is None: return t
+
+        k = np.maximum(np.searchsorted(self.starts, sample, side="right") - 1, 0)
+        return t + self.offsets[k]
+
+
+    def sample(self, t):
+        if self.starts is None: return int(round((t - self.origin) / self.increment))
+
+        # Times in a gap map past the end of the record before it
+        k = max(int(np.searchsorted(self.time(self.starts), t, side="right")) - 1, 0)
+        return int(round((t - self.offsets[k] - self.origin) / self.increment))
+
+
+    def subsample(self, step):
+        if self.starts is None: return TimeBase(self.origin, self.increment * step)
+
+        return TimeBase(self.origin, self.increment * step, np.asarray(self.starts) / step, self.offsets)
+
+
+    def x(self, n):
+        """
+        X values of a trace of n points, sample indices mapped to time by transform()
+        unless records have gaps between them
+        """
+
+        return sample_indices(n) if self.starts is None else self.time(sample_indices(n))
+
+
+    def transform(self, offset=0):
+        # Scale sample index to time then offset by origin, and vertically by offset
+        if self.starts is None: return QtGui.QTransform(self.increment, 0, 0, 1, self.origin, offset)
+
+        return QtGui.QTransform(1, 0, 0, 1, 0, offset)
+
+
+def peak_decimate(x, y, width):
+    """
+    Minimum and maximum of each of about width bins of a trace, or trace
+    unchanged if it has fewer than two points per bin
+    """
+
+    per = len(y) // width
+    if per < 2: return x, y
+
+    # Whole bins as rows, remaining samples are kept as they are
+    n = len(y) // per * per
+    bins = np.asarray(y[:n]).reshape(-1, per)
+    xs = np.repeat(x[:n:per], 2)
+    ys = np.column_stack((bins.min(axis=1), bins.max(axis=1))).ravel()
+
+    return np.concatenate((xs, x[n:])), np.concatenate((ys, y[n:]))
+
+
+@lru_cache(maxsize=8)
+def sample_indices(n):
+    """
+    Shared read-only sample index array for traces of length n
+    """
+
+    x = np.arange(n, dtype=np.float64)
+    x.setflags(write=False)
+    return x
+
+
+class FrameGovernor():
+    """
+    Adapts number of rendered points, antialiasing and line width to measured
+    paint times, keeping the plot near a target frame rate
+    """
+
+    # Quality levels from fastest to best, as (antialiasing, line width)
+    levels = [(False, 1), (True, 1), (True, 2)]
+
+    def __init__(self, config):
+        self.config = config
+        self.config.setdefault('min_points', int(5e3))
+        self.config.setdefault('max_points', int(10e6))
+        self.points = self.config['points'] if self.config['adaptive'] else self.config['max_points']
+        self.level = 1
+        self.times = []
+
+
+    def limit(self, length):
+        """
+        Number of points to render for a waveform of length samples
+        """
+
+        return min(length, self.points)
+
+
+    def quality(self):
+        return self.levels[self.level]
+
+
+    def record(self, t):
+        self.times = (self.times + [t])[-5:]
+
+
+    def adapt(self, points, length):
+        """
+        Adjust points and quality level from recent paint times, returns True if either changed
+        """
+
+        if not self.config['adaptive'] or not self.times: return False
+
+        # Points may have been changed in sidebar since last adjustment
+        self.points = points
+        t = float(np.median(self.times))
+        budget = 1 / self.config['fps']
+        state = (self.points, self.level)
+
+        if t > budget:
+            # Lower line quality before points, wide and antialiased lines cost most per point
+            if self.level > 0:
+                self.level -= 1
+            else:
+                self.points = max(int(self.points * max(budget / t, 0.5)), self.config['min_points'])
+        elif t < budget * 0.4:
+            # More points until whole waveform is drawn, then raise line quality
+            limit = min(length, self.config['max_points'])
+            if self.points < limit:
+                self.points = min(int(self.points * min(budget * 0.7 / t, 2)), limit)
+            elif self.level < len(self.levels) - 1:
+                self.level += 1
+
+        if (self.points, self.level) == state: return False
+        self.times = []
+        self.log(f"Frame time {t * 1e3:.1f} ms, rendering {self.points} points with quality level {self.level}")
+
+        return True
 
 
     def log(self, msg):
@@ -176,8 +747,8 @@ class Filters():
         from math import factorial
 
         try:
-            window_size = np.abs(np.int(window_size))
-            order = np.abs(np.int(order))
+            window_size = np.abs(int(window_size))
+            order = np.abs(int(order))
         except ValueError:
             raise ValueError("window_size and order have to be of type int")
 
@@ -191,8 +762,8 @@ class Filters():
         half_window = (window_size -1) // 2
 
         # Precompute coefficients
-        b = np.mat([[k**i for i in order_range] for k in range(-half_window, half_window+1)])
-        m = np.linalg.pinv(b).A[deriv] * rate**deriv * factorial(deriv)
+        b = np.array([[k**i for i in order_range] for k in range(-half_window, half_window+1)])
+        m = np.linalg.pinv(b)[deriv] * rate**deriv * factorial(deriv)
 
         # Pad the signal at the extremes with values taken from the signal itself
         firstvals = y[0] - np.abs( y[1:half_window+1][::-1] - y[0] )
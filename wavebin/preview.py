@@ -0,0 +1,161 @@
+"""
+wavebin
+https://github.com/sam210723/wavebin
+
+Waveform capture viewer for oscilloscopes.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from pathlib import Path
+import struct
+import zlib
+from wavebin.wave import WaveParser
+
+
+class Preview():
+    """
+    Renders decimated min/max traces of a capture to a PNG image without Qt
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.config.setdefault('width', 800)
+        self.config.setdefault('height', 480)
+
+
+    def render(self, waveforms):
+        """
+        Draw waveforms into RGB image array
+        """
+
+        w, h = self.config['width'], self.config['height']
+        img = np.zeros((h, w, 3), dtype=np.uint8)
+
+        # Graticule with 10 horizontal and 8 vertical divisions
+        img[:, np.linspace(0, w - 1, 11).astype(int)] = (48, 48, 48)
+        img[np.linspace(0, h - 1, 9).astype(int), :] = (48, 48, 48)
+
+        # Reduce each waveform to min/max per pixel column
+        columns = [self.columns(wf['data'], w) for wf in waveforms]
+        columns = [c for c in columns if c is not None]
+        if not columns: return img
+
+        # Shared vertical scale with margin
+        lo = min(float(np.amin(c[0])) for c in columns)
+        hi = max(float(np.amax(c[1])) for c in columns)
+        pad = (hi - lo) * 0.05 or 1.0
+        lo, hi = lo - pad, hi + pad
+
+        rows = np.arange(h)[:, None]
+        for i, (mn, mx) in enumerate(columns):
+            # Join each column to previous column so steep edges have no gaps
+            mn, mx = mn.copy(), mx.copy()
+            mn[1:] = np.minimum(mn[1:], mx[:-1])
+            mx[1:] = np.maximum(mx[1:], mn[:-1])
+
+            # Value to pixel row, top row is highest value
+            top = np.round((hi - mx) / (hi - lo) * (h - 1)).astype(int)
+            bottom = np.round((hi - mn) / (hi - lo) * (h - 1)).astype(int)
+
+            # Fill column spans
+            mask = (rows >= top) & (rows <= bottom)
+            img[mask] = self.config['colours'][i % len(self.config['colours'])]
+
+        return img
+
+
+    def columns(self, data, width, chunk=2**22):
+        # Min and max of samples in each pixel column
+        if len(data) == 0: return None
+        bounds = np.linspace(0, len(data), min(width, len(data)) + 1).astype(np.int64)
+
+        mn = np.empty(len(bounds) - 1, dtype=np.float64)
+        mx = np.empty(len(bounds) - 1, dtype=np.float64)
+
+        # Process groups of columns to limit memory use with large captures
+        per = max(int(chunk // max(bounds[1] - bounds[0], 1)), 1)
+        for c in range(0, len(bounds) - 1, per):
+            b = bounds[c:c + per + 1]
+            y = np.asarray(data[b[0]:b[-1]])
+            mn[c:c + len(b) - 1] = np.minimum.reduceat(y, b[:-1] - b[0])
+            mx[c:c + len(b) - 1] = np.maximum.reduceat(y, b[:-1] - b[0])
+
+        # Stretch to full image width when there are fewer samples than columns
+        if len(mn) < width:
+            idx = np.arange(width) * len(mn) // width
+            mn, mx = mn[idx], mx[idx]
+
+        return mn, mx
+
+
+    def save(self, source, target):
+        """
+        Render capture file to PNG file
+        """
+
+        parser = WaveParser({ "verbose": False })
+        if not parser.load(source): raise ValueError(f"Unable to read \"{source}\"")
+
+        target.parent.mkdir(parents=True, exist_ok=True)
+        write_png(target, self.render(parser.waveforms))
+
+
+    def log(self, msg):
+        if self.config['verbose']: print(msg)
+
+
+def preview_path(source, root, out):
+    # Preview next to capture, or in same relative location under output directory
+    rel = Path(source).relative_to(root) if out else Path(Path(source).name)
+    base = Path(out) if out else Path(source).parent
+
+    return base / rel.with_suffix(".preview.png")
+
+
+def stale(source, target):
+    # Previews are regenerated when capture is newer than existing preview
+    try:
+        return target.stat().st_mtime < source.stat().st_mtime
+    except FileNotFoundError:
+        return True
+
+
+def render_previews(jobs, config, workers=None):
+    """
+    Render (source, target) pairs in parallel processes, returns list of errors
+    """
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = pool.map(render_preview, jobs, [config] * len(jobs), chunksize=8)
+        return [r for r in results if r]
+
+
+def render_preview(job, config):
+    source, target = job
+    try:
+        Preview(dict(config)).save(source, target)
+    except (OSError, ValueError, struct.error) as e:
+        return f"{source}: {e}"
+
+    return None
+
+
+def write_png(path, img):
+    """
+    Write RGB image array to PNG file
+    """
+
+    h, w, _ = img.shape
+
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    # Each row is prefixed with filter type 0 (none)
+    raw = np.concatenate((np.zeros((h, 1), dtype=np.uint8), img.reshape(h, w * 3)), axis=1)
+
+    with open(path, "wb") as f:
+        f.write(b"\x89PNG\r\n\x1a\n")
+        f.write(chunk(b"IHDR", struct.pack(">IIBBBBB", w, h, 8, 2, 0, 0, 0)))
+        f.write(chunk(b"IDAT", zlib.compress(raw.tobytes(), 6)))
+        f.write(chunk(b"IEND", b""))
@@ -0,0 +1,146 @@
+"""
+wavebin
+https://github.com/sam210723/wavebin
+
+Waveform capture viewer for oscilloscopes.
+"""
+
+from contextlib import contextmanager
+import json
+import threading
+import time
+import tracemalloc
+
+
+class Profiler():
+    """
+    Records wall time, bytes processed and peak allocation of processing stages.
+    Peak allocation is process-wide, so it includes stages running at the same
+    time on other threads. Records of such stages are marked as shared.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.records = []
+        self.capture = None
+        self.lock = threading.Lock()
+
+        # Active stages in all threads
+        self.active = []
+
+
+    def enable(self):
+        self.enabled = True
+        tracemalloc.start()
+
+
+    @contextmanager
+    def stage(self, name, nbytes=0):
+        """
+        Time a processing stage. The yielded record can be updated with the
+        number of bytes processed once it is known.
+        """
+
+        if not self.enabled:
+            yield {}
+            return
+
+        record = {
+            "capture": self.capture,
+            "stage":   name,
+            "bytes":   nbytes
+        }
+
+        with self.lock:
+            # Peak memory is shared with every active stage, so carry it over before resetting
+            current, peak = tracemalloc.get_traced_memory()
+            for e in self.active: e['peak'] = max(e['peak'], peak)
+            if hasattr(tracemalloc, "reset_peak"): tracemalloc.reset_peak()
+
+            # Stages in other threads overlap this one, enclosing stages in this thread do not
+            thread = threading.get_ident()
+            entry = { "start": current, "peak": current, "thread": thread, "shared": False }
+            for e in self.active:
+                if e['thread'] != thread: e['shared'] = entry['shared'] = True
+            self.active.append(entry)
+
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record['time'] = time.perf_counter() - start
+
+            with self.lock:
+                _, peak = tracemalloc.get_traced_memory()
+                self.active.remove(entry)
+                for e in self.active: e['peak'] = max(e['peak'], peak)
+                record['peak'] = max(entry['peak'], peak) - entry['start']
+                record['shared'] = entry['shared']
+                self.records.append(record)
+
+
+    def summary(self):
+        # Aggregate records by capture and stage, keeping first-seen order
+        stages = {}
+        for r in self.records:
+            key = (r['capture'], r['stage'])
+            if key not in stages:
+                stages[key] = {
+                    "capture": r['capture'],
+                    "stage":   r['stage'],
+                    "count":   0,
+                    "time":    0.0,
+                    "bytes":   0,
+                    "peak":    0,
+                    "shared":  False
+                }
+            s = stages[key]
+            s['count'] += 1
+            s['time'] += r['time']
+            s['bytes'] += r['bytes']
+            s['peak'] = max(s['peak'], r['peak'])
+            s['shared'] |= r['shared']
+
+        return list(stages.values())
+
+
+    def report(self, path=None):
+        if not self.enabled: return
+
+        # Write JSON report
+        if path:
+            with open(path, "w") as f:
+                json.dump({
+                    "summary": self.summary(),
+                    "records": self.records
+                }, f, indent=2, default=str)
+            print(f"Profile written to \"{path}\"")
+            return
+
+        # Print summary table
+        print(f"\n{'Capture':<24} {'Stage':<10} {'Calls':>6} {'Time (ms)':>11} {'Bytes':>9} {'MB/s':>9} {'Peak':>9}")
+        print("-" * 84)
+        summary = self.summary()
+        for s in summary:
+            capture = str(s['capture'] or "-")[:24]
+            rate = s['bytes'] / s['time'] / 1e6 if s['bytes'] and s['time'] else 0
+            print(
+                f"{capture:<24} {s['stage']:<10} {s['count']:>6} "\
+                f"{s['time'] * 1e3:>11.2f} {human_bytes(s['bytes']):>9} "\
+                f"{rate:>9.1f} {human_bytes(s['peak']):>9}{'*' if s['shared'] else ''}"
+            )
+        if any(s['shared'] for s in summary):
+            print("\n* Peak includes stages running at the same time on other threads")
+        print()
+
+
+def human_bytes(num):
+    for unit in ["B", "kB", "MB", "GB"]:
+        if abs(num) < 1024 or unit == "GB": break
+        num /= 1024
+
+    return f"{num:.1f}{unit}" if unit != "B" else f"{int(num)}B"
+
+
+# Shared profiler instance, enabled with --profile
+profiler = Profiler()
@@ -0,0 +1,160 @@
+"""
+wavebin
+https://github.com/sam210723/wavebin
+
+Waveform capture viewer for oscilloscopes.
+"""
+
+from fractions import Fraction
+import numpy as np
+
+
+class Resampler():
+    """
+    Rational polyphase resampler between two sample time bases
+    """
+
+    def __init__(self, src, dst, taps=16, beta=8.0, max_denominator=1000, phases=64):
+        """
+        src and dst are (origin, increment) tuples in seconds
+        """
+
+        # Output increment as rational multiple of input increment
+        ratio = Fraction(dst[1] / src[1]).limit_denominator(max_denominator)
+        self.up, self.down = ratio.denominator, ratio.numerator
+
+        # At least this many phases so offsets between time bases are a small fraction of a sample
+        scale = -(-phases // self.up)
+        self.up, self.down = self.up * scale, self.down * scale
+
+        # Output sample 0 on upsampled grid, rounded to nearest upsampled sample
+        self.offset = int(round((dst[0] - src[0]) / src[1] * self.up))
+
+        # Taps per phase scale with decimation so the anti-aliasing filter fits
+        self.taps = int(np.ceil(taps * max(self.up, self.down) / self.up))
+        self.taps += self.taps % 2
+        self.filter = self.design(beta)
+
+
+    def design(self, beta):
+        """
+        Windowed sinc low-pass filter split into one row of taps per phase
+        """
+
+        up, taps = self.up, self.taps
+
+        # Cutoff at lower of input and output Nyquist frequency, in upsampled cycles/sample
+        fc = 0.5 / max(self.up, self.down)
+
+        # Distance of each input sample (tap j) from output position with phase p
+        j = np.arange(-taps // 2 + 1, taps // 2 + 1)
+        d = np.arange(up)[:, None] - j[None, :] * up
+
+        # Kaiser window over filter support
+        r = np.clip(d / (taps * up / 2), -1, 1)
+        h = 2 * fc * np.sinc(2 * fc * d) * np.i0(beta * np.sqrt(1 - r ** 2)) / np.i0(beta)
+
+        # Unity DC gain for every phase keeps levels of logic signals intact
+        h /= h.sum(axis=1, keepdims=True)
+        self.tap_offsets = j
+
+        return h
+
+
+    def resample(self, data, indices, chunk=2**20):
+        """
+        Values of data at output sample indices, edges extended past ends of input
+        """
+
+        indices = np.asarray(indices, dtype=np.int64)
+        out = np.empty(len(indices), dtype=np.float32)
+        if len(indices) == 0 or len(data) == 0: return out
+
+        step = max(chunk // self.taps, 1)
+        for s in range(0, len(indices), step):
+            k = indices[s:s + step]
+
+            # Input sample and filter phase of each output sample
+            u = k * self.down + self.offset
+            base, phase = u // self.up, u % self.up
+
+            # Read only input range needed for this chunk
+            idx = np.clip(base[:, None] + self.tap_offsets[None, :], 0, len(data) - 1)
+            lo, hi = int(idx.min()), int(idx.max()) + 1
+            x = np.asarray(data[lo:hi], dtype=np.float64)
+
+            out[s:s + step] = np.einsum("ij,ij->i", x[idx - lo], self.filter[phase])
+
+        return out
+
+
+class ResampledArray():
+    """
+    Read-only array view of a waveform on another time base, resampled on access
+    """
+
+    def __init__(self, data, src, dst, length):
+        self.data = data
+        self.resampler = Resampler(src, dst)
+        self.length = length
+        self.dtype = np.dtype(np.float32)
+        self.shape = (length,)
+        self.itemsize = self.dtype.itemsize
+        self.nbytes = length * self.itemsize
+
+
+    def __len__(self):
+        return self.length
+
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return self.resampler.resample(self.data, range(*key.indices(self.length)))
+
+        if np.isscalar(key):
+            if key < 0: key += self.length
+            if not 0 <= key < self.length: raise IndexError("index out of range")
+            return self.resampler.resample(self.data, [key])[0]
+
+        return self.resampler.resample(self.data, np.asarray(key) % self.length)
+
+
+    def __array__(self, dtype=None, copy=None):
+        y = self[:]
+        return y if dtype is None else y.astype(dtype)
+
+
+def timebase(waveform):
+    """
+    (origin, increment) of waveform data, allowing for subsampled data
+    """
+
+    header = waveform['header']
+    increment = header.x_increment
+    if len(waveform['data']) and header.points != len(waveform['data']):
+        increment *= header.points / len(waveform['data'])
+
+    return header.x_d_origin, increment
+
+
+def align(waveforms, reference=0):
+    """
+    Waveforms on the time base of the reference waveform, resampled lazily where needed
+    """
+
+    dst = timebase(waveforms[reference])
+    length = len(waveforms[reference]['data'])
+
+    aligned = []
+    for w in waveforms:
+        src = timebase(w)
+        if np.allclose(src, dst, rtol=1e-9, atol=0) and len(w['data']) == length:
+            aligned.append(w)
+            continue
+
+        aligned.append({
+            "header": w['header']._replace(points=length, x_d_origin=dst[0], x_increment=dst[1]),
+            "data":   ResampledArray(w['data'], src, dst, length)
+        })
+
+    return aligned
@@ -0,0 +1,488 @@
+"""
+wavebin
+https://github.com/sam210723/wavebin
+
+Waveform capture viewer for oscilloscopes.
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import json
+import numpy as np
+import os
+from pathlib import Path
+import threading
+from urllib.parse import parse_qs, urlsplit
+from wavebin.concat import sample_time, segment_offsets, time_sample
+from wavebin.memory import memory
+from wavebin.profiler import human_bytes, profiler
+from wavebin.resample import timebase
+from wavebin.wave import WaveParser
+
+# Samples per block at first summary level, and blocks per block at each level above it
+FACTOR = 16
+
+# Summary levels stop once a level has fewer blocks than this
+MIN_BLOCKS = 1024
+
+# Widest tile in columns
+MAX_WIDTH = 8192
+
+# Capture file patterns shown in listing
+PATTERNS = ["*.bin", "*.bin.gz", "*.bin.zst", "*.zip"]
+
+
+class TileServer():
+    """
+    HTTP server for viewing captures in a browser. Channels are served as
+    tiles of min/max columns, read from a cached multi-resolution summary.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.config.setdefault('verbose', False)
+        self.config.setdefault('host', "127.0.0.1")
+        self.config.setdefault('port', 8080)
+        self.config.setdefault('workers', min(os.cpu_count() or 1, 8))
+        self.config['dir'] = Path(self.config['dir']).resolve()
+
+        # Parsed captures by path, with modification time when parsed
+        self.captures = {}
+        self.lock = threading.Lock()
+
+        # One summary build per channel, other requests for the channel wait for it
+        self.building = {}
+
+        # Tiles are computed in worker threads so the event loop keeps accepting requests
+        self.pool = ThreadPoolExecutor(max_workers=self.config['workers'])
+
+
+    def serve(self):
+        try:
+            asyncio.run(self.main())
+        finally:
+            self.pool.shutdown(wait=False)
+
+
+    async def main(self):
+        server = await asyncio.start_server(self.handle, self.config['host'], self.config['port'])
+        host, port = server.sockets[0].getsockname()[:2]
+        print(f"Serving \"{self.config['dir']}\" at http://{host}:{port}/, press Ctrl+C to stop")
+
+        async with server:
+            await server.serve_forever()
+
+
+    async def handle(self, reader, writer):
+        try:
+            # Request line and headers, body is ignored as only GET is supported
+            request = (await reader.readline()).decode("latin-1").split()
+            while (await reader.readline()).strip(): pass
+            if len(request) < 2: return
+
+            method, target = request[0], request[1]
+            if method != "GET":
+                await self.respond(writer, 405, {"error": "Only GET is supported"})
+                return
+
+            url = urlsplit(target)
+            query = { k: v[0] for k, v in parse_qs(url.query).items() }
+            self.log(f"{method} {target}")
+
+            routes = {
+                "/":             lambda q: PAGE,
+                "/api/captures": self.listing,
+                "/api/capture":  self.info,
+                "/api/tile":     self.tile
+            }
+            if url.path not in routes:
+                await self.respond(writer, 404, {"error": f"\"{url.path}\" not found"})
+                return
+
+            try:
+                body = await asyncio.get_running_loop().run_in_executor(self.pool, routes[url.path], query)
+                await self.respond(writer, 200, body)
+            except (FileNotFoundError, KeyError) as e:
+                await self.respond(writer, 404, {"error": f"{e} not found"})
+            except (ValueError, OverflowError) as e:
+                await self.respond(writer, 400, {"error": str(e)})
+            except Exception as e:
+                self.log(f"Error handling {target}: {e!r}")
+                await self.respond(writer, 500, {"error": "Internal server error"})
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+
+    async def respond(self, writer, status, body):
+        reasons = { 200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 500: "Internal Server Error" }
+        if isinstance(body, str):
+            content, kind = body.encode(), "text/html; charset=utf-8"
+        else:
+            content, kind = json.dumps(body).encode(), "application/json"
+
+        writer.write(
+            f"HTTP/1.1 {status} {reasons[status]}\r\n"
+            f"Content-Type: {kind}\r\n"
+            f"Content-Length: {len(content)}\r\n"
+            "Cache-Control: no-cache\r\n"
+            "Connection: close\r\n\r\n".encode() + content
+        )
+        await writer.drain()
+
+
+    def listing(self, query):
+        """
+        Capture files in served directory and its subdirectories
+        """
+
+        files = []
+        for pattern in PATTERNS:
+            for p in self.config['dir'].rglob(pattern):
+                try:
+                    stat = p.stat()
+                except OSError:
+                    continue
+                files.append({
+                    "name":  p.relative_to(self.config['dir']).as_posix(),
+                    "size":  stat.st_size,
+                    "mtime": stat.st_mtime
+                })
+
+        return sorted(files, key=lambda f: f['name'])
+
+
+    def info(self, query):
+        """
+        Channels of a capture with their length and time base
+        """
+
+        path, channels = self.open(query.get('name', ""))
+        return {
+            "name":     path.relative_to(self.config['dir']).as_posix(),
+            "channels": [
+                {
+                    "name":      c['name'],
+                    "logic":     c['logic'],
+                    "points":    len(c['data']),
+                    "origin":    c['origin'],
+                    "increment": c['increment'],
+                    "start":     c['origin'],
+                    "stop":      float(sample_time(c['waveform'], len(c['data'])))
+                }
+                for c in channels
+            ]
+        }
+
+
+    def tile(self, query):
+        """
+        Min and max of channel samples in each column of a time range
+        """
+
+        path, channels = self.open(query.get('name', ""))
+        ch = int(query.get('channel', 1)) - 1
+        if not 0 <= ch < len(channels): raise ValueError(f"Channel {ch + 1} not in capture")
+        c = channels[ch]
+        width = min(max(int(query.get('width', 1000)), 1), MAX_WIDTH)
+
+        # Time range to sample range, whole channel by default
+        n = len(c['data'])
+        start = float(query.get('start', c['origin']))
+        stop = float(query.get('stop', sample_time(c['waveform'], n)))
+        i0 = min(max(int(np.floor(time_sample(c['waveform'], start))), 0), n)
+        i1 = min(max(int(np.ceil(time_sample(c['waveform'], stop))), i0), n)
+
+        lo, hi, first, step = self.summary(path, ch, c['data']).tile(i0, i1, width)
+        result = {
+            "channel": ch + 1,
+            "start":   c['origin'] + first * c['increment'],
+            "step":    step * c['increment'],
+            "min":     lo.tolist(),
+            "max":     hi.tolist()
+        }
+
+        # Columns of sequences with gaps between records are not evenly spaced in time
+        if segment_offsets(c['waveform']) is not None:
+            result['times'] = sample_time(c['waveform'], first + np.arange(len(lo)) * step).tolist()
+
+        return result
+
+
+    def open(self, name):
+        """
+        Parsed capture and its channels, logic pod lines are separate channels
+        """
+
+        # Only files inside served directory, which may be links to files elsewhere
+        path = Path(os.path.normpath(self.config['dir'] / name))
+        if self.config['dir'] not in path.parents or not path.is_file(): raise FileNotFoundError(f"\"{name}\"")
+
+        mtime = path.stat().st_mtime
+        with self.lock:
+            if path in self.captures and self.captures[path]['mtime'] == mtime:
+                return path, self.captures[path]['channels']
+
+        # Parsed without holding lock, so requests for other captures are not held up
+        wave = WaveParser({ "verbose": self.config['verbose'] })
+        if not wave.load(path): raise ValueError(f"Unable to parse \"{name}\"")
+
+        channels = []
+        for i, w in enumerate(wave.waveforms):
+            origin, increment = timebase(w)
+            lines = w.get('planes', [w['data']])
+            for b, data in enumerate(lines):
+                channels.append({
+                    "name":      f"CH{i + 1} D{b}" if "planes" in w else f"CH{i + 1}",
+                    "logic":     "planes" in w,
+                    "data":      data,
+                    "origin":    origin,
+                    "increment": increment,
+                    "waveform":  w
+                })
+
+        with self.lock:
+            # Another request may have parsed the same version of file meanwhile
+            if path in self.captures and self.captures[path]['mtime'] == mtime:
+                return path, self.captures[path]['channels']
+
+            # Summaries of previous version of file are no longer valid
+            memory.release(("tiles", path))
+            self.captures[path] = { "mtime": mtime, "channels": channels }
+
+        return path, channels
+
+
+    def summary(self, path, ch, data):
+        key = (("tiles", path), ch)
+        with self.lock:
+            summary = memory.get(key)
+            if summary is not None: return summary
+            event = self.building.get(key)
+            if event is None: self.building[key] = threading.Event()
+
+        # Another request is building this summary
+        if event is not None:
+            event.wait()
+            return memory.get(key) or self.summary(path, ch, data)
+
+        try:
+            self.log(f"Building summary of \"{path.name}\" channel {ch + 1}")
+            summary = Summary(data)
+            memory.put(key, summary)
+            self.log(f"  - {len(summary.levels)} levels ({human_bytes(summary.nbytes)})")
+        finally:
+            with self.lock: self.building.pop(key).set()
+
+        return summary
+
+
+    def log(self, msg):
+        if self.config['verbose']: print(msg)
+
+
+class Summary():
+    """
+    Min/max of blocks of samples at several resolutions, each level
+    summarising FACTOR blocks of the level below
+    """
+
+    def __init__(self, data, chunk=2**22):
+        self.data = data
+        self.length = len(data)
+
+        # First level from samples, read one chunk at a time
+        chunk -= chunk % FACTOR
+        blocks = -(-self.length // FACTOR)
+        lo = np.empty(blocks, dtype=np.float32)
+        hi = np.empty(blocks, dtype=np.float32)
+        with profiler.stage("summary", self.length * data.itemsize):
+            for start in range(0, self.length, chunk):
+                y = np.asarray(data[start:start + chunk], dtype=np.float32)
+                l, h = reduce(y, y)
+                lo[start // FACTOR:start // FACTOR + len(l)] = l
+                hi[start // FACTOR:start // FACTOR + len(h)] = h
+            memory.touch(data)
+
+        # Levels above are summaries of the level below
+        self.levels = [(FACTOR, lo, hi)]
+        while len(lo) > MIN_BLOCKS:
+            lo, hi = reduce(lo, hi)
+            self.levels.append((self.levels[-1][0] * FACTOR, lo, hi))
+
+        self.nbytes = sum(lo.nbytes + hi.nbytes for _, lo, hi in self.levels)
+
+
+    def tile(self, i0, i1, width):
+        """
+        Min and max of each column of samples [i0, i1), and first sample and samples per column
+        """
+
+        if i1 <= i0: return np.empty(0), np.empty(0), i0, 1.0
+        spp = (i1 - i0) / width
+
+        # Columns narrower than a sample are single samples
+        if spp <= 1:
+            y = np.asarray(self.data[i0:i1], dtype=np.float32)
+            return y, y, i0, 1.0
+
+        # Coarsest level with at least one block per column, or samples if columns are narrower than a block
+        levels = [l for l in self.levels if l[0] <= spp]
+        if not levels:
+            y = np.asarray(self.data[i0:i1], dtype=np.float32)
+            bounds = np.unique((np.arange(width) * spp).astype(np.int64))
+            return np.minimum.reduceat(y, bounds), np.maximum.reduceat(y, bounds), i0, spp
+
+        block, lo, hi = levels[-1]
+        b0, b1 = i0 // block, -(-i1 // block)
+        bounds = np.unique(((i0 + np.arange(width) * spp) // block).astype(np.int64) - b0)
+
+        return np.minimum.reduceat(lo[b0:b1], bounds), np.maximum.reduceat(hi[b0:b1], bounds), i0, spp
+
+
+def reduce(lo, hi):
+    """
+    Min and max of each FACTOR elements, last partial group padded with its last element
+    """
+
+    pad = -len(lo) % FACTOR
+    if pad:
+        lo = np.concatenate((lo, np.full(pad, lo[-1], dtype=lo.dtype)))
+        hi = np.concatenate((hi, np.full(pad, hi[-1], dtype=hi.dtype)))
+
+    return lo.reshape(-1, FACTOR).min(axis=1), hi.reshape(-1, FACTOR).max(axis=1)
+
+
+# Browser viewer, pans and zooms with tiles fetched for the visible range at canvas width
+PAGE = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>wavebin</title>
+<style>
+  body { margin: 0; background: #000; color: #ccc; font: 13px sans-serif; }
+  header { display: flex; gap: 10px; align-items: center; padding: 6px 10px; background: #222; }
+  select { background: #111; color: #ccc; border: 1px solid #444; }
+  canvas { display: block; width: 100vw; height: calc(100vh - 34px); cursor: grab; }
+</style>
+</head>
+<body>
+<header>
+  <b>wavebin</b>
+  <select id="captures"></select>
+  <span id="status"></span>
+</header>
+<canvas id="plot"></canvas>
+<script>
+const COLOURS = ["#fdff00", "#0097e0", "#ff00d7", "#00ff40"];
+const canvas = document.getElementById("plot");
+const ctx = canvas.getContext("2d");
+const status = document.getElementById("status");
+let capture = null, view = null, tiles = [], ranges = [], controller = null, timer = null;
+
+async function get(url, signal) {
+  const r = await fetch(url, { signal });
+  if (!r.ok) throw new Error((await r.json()).error);
+  return r.json();
+}
+
+function tileUrl(ch, start, stop) {
+  const width = canvas.width - 60;
+  return `/api/tile?name=${encodeURIComponent(capture.name)}&channel=${ch + 1}&start=${start}&stop=${stop}&width=${width}`;
+}
+
+async function open(name) {
+  capture = await get(`/api/capture?name=${encodeURIComponent(name)}`);
+  const c = capture.channels;
+  view = [Math.min(...c.map(x => x.start)), Math.max(...c.map(x => x.stop))];
+
+  // Amplitude range of each channel from whole capture
+  tiles = await Promise.all(c.map((x, i) => get(tileUrl(i, view[0], view[1]))));
+  ranges = tiles.map((t, i) => c[i].logic ? [0, 1] : [Math.min(...t.min), Math.max(...t.max)]);
+  draw();
+}
+
+function refresh() {
+  // Cancel tiles for previous view, only latest view is drawn
+  clearTimeout(timer);
+  timer = setTimeout(async () => {
+    if (controller) controller.abort();
+    controller = new AbortController();
+    const t0 = performance.now();
+    try {
+      tiles = await Promise.all(capture.channels.map((x, i) => get(tileUrl(i, view[0], view[1]), controller.signal)));
+      status.textContent = `${capture.channels.length} channels, tiles in ${Math.round(performance.now() - t0)} ms`;
+      draw();
+    } catch (e) {
+      if (e.name != "AbortError") status.textContent = e.message;
+    }
+  }, 20);
+}
+
+function draw() {
+  canvas.width = canvas.clientWidth;
+  canvas.height = canvas.clientHeight;
+  ctx.fillStyle = "#000";
+  ctx.fillRect(0, 0, canvas.width, canvas.height);
+  if (!capture) return;
+
+  const left = 60, width = canvas.width - left, height = canvas.height - 20;
+  const x = t => left + (t - view[0]) / (view[1] - view[0]) * width;
+
+  // Time grid
+  ctx.strokeStyle = "#333";
+  ctx.fillStyle = "#888";
+  const span = view[1] - view[0], tick = Math.pow(10, Math.floor(Math.log10(span / 5)));
+  for (let t = Math.ceil(view[0] / tick) * tick; t < view[1]; t += tick) {
+    ctx.beginPath(); ctx.moveTo(x(t), 0); ctx.lineTo(x(t), height); ctx.stroke();
+    ctx.fillText(`${(t * 1e3).toPrecision(6)} ms`, x(t) + 2, canvas.height - 6);
+  }
+
+  // One lane per channel, each column drawn from min to max
+  const lane = height / capture.channels.length;
+  tiles.forEach((tile, i) => {
+    const [lo, hi] = ranges[i], top = i * lane + 4, h = lane - 8;
+    const y = v => top + h - (v - lo) / ((hi - lo) || 1) * h;
+    ctx.strokeStyle = COLOURS[parseInt(capture.channels[i].name.slice(2)) - 1 & 3];
+    ctx.fillStyle = "#888";
+    ctx.fillText(capture.channels[i].name, 4, top + 12);
+    ctx.beginPath();
+    for (let j = 0; j < tile.min.length; j++) {
+      const px = x(tile.times ? tile.times[j] : tile.start + j * tile.step);
+      if (j == 0) ctx.moveTo(px, y(tile.min[j])); else ctx.lineTo(px, y(tile.min[j]));
+      ctx.lineTo(px, y(tile.max[j]));
+    }
+    ctx.stroke();
+  });
+}
+
+// Wheel zooms about cursor, dragging pans, previous tiles are redrawn until new ones arrive
+canvas.addEventListener("wheel", e => {
+  e.preventDefault();
+  const f = Math.exp(e.deltaY * 0.002), t = view[0] + (e.offsetX - 60) / (canvas.width - 60) * (view[1] - view[0]);
+  view = [t - (t - view[0]) * f, t + (view[1] - t) * f];
+  draw(); refresh();
+});
+let drag = null;
+canvas.addEventListener("mousedown", e => drag = { x: e.offsetX, view: view.slice() });
+window.addEventListener("mouseup", () => drag = null);
+canvas.addEventListener("mousemove", e => {
+  if (!drag) return;
+  const dt = (e.offsetX - drag.x) / (canvas.width - 60) * (drag.view[1] - drag.view[0]);
+  view = [drag.view[0] - dt, drag.view[1] - dt];
+  draw(); refresh();
+});
+window.addEventListener("resize", () => { draw(); refresh(); });
+
+const select = document.getElementById("captures");
+select.addEventListener("change", () => open(select.value).catch(e => status.textContent = e.message));
+get("/api/captures").then(files => {
+  for (const f of files) select.add(new Option(f.name, f.name));
+  if (files.length) open(files[0].name).catch(e => status.textContent = e.message);
+});
+draw();
+</script>
+</body>
+</html>
+"""
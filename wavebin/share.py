@@ -0,0 +1,167 @@
+"""
+wavebin
+https://github.com/sam210723/wavebin
+
+Waveform capture viewer for oscilloscopes.
+"""
+
+import json
+from multiprocessing import resource_tracker, shared_memory
+import numpy as np
+from wavebin.logic import bit_planes
+from wavebin.wave import WaveformHeader
+
+# Shared memory block layout: magic, metadata length, JSON metadata, aligned channel data
+MAGIC = b"WAVEBIN\0"
+ALIGN = 64
+
+
+class SharedCapture():
+    """
+    Parsed capture in a named shared memory block, mapped by other processes without copying
+    """
+
+    def __init__(self, shm, owner):
+        self.shm = shm
+        self.name = shm.name
+        self.owner = owner
+        self.waveforms = self.read()
+
+
+    def read(self):
+        buf = self.shm.buf
+        if bytes(buf[:8]) != MAGIC: raise ValueError(f"\"{self.name}\" is not a wavebin capture")
+
+        length = int.from_bytes(buf[8:16], byteorder="little")
+        meta = json.loads(bytes(buf[16:16 + length]).decode())
+
+        waveforms = []
+        for m in meta['waveforms']:
+            # Read-only view of samples in shared block
+            data = np.ndarray((m['length'],), dtype=np.dtype(m['dtype']), buffer=buf, offset=m['offset'])
+            data.flags.writeable = self.owner
+
+            waveforms.append({
+                "header": header_from_dict(m['header']),
+                "data":   data
+            })
+            if m['logic']: waveforms[-1]['planes'] = bit_planes(data)
+
+        return waveforms
+
+
+    def close(self):
+        """
+        Release shared block, arrays taken from waveforms must be deleted first
+        """
+
+        self.waveforms = []
+        self.shm.close()
+        if self.owner: self.shm.unlink()
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def publish(waveforms, name=None, chunk=2**22):
+    """
+    Copy waveforms into a new shared memory block, returns owning SharedCapture
+    """
+
+    # Place each channel at an aligned offset after metadata
+    entries = []
+    offset = 0
+    for w in waveforms:
+        dtype = np.dtype(w['data'].dtype)
+        entries.append({
+            "header": header_to_dict(w['header']),
+            "dtype":  dtype.str,
+            "length": len(w['data']),
+            "offset": offset,
+            "logic":  "planes" in w
+        })
+        offset += -(-len(w['data']) * dtype.itemsize // ALIGN) * ALIGN
+
+    # Metadata size depends on offsets, so reserve space for largest offsets first
+    meta = json.dumps({ "waveforms": entries }).encode()
+    start = -(-(16 + len(meta) + 32 * len(entries)) // ALIGN) * ALIGN
+    for e in entries: e['offset'] += start
+    meta = json.dumps({ "waveforms": entries }).encode()
+
+    shm = shared_memory.SharedMemory(name=name, create=True, size=max(start + offset, ALIGN))
+    shm.buf[:8] = MAGIC
+    shm.buf[8:16] = len(meta).to_bytes(8, byteorder="little")
+    shm.buf[16:16 + len(meta)] = meta
+
+    # Copy samples in chunks so large captures are never fully loaded
+    for w, e in zip(waveforms, entries):
+        dst = np.ndarray((e['length'],), dtype=np.dtype(e['dtype']), buffer=shm.buf, offset=e['offset'])
+        for s in range(0, e['length'], chunk):
+            dst[s:s + chunk] = w['data'][s:s + chunk]
+        del dst
+
+    return SharedCapture(shm, owner=True)
+
+
+def attach(name):
+    """
+    Map capture published by another process, returns read-only SharedCapture
+    """
+
+    try:
+        shm = shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Before Python 3.13 the resource tracker would unlink a block this process does not own on exit
+        register = resource_tracker.register
+        resource_tracker.register = lambda name, rtype: None
+        try:
+            shm = shared_memory.SharedMemory(name=name)
+        finally:
+            resource_tracker.register = register
+
+    return SharedCapture(shm, owner=False)
+
+
+def open_arrow(path):
+    """
+    Waveforms in an Arrow IPC archive, memory-mapped without copying
+    """
+
+    try:
+        import pyarrow as pa
+    except ImportError:
+        raise ImportError("pyarrow is required to read Arrow files (pip install pyarrow)")
+
+    table = pa.ipc.open_file(pa.memory_map(str(path), "r")).read_all()
+    meta = json.loads(table.schema.metadata[b"wavebin"])
+
+    waveforms = []
+    for name, m in meta.items():
+        data = table.column(name).chunk(0).to_numpy(zero_copy_only=True)
+        waveforms.append({
+            "header": header_from_dict(m['header']),
+            "data":   data
+        })
+        if m['logic']: waveforms[-1]['planes'] = bit_planes(data)
+
+    return waveforms
+
+
+def header_to_dict(header):
+    # Fixed-length strings stored losslessly as Latin-1 text
+    return {
+        k: v.decode("latin-1") if isinstance(v, bytes) else v
+        for k, v in header._asdict().items()
+    }
+
+
+def header_from_dict(d):
+    return WaveformHeader(**{
+        k: d[k].encode("latin-1") if isinstance(d[k], str) else d[k]
+        for k in WaveformHeader._fields
+    })
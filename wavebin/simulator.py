@@ -0,0 +1,143 @@
+"""
+wavebin
+https://github.com/sam210723/wavebin
+
+Waveform capture viewer for oscilloscopes.
+"""
+
+import numpy as np
+import socketserver
+import threading
+
+
+class ScopeSimulator(socketserver.ThreadingTCPServer):
+    """
+    SCPI-over-TCP server producing synthetic Keysight or Rigol waveforms
+    """
+
+    allow_reuse_address = True
+    daemon_threads = True
+
+    # *IDN? responses
+    identity = {
+        "keysight": "KEYSIGHT TECHNOLOGIES,DSO-X 1102G,CN00000000,02.50",
+        "rigol":    "RIGOL TECHNOLOGIES,MSO5074,MS0000000000000,00.01.02"
+    }
+
+    def __init__(self, config):
+        self.config = config
+        super(ScopeSimulator, self).__init__((self.config['host'], self.config['port']), SCPIHandler)
+
+        # Per-channel acquisition state
+        self.lock = threading.Lock()
+        self.sample = [0] * self.config['channels']
+        self.rng = np.random.default_rng()
+
+
+    def serve(self):
+        print(f"Simulating {self.config['vendor'].capitalize()} oscilloscope on {self.config['host']}:{self.server_address[1]}")
+        try:
+            self.serve_forever()
+        finally:
+            self.server_close()
+
+
+    def acquire(self, channel, points):
+        """
+        Generate the next block of samples for a channel, continuing from the previous block
+        """
+
+        with self.lock:
+            start = self.sample[channel]
+            self.sample[channel] += points
+
+        t = (start + np.arange(points)) * self.config['increment']
+        if channel % 2 == 0:
+            # 115200 baud UART-like square wave
+            bits = np.floor(t * 115200).astype(np.int64)
+            y = np.where((bits * 2654435761) >> 7 & 1, 3.3, 0.0)
+        else:
+            # 1 kHz sine wave
+            y = 1.5 * np.sin(2 * np.pi * 1e3 * t + channel)
+        y = y + self.rng.normal(0, 0.05, points)
+
+        return y
+
+
+    def preamble(self, points):
+        # Byte format, 8-bit codes spanning -5 V to +5 V
+        y_increment = 10 / 256
+        y_origin = 0.0
+        y_reference = 128
+
+        return (0, 0, points, 1, self.config['increment'], 0.0, 0, y_increment, y_origin, y_reference)
+
+
+    def encode(self, y, preamble):
+        # Convert volts to 8-bit codes using vendor scaling
+        _, _, _, _, _, _, _, y_inc, y_orig, y_ref = preamble
+        if self.config['vendor'] == "rigol":
+            codes = y / y_inc + y_orig + y_ref
+        else:
+            codes = (y - y_orig) / y_inc + y_ref
+
+        return np.clip(np.round(codes), 0, 255).astype(np.uint8)
+
+
+class SCPIHandler(socketserver.StreamRequestHandler):
+    def setup(self):
+        super().setup()
+        self.source = 0
+        self.points = 10000
+
+
+    def handle(self):
+        server = self.server
+
+        for line in self.rfile:
+            cmd = line.decode(errors="ignore").strip().upper()
+            if not cmd: continue
+            reply = None
+
+            if cmd == "*IDN?":
+                reply = server.identity[server.config['vendor']]
+            elif match(cmd, ":CHAN?:DISP?"):
+                n = int(cmd.split(":")[1].lstrip("CHANEL"))
+                reply = "1" if 1 <= n <= server.config['channels'] else "0"
+            elif match(cmd, ":WAV:SOUR"):
+                self.source = int(cmd.split()[-1].lstrip("CHANEL")) - 1
+            elif match(cmd, ":WAV:POIN"):
+                self.points = max(int(float(cmd.split()[-1])), 1)
+            elif match(cmd, ":WAV:PRE?"):
+                reply = ",".join(str(v) for v in server.preamble(self.points))
+            elif match(cmd, ":WAV:DATA?"):
+                # IEEE 488.2 definite length block
+                y = server.acquire(self.source, self.points)
+                data = server.encode(y, server.preamble(self.points)).tobytes()
+                size = str(len(data))
+                self.wfile.write(f"#{len(size)}{size}".encode() + data + b"\n")
+
+            if reply is not None:
+                self.wfile.write(f"{reply}\n".encode())
+
+
+def match(cmd, pattern):
+    """
+    Match a SCPI command against its short form, e.g. ":WAVEFORM:DATA?" against ":WAV:DATA?"
+    """
+
+    cmd = cmd.split()[0]
+    if cmd.endswith("?") != pattern.endswith("?"): return False
+
+    parts = cmd.rstrip("?").strip(":").split(":")
+    short = pattern.rstrip("?").strip(":").split(":")
+    if len(parts) != len(short): return False
+
+    # Channel number suffixes are matched by "?" in pattern
+    for p, s in zip(parts, short):
+        if s.endswith("?"):
+            s = s.rstrip("?")
+            p = p.rstrip("0123456789")
+        if not p.startswith(s): return False
+
+    return True
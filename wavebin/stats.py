@@ -0,0 +1,186 @@
+"""
+wavebin
+https://github.com/sam210723/wavebin
+
+Waveform capture viewer for oscilloscopes.
+"""
+
+import numpy as np
+from wavebin.memory import memory
+from wavebin.profiler import profiler
+
+
+class WaveStats():
+    """
+    Single pass statistics and amplitude histogram of a waveform
+    """
+
+    percentiles = [1, 5, 25, 50, 75, 95, 99]
+
+    def __init__(self, config=None):
+        self.config = config or {}
+        self.config.setdefault('chunk', 2**22)
+        self.config.setdefault('bins', 4096)
+
+
+    def compute(self, data):
+        """
+        Statistics dict of waveform data, read in chunks
+        """
+
+        with profiler.stage("stats", data.nbytes):
+            if data.dtype == np.uint8:
+                counts, edges = self.histogram_uint8(data)
+                stats = self.moments(counts, edges)
+            else:
+                stats, counts, edges = self.stream(data)
+
+        stats['histogram'] = (counts, edges)
+        stats['percentiles'] = self.quantiles(counts, edges, stats, discrete=data.dtype == np.uint8)
+
+        return stats
+
+
+    def histogram_uint8(self, data):
+        # Exact histogram of 8-bit codes
+        counts = np.zeros(256, dtype=np.int64)
+        for start in range(0, len(data), self.config['chunk']):
+            counts += np.bincount(data[start:start + self.config['chunk']], minlength=256)
+
+        return counts, np.arange(257, dtype=np.float64) - 0.5
+
+
+    def moments(self, counts, edges):
+        # Exact statistics of integer codes from their histogram
+        values = np.arange(len(counts), dtype=np.float64)
+        n = int(counts.sum())
+        if n == 0: return self.empty()
+
+        mean = float(np.dot(counts, values) / n)
+        var = float(np.dot(counts, (values - mean) ** 2) / n)
+        used = np.flatnonzero(counts)
+
+        return {
+            "count": n,
+            "mean":  mean,
+            "std":   var ** 0.5,
+            "min":   float(values[used[0]]),
+            "max":   float(values[used[-1]])
+        }
+
+
+    def stream(self, data):
+        n, mean, m2 = 0, 0.0, 0.0
+        lo, hi = np.inf, -np.inf
+        counts, start, width = None, 0.0, 0.0
+        bins = self.config['bins']
+
+        for s in range(0, len(data), self.config['chunk']):
+            y = np.asarray(data[s:s + self.config['chunk']], dtype=np.float64)
+            y = y[np.isfinite(y)]
+            if len(y) == 0: continue
+
+            # Combine chunk mean and variance with running totals
+            cn, cmean = len(y), float(np.mean(y))
+            cm2 = float(np.sum((y - cmean) ** 2))
+            delta = cmean - mean
+            total = n + cn
+            mean += delta * cn / total
+            m2 += cm2 + delta ** 2 * n * cn / total
+            n = total
+
+            cmin, cmax = float(np.amin(y)), float(np.amax(y))
+            lo, hi = min(lo, cmin), max(hi, cmax)
+
+            # Histogram range starts at first chunk range
+            if counts is None:
+                counts = np.zeros(bins, dtype=np.int64)
+                start = cmin
+                width = (cmax - cmin) / bins or max(abs(cmin) * 1e-6, 1e-12)
+
+            # Double bin width until chunk fits, merging pairs of bins
+            while cmin < start or cmax >= start + width * bins:
+                merged = counts.reshape(-1, 2).sum(axis=1)
+                pad = np.zeros(bins // 2, dtype=np.int64)
+                if cmin < start:
+                    counts = np.concatenate((pad, merged))
+                    start -= width * bins
+                else:
+                    counts = np.concatenate((merged, pad))
+                width *= 2
+
+            idx = np.minimum(((y - start) / width).astype(np.intp), bins - 1)
+            counts += np.bincount(idx, minlength=bins)
+
+        if n == 0: return self.empty(), np.zeros(bins, dtype=np.int64), np.zeros(bins + 1)
+
+        stats = {
+            "count": n,
+            "mean":  mean,
+            "std":   (m2 / n) ** 0.5,
+            "min":   lo,
+            "max":   hi
+        }
+
+        return stats, counts, start + np.arange(bins + 1) * width
+
+
+    def quantiles(self, counts, edges, stats, discrete=False):
+        # Percentiles interpolated within histogram bins, or bin value for integer codes
+        if stats['count'] == 0: return {}
+        cum = np.cumsum(counts)
+
+        result = {}
+        for p in self.percentiles:
+            target = stats['count'] * p / 100
+            i = min(int(np.searchsorted(cum, target)), len(counts) - 1)
+            below = cum[i - 1] if i > 0 else 0
+            frac = (target - below) / counts[i] if counts[i] and not discrete else 0.5
+            value = edges[i] + frac * (edges[i + 1] - edges[i])
+            result[p] = float(np.clip(value, stats['min'], stats['max']))
+
+        return result
+
+
+    def empty(self):
+        return {
+            "count": 0,
+            "mean":  float("nan"),
+            "std":   float("nan"),
+            "min":   float("nan"),
+            "max":   float("nan")
+        }
+
+
+def waveform_stats(waveform):
+    """
+    Statistics of waveform, computed once and cached with the waveform
+    """
+
+    if "stats" not in waveform:
+        waveform['stats'] = WaveStats().compute(waveform['data'])
+        memory.touch(waveform['data'])
+
+    return waveform['stats']
+
+
+def clip_threshold(lo, hi):
+    """
+    Level that clipped traces and exported digital signals are thresholded at
+    """
+
+    return (hi - abs(lo)) / 2
+
+
+def sparkline(counts, width=32):
+    # Text histogram using block characters
+    blocks = " ▁▂▃▄▅▆▇█"
+    used = np.flatnonzero(counts)
+    if len(used) == 0: return ""
+
+    counts = counts[used[0]:used[-1] + 1]
+    bounds = np.linspace(0, len(counts), min(width, len(counts)) + 1).astype(int)
+    sums = np.add.reduceat(counts, bounds[:-1])
+    levels = np.ceil(sums / sums.max() * (len(blocks) - 1)).astype(int)
+
+    return "".join(blocks[l] for l in levels)
@@ -0,0 +1,112 @@
+"""
+wavebin
+https://github.com/sam210723/wavebin
+
+Waveform capture viewer for oscilloscopes.
+"""
+
+from pathlib import Path
+from PyQt5 import QtCore as qtc
+import struct
+import time
+from wavebin.wave import WaveParser
+
+
+class DirectoryWatcher(qtc.QThread):
+    """
+    Polls a directory for new or modified capture files and parses them
+    in the background once the oscilloscope has finished writing them.
+    """
+
+    captured = qtc.pyqtSignal(object, object)
+
+    def __init__(self, config):
+        super(DirectoryWatcher, self).__init__()
+        self.config = config
+        self.config['path'] = Path(self.config['path'])
+
+        # Last seen (size, mtime) of each file in directory
+        self.seen = {}
+
+        # Files which are still being written
+        self.pending = {}
+
+        # Separate parser instance used only by watcher thread
+        self.wave = WaveParser({ "verbose": self.config['verbose'] })
+
+
+    def run(self):
+        # Ignore captures already in directory
+        self.seen = self.scan()
+
+        while not self.isInterruptionRequested():
+            self.poll()
+            self.msleep(self.config['interval'])
+
+
+    def stop(self):
+        self.requestInterruption()
+        self.wait()
+
+
+    def scan(self):
+        files = {}
+
+        try:
+            for f in self.config['path'].glob("*.bin"):
+                try:
+                    stat = f.stat()
+                except OSError:
+                    # File removed between listing and stat
+                    continue
+                files[f] = (stat.st_size, stat.st_mtime)
+        except OSError as e:
+            # Network shares and USB drives may drop out temporarily
+            self.log(f"Unable to scan \"{self.config['path']}\": {e}")
+
+        return files
+
+
+    def poll(self):
+        now = time.monotonic()
+        ready = []
+
+        for f, stat in self.scan().items():
+            # Skip files that have not changed since they were last parsed
+            if self.seen.get(f) == stat: continue
+
+            # Wait until file size and modification time stop changing
+            if f in self.pending and self.pending[f][0] == stat:
+                if now - self.pending[f][1] >= self.config['settle']:
+                    ready.append((stat[1], f))
+            else:
+                self.pending[f] = (stat, now)
+
+        if not ready: return
+
+        # Only the newest capture needs to be displayed if several finished at once
+        ready.sort()
+        for _, f in ready[:-1]:
+            self.seen[f] = self.pending.pop(f)[0]
+            self.log(f"Skipping \"{f.name}\" (newer capture available)")
+
+        f = ready[-1][1]
+        stat = self.pending.pop(f)[0]
+
+        # Parse capture in watcher thread
+        try:
+            loaded = self.wave.load(f)
+        except (OSError, ValueError, struct.error) as e:
+            self.log(f"Unable to parse \"{f.name}\": {e}")
+            loaded = False
+
+        # Retry incomplete captures next time they change
+        self.seen[f] = stat
+        if not loaded: return
+
+        self.captured.emit(f, self.wave.waveforms)
+
+
+    def log(self, msg):
+        if self.config['verbose']: print(msg)
+
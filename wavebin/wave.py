@@ -7,8 +7,31 @@ Waveform capture viewer for oscilloscopes.
 
 from collections import namedtuple
 import numpy as np
+import os
 from pathlib import Path
 import struct
+from wavebin.compressed import open_capture, zip_captures
+from wavebin.concat import ConcatArray, capture_time, segment_times, sequence_key
+from wavebin.logic import bit_planes
+from wavebin.profiler import profiler
+
+# Capture file structures
+FileHeader = namedtuple(
+    "FileHeader",
+    "magic version size waveforms"
+)
+WaveformHeader = namedtuple(
+    "WaveformHeader",
+    "size wave_type buffers points average "\
+    "x_d_range x_d_origin x_increment x_origin "\
+    "x_units y_units date time frame label "\
+    "time_tags segment"
+)
+WaveformDataHeader = namedtuple(
+    "WaveformDataHeader",
+    "size data_type bpp length"
+)
+
 
 class WaveParser():
     def __init__(self, config):
@@ -16,15 +39,46 @@ class WaveParser():
 
 
     def parse(self, path):
+        # Read capture file then push waveforms to UI
+        if not self.load(path): return False
+        self.display()
+
+        return True
+
+
+    def load(self, path):
+        # Several files are opened as one virtual capture
+        if isinstance(path, (list, tuple)):
+            if len(path) > 1: return self.load_sequence(path)
+            path = path[0]
+
+        # Zip archives are opened as the capture files they contain
+        if Path(path).suffix.lower() == ".zip":
+            members = zip_captures(path)
+            if not members:
+                print(f"No capture files in \"{Path(path).name}\"")
+                return False
+            if len(members) > 1: return self.load_sequence(members)
+            path = members[0]
+
         self.config['file'] = Path(path)
+        profiler.capture = self.config['file'].name
+
+        with profiler.stage("parse") as stage:
+            return self.read_file(stage)
 
+
+    def read_file(self, stage):
         # Open capture file
         print(f"Opening \"{self.config['file'].name}\"")
         self.log(f"Full path \"{self.config['file']}\"\n")
-        self.file = open(self.config['file'], mode="rb")
+        self.file = open_capture(self.config['file'])
+        stage['bytes'] = os.fstat(self.file.fileno()).st_size
 
         # Parse file header
-        if not self.parse_file_header(): return False
+        if not self.parse_file_header():
+            self.file.close()
+            return False
 
         # Loop through waveforms
         self.waveforms = []
@@ -43,6 +97,11 @@ class WaveParser():
                 "data":   data
             })
 
+            # Expose each line of logic pod data as a lazy bit plane
+            if self.data_header.data_type == 6:
+                self.waveforms[i]['planes'] = bit_planes(data)
+                self.log(f"  - Logic Lines:    {len(self.waveforms[i]['planes'])}")
+
             # Print waveform info
             p = self.waveforms[i]['header'].points
             self.log(f"  - Sample Points:  {self.human_format(p)}")
@@ -53,16 +112,118 @@ class WaveParser():
 
         self.file.close()
 
+        return True
+
+
+    def load_sequence(self, paths):
+        """
+        Open consecutive capture files as one capture, data is read lazily from each file
+        """
+
+        self.config['file'] = Path(paths[0])
+        profiler.capture = f"{self.config['file'].name} (+{len(paths) - 1})"
+        print(f"Opening {len(paths)} captures as sequence")
+
+        with profiler.stage("parse"):
+            # Header and data location of each waveform in each file
+            files = []
+            for p in paths:
+                layout = self.read_layout(p)
+                if not layout: return False
+                files.append((p, layout))
+
+            # Order files by trigger time, time tags and origin
+            files.sort(key=lambda f: sequence_key(f[0], f[1][0][0]))
+
+            channels = len(files[0][1])
+            for p, layout in files:
+                if len(layout) != channels:
+                    print(f"\"{Path(p).name}\" has {len(layout)} waveforms, expected {channels}")
+                    return False
+
+            self.waveforms = []
+            for i in range(channels):
+                first, data_header, _ = files[0][1][i]
+                dtype = self.data_type(data_header)
+
+                # Records must share sample increment to form one time base
+                for p, layout in files:
+                    if not np.isclose(layout[i][0].x_increment, first.x_increment, rtol=1e-9):
+                        print(f"\"{Path(p).name}\" has different sample rate")
+                        return False
+
+                data = ConcatArray(
+                    [(p, layout[i][2], layout[i][1].length // dtype.itemsize) for p, layout in files],
+                    dtype
+                )
+
+                # Records are placed at their trigger times, keeping gaps between files
+                self.waveforms.append({
+                    "header": first._replace(
+                        points=len(data),
+                        x_d_range=len(data) * first.x_increment
+                    ),
+                    "data":          data,
+                    "segments":      data.starts[:-1],
+                    "segment_times": segment_times(
+                        [layout[i][0] for _, layout in files],
+                        np.diff(data.starts)
+                    )
+                })
+                if data_header.data_type == 6: self.waveforms[i]['planes'] = bit_planes(data)
+
+        # Report recording span
+        starts = [capture_time(layout[0][0]) for _, layout in files]
+        if None not in starts:
+            span = starts[-1] - starts[0]
+            self.log(f"  - Records:  {len(files)} over {span:.0f} s")
+        self.log(f"  - Samples:  {self.human_format(len(self.waveforms[0]['data']))}\n")
+
+        return True
+
+
+    def read_headers(self, path):
+        """
+        Read file and waveform headers without reading waveform data
+        """
+
+        layout = self.read_layout(path)
+        return [l[0] for l in layout] if layout is not None else None
+
+
+    def read_layout(self, path):
+        """
+        Waveform header, data header and data offset of each waveform without reading data
+        """
+
+        self.file = open_capture(path)
+        try:
+            if not self.parse_file_header(): return None
+
+            layout = []
+            for i in range(self.file_header.waveforms):
+                header = self.parse_waveform_header()
+
+                # Skip over waveform data
+                data_header = self.parse_waveform_data_header()
+                layout.append((header, data_header, self.file.tell()))
+                self.file.seek(data_header.length, 1)
+        finally:
+            self.file.close()
+
+        return layout
+
+
+    def display(self, keep_state=False):
         # Update UI elements
         self.config['app'].config['file'] = self.config['file']
         self.config['app'].waveforms = self.waveforms
-        self.config['app'].update()
+        if keep_state: self.config['plot'].waveforms = self.waveforms
+        self.config['app'].update(keep_state)
         self.config['plot'].waveforms = self.waveforms
         self.config['plot'].subsampling = self.waveforms[0]['header'].points
         self.config['plot'].update()
 
-        return True
-
 
     def parse_file_header(self):
         # Read file magic and format version
@@ -92,11 +253,7 @@ class WaveParser():
             return False
 
         # Unpack file header
-        file_header_tuple = namedtuple(
-            "FileHeader",
-            "magic version size waveforms"
-        )
-        self.file_header = file_header_tuple(
+        self.file_header = FileHeader(
             magic, version,
             int.from_bytes(size, byteorder='little'),
             int.from_bytes(count, byteorder='little')
@@ -117,34 +274,49 @@ class WaveParser():
         data = bytes([length]) + self.file.read(length - 1)
 
         # Unpack waveform header
-        waveform_header_tuple = namedtuple(
-            "WaveformHeader",
-            "size wave_type buffers points average "\
-            "x_d_range x_d_origin x_increment x_origin "\
-            "x_units y_units date time frame label "\
-            "time_tags segment"
-        )
         fields = struct.unpack("5if3d2i16s16s24s16sdI", data)
-        header = waveform_header_tuple(*fields)
+        header = WaveformHeader(*fields)
 
         return header
 
 
     def parse_waveform_data(self):
         header = self.parse_waveform_data_header()
-        data = self.file.read(header.length)
+        self.data_header = header
+
+        with profiler.stage("decode", header.length):
+            data_type = self.data_type(header)
+
+            # Map waveform data from file instead of reading it into memory
+            offset = self.file.tell()
+            count = header.length // np.dtype(data_type).itemsize
+            if count == 0:
+                arr = np.empty(0, dtype=data_type)
+            elif hasattr(self.file, "array"):
+                # Compressed files are decompressed as samples are accessed
+                arr = self.file.array(offset, count, data_type)
+            else:
+                arr = np.memmap(
+                    self.file,
+                    dtype=data_type,
+                    mode="r",
+                    offset=offset,
+                    shape=(count,)
+                ).view(np.ndarray)
+            self.file.seek(offset + header.length)
+
+        return arr
 
+
+    def data_type(self, header):
         # Get waveform data type
         if header.data_type in [1, 2, 3]:
-            data_type = np.float32
+            return np.dtype(np.float32)
         elif header.data_type == 6:
-            data_type = np.uint8
+            # Packed logic pod lines, 8 or 16 lines per sample
+            return np.dtype("<u2") if header.bpp == 2 else np.dtype(np.uint8)
         else:
-            data_type = np.float32
-
-        # Parse buffer into numpy array
-        arr = np.frombuffer(data, dtype=data_type)
-        return arr
+            return np.dtype(np.float32)
 
 
     def parse_waveform_data_header(self):
@@ -153,16 +325,12 @@ class WaveParser():
         data = bytes([length]) + self.file.read(length - 1)
 
         # Unpack waveform data header
-        waveform_data_header_tuple = namedtuple(
-            "WaveformDataHeader",
-            "size data_type bpp length"
-        )
         if self.file_header.version == 1 or self.file_header.version == 10:
             fields = struct.unpack("i2hi", data)
         elif self.file_header.version == 3:
             fields = struct.unpack("i2hQ", data)
 
-        return waveform_data_header_tuple(*fields)
+        return WaveformDataHeader(*fields)
 
 
     def instances(self, app, plot):